@@ -0,0 +1,183 @@
+#!/usr/bin/python
+
+"""
+Checks that bounded TTNameTables stay under the memory ceiling documented by
+ttname.table.memoryCeiling, however big the font.
+
+Each workload (an edit saved to a new file, a read-only read and an edit
+saved in place) runs in a fresh process against synthetic fonts of each size
+and name record count, and the growth of its peak memory is compared with the
+ceiling for its name table.  It exits with 1 if any workload goes over:
+
+    python bench/memory.py --sizes 1m,128m --records 32,1024
+"""
+
+# This file is part of ttname.
+#
+# Copyright 2013 T.C. Hollingsworth <tchollingsworth@gmail.com>
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met: 
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer. 
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution. 
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import Queue
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import shutil
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from ttname import TTNameTable, sfnt, table
+from run import makeFont, _size, _list
+
+def _maxrss():
+    #ru_maxrss is in kilobytes on Linux, but bytes on OS X
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == 'darwin' else rss * 1024
+
+def edit(path, tempdir):
+    t = TTNameTable(path, bounded=True)
+    t.setNames({0: u'Copyright', 1: u'Family', 300: u'Extra'}, *t.firstSection())
+    t.save(os.path.join(tempdir, 'out.ttf'))
+
+def read(path, tempdir):
+    for n in TTNameTable(path, readonly=True, bounded=True).names:
+        n.string
+
+def inplace(path, tempdir):
+    t = TTNameTable(path, bounded=True)
+    t.setNames({1: u'Family'}, *t.firstSection())
+    t.save(path)
+
+WORKLOADS = [('edit', edit), ('read', read), ('in-place', inplace)]
+
+def runCase(path, workload):
+    """runs in a child process, so ru_maxrss only covers this workload"""
+    tempdir = tempfile.mkdtemp(prefix='ttname-bench-memory-')
+    try:
+        baseline = _maxrss()
+        dict(WORKLOADS)[workload](path, tempdir)
+        return _maxrss() - baseline
+    finally:
+        shutil.rmtree(tempdir)
+
+def _makeFont(path, size, records):
+    #the filler is generated in one go, so keep it out of the process that
+    #measures anything
+    makeFont(path, size, records, 1)
+    with open(path, 'rb') as f:
+        return sfnt.SFNTReader(f).tables['name'].length
+
+def _call(target, args, queue):
+    try:
+        queue.put((None, target(*args)))
+    except Exception as e:
+        queue.put((e, None))
+
+def _child(target, *args):
+    """run target in a fresh process, returning what it returns"""
+    queue = multiprocessing.Queue()
+    proc = multiprocessing.Process(target=_call, args=(target, args, queue))
+    proc.start()
+    
+    #a child killed for using too much memory never answers
+    while True:
+        try:
+            error, result = queue.get(timeout=1)
+            break
+        except Queue.Empty:
+            if not proc.is_alive() and queue.empty():
+                proc.join()
+                raise RuntimeError('{0} exited with status {1}'.format(
+                                   target.__name__, proc.exitcode))
+    
+    proc.join()
+    if error is not None:
+        raise error
+    return result
+
+def run(sizes, records):
+    results = []
+    tempdir = tempfile.mkdtemp(prefix='ttname-bench-memory-')
+    
+    try:
+        for size in sizes:
+            for count in records:
+                path = os.path.join(tempdir, 'font.ttf')
+                nameSize = _child(_makeFont, path, size, count)
+                ceiling = table.memoryCeiling(nameSize)
+                
+                for workload, func in WORKLOADS:
+                    growth = _child(runCase, path, workload)
+                    result = {
+                        'case': 'size={0} records={1} {2}'.format(size, count, workload),
+                        'size': size,
+                        'records': count,
+                        'workload': workload,
+                        'name_size': nameSize,
+                        'maxrss_growth': growth,
+                        'ceiling': ceiling,
+                    }
+                    results.append(result)
+                    sys.stderr.write('{0}: {1:.1f}MB of {2:.1f}MB\n'.format(
+                                        result['case'], growth / 1024.0 ** 2,
+                                        ceiling / 1024.0 ** 2))
+                os.unlink(path)
+    finally:
+        shutil.rmtree(tempdir)
+    
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'results': results,
+    }
+
+def main(argv=sys.argv[1:]):
+    p = argparse.ArgumentParser(description=__doc__,
+                                formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument('--sizes', type=_list(_size), default=[1024 ** 2, 128 * 1024 ** 2],
+                   help='comma separated font sizes, like 1m,128m')
+    p.add_argument('--records', type=_list(int), default=[32, 1024],
+                   help='comma separated name record counts')
+    p.add_argument('-o', '--output', help='write the results to a JSON file')
+    args = p.parse_args(argv)
+    
+    results = run(args.sizes, args.records)
+    
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+    else:
+        json.dump(results, sys.stdout, indent=2, sort_keys=True)
+        sys.stdout.write('\n')
+    
+    over = [r for r in results['results'] if r['maxrss_growth'] > r['ceiling']]
+    for r in over:
+        sys.stderr.write('OVER CEILING {0}: {1} bytes, ceiling {2}\n'.format(
+                            r['case'], r['maxrss_growth'], r['ceiling']))
+    return 1 if over else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
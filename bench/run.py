@@ -0,0 +1,300 @@
+#!/usr/bin/python
+
+"""
+Benchmarks for ttname, run against synthetic fonts generated on the fly.
+
+Each combination of font size, record count and number of sections gets a
+freshly generated font and a fresh process, so that peak memory can be
+measured per case.  Results are written as JSON, which can be saved as a
+baseline and compared against later runs:
+
+    python bench/run.py --output baseline.json
+    python bench/run.py --compare baseline.json
+"""
+
+# This file is part of ttname.
+#
+# Copyright 2013 T.C. Hollingsworth <tchollingsworth@gmail.com>
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met: 
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer. 
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution. 
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+from StringIO import StringIO
+import Queue
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import shutil
+import struct
+import sys
+import tempfile
+import time
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from ttname import TTNameTable, codec, sfnt
+from ttname.cli import TTNameCLI
+
+_head = struct.Struct('>LLLLHH8s8shhhhHHhhh')
+
+def _size(value):
+    """parses sizes like 64k or 10m"""
+    units = {'k': 1024, 'm': 1024 ** 2, 'g': 1024 ** 3}
+    if value[-1].lower() in units:
+        return int(value[:-1]) * units[value[-1].lower()]
+    return int(value)
+
+def _list(kind):
+    return lambda value: [kind(v) for v in value.split(',')]
+
+def sections(count):
+    """the platform/encoding/language combinations for a synthetic font"""
+    result = [(1, 0, 0)]
+    for i in xrange(count - 1):
+        result.append((3, 1, 0x409 + i))
+    return result[:count]
+
+def makeRecords(records, sectionCount):
+    result = []
+    sects = sections(sectionCount)
+    
+    for i in xrange(records):
+        platformID, platEncID, langID = sects[i % len(sects)]
+        nameID = i // len(sects)
+        #keep clear of the reserved range once the well known IDs run out
+        if nameID > 25:
+            nameID += 230
+        string = u'Synthetic name {0} for section {1}'.format(nameID, i % len(sects))
+        result.append((platformID, platEncID, langID, nameID,
+                       codec.encodeString(string, platformID, platEncID)))
+    
+    return result
+
+def makeFont(path, size, records, sectionCount):
+    """writes a font with a name table and enough filler to be about size bytes"""
+    head = _head.pack(0x00010000, 0x00010000, 0, 0x5F0F3CF5, 0, 2048,
+                      '\0' * 8, '\0' * 8, 0, 0, 0, 0, 0, 8, 2, 0, 0)
+    
+    name = codec.compile(makeRecords(records, sectionCount))
+    
+    #random data keeps the filler from being suspiciously easy on the disk
+    filler = os.urandom(max(size - len(head) - len(name), 0))
+    
+    empty = sfnt.SFNTReader(StringIO(struct.pack('>4sHHHH', '\0\1\0\0', 0, 0, 0, 0)))
+    with open(path, 'wb') as f:
+        sfnt.write(empty, f, {'head': head, 'name': name, 'glyf': filler})
+
+def _time(func, repeat):
+    """best wall clock time out of repeat runs"""
+    best = None
+    for i in xrange(repeat):
+        start = timeit.default_timer()
+        func()
+        elapsed = timeit.default_timer() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+def _quietly(func):
+    def wrapper():
+        stdout = sys.stdout
+        sys.stdout = open(os.devnull, 'w')
+        try:
+            func()
+        finally:
+            sys.stdout.close()
+            sys.stdout = stdout
+    return wrapper
+
+def phases(path, tempdir):
+    """the (name, function) pairs to time for a font"""
+    out = os.path.join(tempdir, 'out.ttf')
+    table = TTNameTable(path)
+    keys = [(n.nameID, n.platformID, n.platEncID, n.langID) for n in table.names]
+    first = table.firstSection()
+    
+    def decode():
+        for n in TTNameTable(path).names:
+            n.string
+    
+    def lookup():
+        for key in keys:
+            table.getName(*key)
+    
+    def edit():
+        table.setNames({0: u'Copyright', 1: u'Family', 300: u'Extra'}, *first)
+    
+    return [
+        ('open', lambda: TTNameTable(path)),
+        ('open-readonly', lambda: TTNameTable(path, readonly=True)),
+        ('decode', decode),
+        ('getName', lookup),
+        ('getNamesBySection', table.getNamesBySection),
+        ('edit', edit),
+        ('compile', table.compile),
+        ('save', lambda: table.save(out)),
+        ('cli-read', _quietly(lambda: TTNameCLI(['--no-cache', '-a', path]))),
+        ('cli-write', _quietly(lambda: TTNameCLI(['--no-cache', '--copyright=x', path,
+                                                  out]))),
+        #after the first repeat, these are all answered from the name cache
+        ('cli-read-cached', _quietly(lambda: TTNameCLI(['--cache', '-a', path]))),
+    ]
+
+def runCase(case, repeat, queue):
+    """runs in a child process, so ru_maxrss only covers this case"""
+    tempdir = tempfile.mkdtemp(prefix='ttname-bench-')
+    
+    #keep the cached case out of the user's real cache
+    os.environ['XDG_CACHE_HOME'] = tempdir
+    
+    try:
+        path = os.path.join(tempdir, 'font.ttf')
+        makeFont(path, case['size'], case['records'], case['sections'])
+        
+        baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        times = {}
+        for name, func in phases(path, tempdir):
+            times[name] = _time(func, repeat)
+        
+        result = dict(case)
+        result['phases'] = times
+        result['maxrss_kb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        result['maxrss_growth_kb'] = result['maxrss_kb'] - baseline
+        queue.put(result)
+    finally:
+        shutil.rmtree(tempdir)
+
+def caseName(case):
+    return 'size={0} records={1} sections={2}'.format(case['size'], case['records'],
+                                                      case['sections'])
+
+def _wait(proc, queue, timeout):
+    """a case's result, or an error if its process died or took too long"""
+    deadline = time.time() + timeout
+    while proc.is_alive() and time.time() < deadline:
+        try:
+            return queue.get(timeout=1)
+        except Queue.Empty:
+            pass
+    
+    #it may have finished just as we stopped waiting
+    try:
+        return queue.get(timeout=1)
+    except Queue.Empty:
+        pass
+    
+    if proc.is_alive():
+        proc.terminate()
+        proc.join()
+        return {'error': 'took more than {0} seconds'.format(timeout)}
+    return {'error': 'exited with status {0}'.format(proc.exitcode)}
+
+def run(sizes, records, sectionCounts, repeat, timeout=600):
+    results = []
+    
+    for size, count, sects in itertools.product(sizes, records, sectionCounts):
+        case = {'size': size, 'records': count, 'sections': sects}
+        queue = multiprocessing.Queue()
+        proc = multiprocessing.Process(target=runCase, args=(case, repeat, queue))
+        proc.start()
+        result = _wait(proc, queue, timeout)
+        proc.join()
+        
+        result['case'] = caseName(case)
+        results.append(result)
+        if 'error' in result:
+            sys.stderr.write('{0}: FAILED, {1}\n'.format(result['case'], result['error']))
+            continue
+        sys.stderr.write('{0}: {1}\n'.format(result['case'], ', '.join(
+            '{0} {1:.2f}ms'.format(k, v * 1000) for k, v in sorted(result['phases'].iteritems()))))
+    
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'repeat': repeat,
+        'results': results,
+    }
+
+def compare(current, baseline, threshold):
+    """returns (case, phase, old, new) for every phase slower than threshold"""
+    old = dict((r['case'], r) for r in baseline['results'])
+    regressions = []
+    
+    for result in current['results']:
+        if result['case'] not in old:
+            continue
+        for phase, new in sorted(result.get('phases', {}).iteritems()):
+            was = old[result['case']].get('phases', {}).get(phase)
+            if was is not None and new > was * threshold:
+                regressions.append((result['case'], phase, was, new))
+    
+    return regressions
+
+def main(argv=sys.argv[1:]):
+    p = argparse.ArgumentParser(description=__doc__,
+                                formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument('--sizes', type=_list(_size), default=[64 * 1024, 8 * 1024 ** 2],
+                   help='comma separated font sizes, like 64k,10m')
+    p.add_argument('--records', type=_list(int), default=[32, 1024],
+                   help='comma separated name record counts')
+    p.add_argument('--sections', type=_list(int), default=[1, 8],
+                   help='comma separated numbers of platform/encoding/language '
+                   'combinations')
+    p.add_argument('--repeat', type=int, default=5,
+                   help='how many times to run each phase (the best is kept)')
+    p.add_argument('-o', '--output', help='write the results to a JSON file')
+    p.add_argument('--compare', metavar='BASELINE',
+                   help='compare against results saved with --output')
+    p.add_argument('--threshold', type=float, default=1.25,
+                   help='how much slower than the baseline counts as a '
+                   'regression (default 1.25)')
+    p.add_argument('--timeout', type=float, default=600,
+                   help='how many seconds a case gets before it counts as failed '
+                   '(default 600)')
+    args = p.parse_args(argv)
+    
+    results = run(args.sizes, args.records, args.sections, args.repeat, args.timeout)
+    failed = [r for r in results['results'] if 'error' in r]
+    
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+    else:
+        json.dump(results, sys.stdout, indent=2, sort_keys=True)
+        sys.stdout.write('\n')
+    
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        for case, phase, was, new in regressions:
+            sys.stderr.write('REGRESSION {0} {1}: {2:.2f}ms -> {3:.2f}ms\n'.format(
+                                case, phase, was * 1000, new * 1000))
+        if regressions:
+            return 1
+    
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -84,7 +84,9 @@ setup(
     include_package_data=True,
     entry_points = {
         'console_scripts': [
-            'ttname = ttname.cli:TTNameCLI'
+            'ttname = ttname.cli:TTNameCLI',
+            'ttname-batch = ttname.batch:TTNameBatchCLI',
+            'ttname-query = ttname.query:TTNameQueryCLI',
         ]
     }
 )
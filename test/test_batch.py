@@ -0,0 +1,290 @@
+# This file is part of ttname.
+#
+# Copyright 2013 T.C. Hollingsworth <tchollingsworth@gmail.com>
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met: 
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer. 
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution. 
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+from nose.tools import assert_raises_regexp
+from StringIO import StringIO
+import collections
+import json
+import os
+import shutil
+import sys
+import tempfile
+
+from ttname import TTNameTable, TTNameCollection, batch, stamp
+from ttname.batch import TTNameBatchCLI, TTNameBatchError, Edit, ALL, loadManifest
+from test_collection import _makeCollection
+from test_woff import _makeWOFF
+
+_testfile = os.path.join(os.path.dirname(__file__), 'data/DejaVuSans.ttf')
+
+def _fontdir(count):
+    tempdir = tempfile.mkdtemp(prefix='ttname-test-batch-')
+    for i in xrange(count):
+        shutil.copy2(_testfile, os.path.join(tempdir, 'font{0}.ttf'.format(i)))
+    return tempdir
+
+def test_manifest_formats():
+    expected = [Edit('fonts/a.ttf', 3, 1, 1033, 0, u'foo'),
+                Edit('fonts/b.ttf', None, None, None, 11, u'bar')]
+    
+    json = StringIO('[{"path": "a.ttf", "platform": "windows", "encoding": 1, '
+                    '"lang": 1033, "nameID": 0, "value": "foo"},'
+                    '{"path": "b.ttf", "nameID": "vendor-url", "value": "bar"}]')
+    json.name = 'fonts/edits.json'
+    
+    ndjson = StringIO('{"path": "a.ttf", "platform": 3, "encoding": 1, '
+                      '"lang": 1033, "nameID": 0, "value": "foo"}\n\n'
+                      '{"path": "b.ttf", "nameID": 11, "value": "bar"}\n')
+    ndjson.name = 'fonts/edits.ndjson'
+    
+    csv = StringIO('path,platform,encoding,lang,nameID,value\n'
+                   'a.ttf,3,1,1033,copyright,foo\n'
+                   'b.ttf,,,,11,bar\n')
+    csv.name = 'fonts/edits.csv'
+    
+    assert loadManifest(json) == expected
+    assert loadManifest(ndjson) == expected
+    assert loadManifest(csv) == expected
+
+def test_manifest_all():
+    edits = loadManifest(StringIO('[{"path": "a.ttf", "platform": "all", '
+                                  '"nameID": 13, "value": "foo"}]'))
+    assert edits[0].platform == ALL
+
+def test_batch_write():
+    tempdir = _fontdir(3)
+    manifest = os.path.join(tempdir, 'edits.csv')
+    with open(manifest, 'w') as f:
+        f.write('path,platform,encoding,lang,nameID,value\n'
+                'font0.ttf,3,1,1033,1,Cake Sans\n'
+                'font0.ttf,1,0,0,1,Cake Sans\n')
+    
+    b = TTNameBatchCLI(['-m', manifest, '--license=bar', '-a',
+                        os.path.join(tempdir, '*.ttf')], False)
+    
+    assert [r.error for r in b.results] == [None] * 3
+    
+    t = TTNameTable(os.path.join(tempdir, 'font0.ttf'))
+    assert t.getName(1, 3, 1, 1033).string == 'Cake Sans'
+    assert t.getName(1, 1, 0, 0).string == 'Cake Sans'
+    
+    for i in xrange(3):
+        t = TTNameTable(os.path.join(tempdir, 'font{0}.ttf'.format(i)))
+        assert t.getName(13, 3, 1, 1033).string == 'bar'
+        assert t.getName(13, 1, 0, 0).string == 'bar'
+    
+    shutil.rmtree(tempdir)
+
+def test_batch_directory():
+    tempdir = _fontdir(2)
+    
+    b = TTNameBatchCLI(['--name150=bat', tempdir], False)
+    
+    assert len(b.results) == 2
+    for i in xrange(2):
+        t = TTNameTable(os.path.join(tempdir, 'font{0}.ttf'.format(i)))
+        assert t.getName(150, 1, 0, 0).string == 'bat'
+    
+    shutil.rmtree(tempdir)
+
+def test_batch_directory_formats():
+    tempdir = _fontdir(1)
+    ttcdir, ttc = _makeCollection(2)
+    woffdir, woff = _makeWOFF()
+    shutil.move(ttc, os.path.join(tempdir, 'fonts.ttc'))
+    shutil.move(woff, os.path.join(tempdir, 'font.woff'))
+    shutil.rmtree(ttcdir)
+    shutil.rmtree(woffdir)
+    
+    b = TTNameBatchCLI(['--name150=bat', tempdir], False)
+    
+    assert sorted(os.path.basename(r.path) for r in b.results) == \
+                ['font.woff', 'font0.ttf', 'fonts.ttc']
+    assert [r.updated for r in b.results] == [1, 1, 2]
+    
+    fonts = TTNameCollection(os.path.join(tempdir, 'fonts.ttc')).fonts
+    assert [t.getName(150, 1, 0, 0).string for t in fonts] == ['bat', 'bat']
+    assert TTNameTable(os.path.join(tempdir, 'font.woff')).getName(150, 1, 0, 0).string == 'bat'
+    
+    shutil.rmtree(tempdir)
+
+def test_batch_isolates_errors():
+    tempdir = _fontdir(2)
+    with open(os.path.join(tempdir, 'font0.ttf'), 'wb') as f:
+        f.write('potato')
+    
+    b = TTNameBatchCLI(['--designer=foo', tempdir], False)
+    
+    assert b.failed == 1
+    assert 'Not a TrueType or OpenType font' in b.results[0].error
+    assert b.results[1].error is None
+    assert TTNameTable(os.path.join(tempdir, 'font1.ttf')).getName(9, 1, 0, 0).string == 'foo'
+    
+    shutil.rmtree(tempdir)
+
+def test_error_bad_manifest():
+    assert_raises_regexp(TTNameBatchError, 'missing "value"', loadManifest,
+                         StringIO('[{"path": "a.ttf", "nameID": 1}]'))
+    assert_raises_regexp(TTNameBatchError, 'Invalid manifest', loadManifest,
+                         StringIO('[{"path": '))
+    assert_raises_regexp(TTNameBatchError, 'Invalid platform', loadManifest,
+                         StringIO('[{"path": "a.ttf", "nameID": 1, '
+                                  '"platform": "potato", "value": "x"}]'))
+
+def test_batch_read():
+    b = TTNameBatchCLI([_testfile], False)
+    
+    names = b.results[0].names
+    assert b.results[0].error is None
+    assert (1, 1, 0, 0, u'DejaVu Sans') in names
+    assert len(names) == len(list(TTNameTable(_testfile).names))
+
+def test_batch_jobs():
+    tempdir = _fontdir(5)
+    with open(os.path.join(tempdir, 'font2.ttf'), 'wb') as f:
+        f.write('potato')
+    
+    b = TTNameBatchCLI(['--jobs=3', '--sample=Cake', tempdir], False)
+    
+    assert [os.path.basename(r.path) for r in b.results] == \
+                ['font{0}.ttf'.format(i) for i in xrange(5)]
+    assert [r.error is None for r in b.results] == [True, True, False, True, True]
+    assert (b.summary.fonts, b.summary.updated, b.summary.names, b.summary.failed) == (5, 4, 4, 1)
+    
+    for i in (0, 1, 3, 4):
+        t = TTNameTable(os.path.join(tempdir, 'font{0}.ttf'.format(i)))
+        assert t.getName(19, 1, 0, 0).string == 'Cake'
+    
+    shutil.rmtree(tempdir)
+
+def test_batch_worker_killed():
+    tempdir = _fontdir(3)
+    paths = [os.path.join(tempdir, 'font{0}.ttf'.format(i)) for i in xrange(3)]
+    edits = dict((path, [Edit(path, 1, 0, 0, 150, 'bat')]) for path in paths)
+    
+    #the workers are forked from here, so they see this
+    processFont = batch.processFont
+    def dying(path, edits, bounded=False):
+        if path == paths[1]:
+            os._exit(1)
+        return processFont(path, edits, bounded)
+    
+    batch.processFont = dying
+    try:
+        results = list(batch.process(collections.OrderedDict(
+                                sorted(edits.items())), jobs=2, timeout=2))
+    finally:
+        batch.processFont = processFont
+    
+    assert [r.path for r in results] == paths
+    assert [r.updated for r in results] == [1, 0, 1]
+    assert 'Worker died' in results[1].error
+    
+    shutil.rmtree(tempdir)
+
+def test_batch_unchanged():
+    tempdir = _fontdir(2)
+    TTNameBatchCLI(['--sample=Cake', os.path.join(tempdir, 'font0.ttf')], False)
+    
+    b = TTNameBatchCLI(['--sample=Cake', tempdir], False)
+    assert [r.updated for r in b.results] == [0, 1]
+    assert (b.summary.updated, b.summary.unchanged) == (1, 1)
+    
+    b = TTNameBatchCLI(['--sample=Cake', tempdir], False)
+    assert (b.summary.updated, b.summary.unchanged) == (0, 2)
+    assert [p.name for p in b.summary.timer.totals()] == ['open', 'decode', 'edit']
+    
+    shutil.rmtree(tempdir)
+
+def test_batch_bounded():
+    tempdir = _fontdir(2)
+    
+    b = TTNameBatchCLI(['--bounded-memory', '--jobs=2', '--sample=Cake', tempdir], False)
+    assert (b.summary.updated, b.summary.failed) == (2, 0)
+    
+    shutil.rmtree(tempdir)
+
+def test_batch_timings():
+    tempdir = _fontdir(3)
+    
+    b = TTNameBatchCLI(['--jobs=2', '--sample=Cake', tempdir], False)
+    
+    opens = [p for p in b.summary.timer.phases if p.name == 'open']
+    assert len(opens) == 3
+    assert [p.name for p in b.summary.timer.totals()] == \
+                ['open', 'decode', 'edit', 'compile', 'write', 'replace']
+    
+    shutil.rmtree(tempdir)
+
+def test_error_nothing_to_do():
+    assert_raises_regexp(TTNameBatchError, 'Nothing to do', TTNameBatchCLI,
+                         [], False)
+
+def _stampRun(args):
+    stdout = sys.stdout
+    sys.stdout = StringIO()
+    try:
+        b = TTNameBatchCLI(args, False)
+        return b, sys.stdout.getvalue()
+    finally:
+        sys.stdout = stdout
+
+def test_batch_stamps():
+    tempdir = _fontdir(2)
+    stamps = os.path.join(tempdir, 'stamps.json')
+    font0, font1 = [os.path.join(tempdir, 'font{0}.ttf'.format(i)) for i in xrange(2)]
+    
+    b, out = _stampRun(['--stamps=' + stamps, '--sample=Cake', tempdir])
+    assert len(b.results) == 2
+    assert '{0}: updated 1 names ({1})'.format(font0, stamp.NOT_BUILT) in out
+    
+    data = json.load(open(stamps))
+    assert data['version'] == stamp.STAMP_VERSION
+    assert sorted(data['fonts']) == ['font0.ttf', 'font1.ttf']
+    assert data['fonts']['font0.ttf']['output'] == stamp.digest(font0)
+    assert data['fonts']['font0.ttf']['input'] == stamp.digest(_testfile)
+    
+    b, out = _stampRun(['--stamps=' + stamps, '--sample=Cake', tempdir])
+    assert b.results == [] and b.summary.upToDate == 2
+    assert '{0}: up to date'.format(font1) in out
+    assert str(b.summary).endswith('2 up to date')
+    
+    b, out = _stampRun(['--stamps=' + stamps, '--sample=Pie', tempdir])
+    assert len(b.results) == 2
+    assert '{0}: updated 1 names ({1})'.format(font1, stamp.EDITS_CHANGED) in out
+    
+    #a new upstream font gets built, but a touched one is still up to date
+    shutil.copy(_testfile, font1)
+    os.utime(font0, (0, 0))
+    b, out = _stampRun(['--stamps=' + stamps, '--sample=Pie', tempdir])
+    assert [r.path for r in b.results] == [font1]
+    assert '{0}: updated 1 names ({1})'.format(font1, stamp.FONT_CHANGED) in out
+    assert TTNameTable(font1).getName(19, 1, 0, 0).string == 'Pie'
+    
+    with open(stamps, 'w') as f:
+        f.write('{')
+    assert_raises_regexp(TTNameBatchError, 'Invalid stamp file', TTNameBatchCLI,
+                         ['--stamps=' + stamps, '--sample=Pie', tempdir], False)
+    
+    shutil.rmtree(tempdir)
@@ -0,0 +1,231 @@
+# This file is part of ttname.
+#
+# Copyright 2013 T.C. Hollingsworth <tchollingsworth@gmail.com>
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met: 
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer. 
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution. 
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+from StringIO import StringIO
+import os
+import shutil
+import sqlite3
+import tempfile
+
+from ttname import TTNameTable
+from ttname.cache import NameCache, OutputCache, editKey
+from ttname.cli import TTNameCLI
+from ttname.timing import PhaseTimer
+
+_testfile = os.path.join(os.path.dirname(__file__), 'data/DejaVuSans.ttf')
+
+def _setup(**kwargs):
+    tempdir = tempfile.mkdtemp(prefix='ttname-test-cache-')
+    fontfile = os.path.join(tempdir, 'font.ttf')
+    shutil.copy2(_testfile, fontfile)
+    return tempdir, fontfile, NameCache(os.path.join(tempdir, 'names.sqlite'), **kwargs)
+
+def _phases(fontfile, names):
+    timer = PhaseTimer()
+    table = TTNameTable(fontfile, readonly=True, timer=timer, cache=names)
+    return table, [p.name for p in timer.phases]
+
+def test_cache_hit():
+    tempdir, fontfile, names = _setup()
+    
+    uncached, phases = _phases(fontfile, names)
+    assert 'decode' in phases
+    
+    cached, phases = _phases(fontfile, names)
+    assert phases == ['cache']
+    assert [(n.nameID, n.platformID, n.platEncID, n.langID, n.string) for n in cached.names] == \
+           [(n.nameID, n.platformID, n.platEncID, n.langID, n.string) for n in uncached.names]
+    
+    shutil.rmtree(tempdir)
+
+def test_cache_revalidate():
+    tempdir, fontfile, names = _setup()
+    _phases(fontfile, names)
+    
+    t = TTNameTable(fontfile)
+    t.setNames({0: 'Changed'}, 1, 0, 0)
+    t.save(fontfile)
+    os.utime(fontfile, (0, 12345))
+    
+    table, phases = _phases(fontfile, names)
+    assert 'decode' in phases
+    assert table.getName(0, 1, 0, 0).string == 'Changed'
+    
+    shutil.rmtree(tempdir)
+
+def test_cache_verify():
+    tempdir, fontfile, names = _setup(verify=True)
+    _phases(fontfile, names)
+    
+    #same size and mtime, different contents
+    st = os.stat(fontfile)
+    t = TTNameTable(fontfile)
+    t.setNames({0: 'X' * len(t.getName(0, 1, 0, 0).string)}, 1, 0, 0)
+    t.save(fontfile)
+    os.utime(fontfile, (st.st_atime, st.st_mtime))
+    
+    table, phases = _phases(fontfile, names)
+    assert 'decode' in phases
+    assert table.getName(0, 1, 0, 0).string.startswith('XXX')
+    
+    shutil.rmtree(tempdir)
+
+def test_cache_eviction():
+    tempdir, fontfile, names = _setup(maxSize=1)
+    _phases(fontfile, names)
+    
+    table, phases = _phases(fontfile, names)
+    assert 'decode' in phases
+    assert names._db.execute('SELECT COUNT(*) FROM fonts').fetchone()[0] == 0
+    
+    shutil.rmtree(tempdir)
+
+def test_cli_cache_opt_in():
+    tempdir = tempfile.mkdtemp(prefix='ttname-test-cache-')
+    cachehome = os.environ.get('XDG_CACHE_HOME')
+    os.environ['XDG_CACHE_HOME'] = tempdir
+    
+    try:
+        TTNameCLI([_testfile])
+        TTNameCLI(['--no-cache', _testfile])
+        assert not os.path.exists(os.path.join(tempdir, 'ttname'))
+        
+        TTNameCLI(['--cache', _testfile])
+        cli = TTNameCLI(['--cache', _testfile])
+        assert [p.name for p in cli.timer.phases] == ['parse', 'cache', 'read']
+    finally:
+        if cachehome is None:
+            del os.environ['XDG_CACHE_HOME']
+        else:
+            os.environ['XDG_CACHE_HOME'] = cachehome
+    
+    shutil.rmtree(tempdir)
+
+def test_output_cache():
+    tempdir, fontfile, names = _setup()
+    outputs = OutputCache(os.path.join(tempdir, 'outputs'), maxSize=1024)
+    
+    key = editKey(fontfile, {'names': [[1, u'Foo']]})
+    assert key == editKey(fontfile, {'names': [[1, u'Foo']]})
+    assert key != editKey(fontfile, {'names': [[1, u'Bar']]})
+    assert outputs.get(key) is None
+    
+    small = os.path.join(tempdir, 'small')
+    with open(small, 'wb') as f:
+        f.write('x' * 600)
+    outputs.put(key, small, [u'Foo'])
+    echo, modified, font = outputs.get(key)
+    assert echo == [u'Foo'] and modified and font.read() == 'x' * 600
+    font.close()
+    
+    #the least recently used output goes once they don't fit
+    other = editKey(fontfile, {'names': [[1, u'Bar']]})
+    outputs.put(other, small, modified=False)
+    assert outputs.get(key) is None
+    assert outputs.get(other)[:2] == ([], False)
+    outputs.get(other)[2].close()
+    assert sorted(os.listdir(outputs.path)) == ['{0}.font'.format(other), 'index.sqlite']
+    
+    shutil.rmtree(tempdir)
+
+def _edit(args):
+    timer = PhaseTimer()
+    stdout = StringIO()
+    TTNameCLI(args, False, timer=timer, stdout=stdout)
+    return [p.name for p in timer.phases], stdout.getvalue()
+
+def test_cli_output_cache():
+    tempdir, fontfile, names = _setup()
+    cachedir = os.path.join(tempdir, 'outputs')
+    first = os.path.join(tempdir, 'first.ttf')
+    second = os.path.join(tempdir, 'second.ttf')
+    
+    phases, echo = _edit(['--output-cache=' + cachedir, '--family=Foo', '-p', '1', fontfile,
+                          first])
+    assert 'open' in phases and echo == 'Foo\n'
+    
+    #the same edit spelled differently is still the same edit
+    phases, echo = _edit(['--output-cache=' + cachedir, '--family=Foo', '-p', 'macintosh',
+                          fontfile, second])
+    assert 'open' not in phases and 'compile' not in phases
+    assert echo == 'Foo\n'
+    assert open(first, 'rb').read() == open(second, 'rb').read()
+    
+    phases, echo = _edit(['--output-cache=' + cachedir, '--family=Bar', fontfile, second])
+    assert 'open' in phases
+    assert TTNameTable(second).getName(1, 1, 0, 0).string == 'Bar'
+    
+    #in place, too
+    phases, echo = _edit(['--output-cache=' + cachedir, '--family=Foo', '-p', '1', fontfile])
+    assert 'open' not in phases
+    assert open(first, 'rb').read() == open(fontfile, 'rb').read()
+    
+    shutil.rmtree(tempdir)
+
+def test_cli_output_cache_unchanged():
+    tempdir, fontfile, names = _setup()
+    cachedir = os.path.join(tempdir, 'outputs')
+    copy = os.path.join(tempdir, 'copy.ttf')
+    original = open(fontfile, 'rb').read()
+    
+    #an edit that changes nothing, cached from a run to another file
+    args = ['--output-cache=' + cachedir, '--family=DejaVu Sans', '-p', '1']
+    _edit(args + [fontfile, copy])
+    
+    #doesn't touch the font when it's made in place
+    os.utime(fontfile, (0, 0))
+    stderr = StringIO()
+    try:
+        TTNameCLI(args + ['--unchanged-status=3', fontfile], stdout=StringIO(),
+                  stderr=stderr)
+    except SystemExit as e:
+        assert e.code == 3
+    else:
+        assert False, 'the unchanged status was lost'
+    
+    assert stderr.getvalue() == '{0}: unchanged\n'.format(fontfile)
+    assert os.stat(fontfile).st_mtime == 0
+    assert open(fontfile, 'rb').read() == original
+    
+    shutil.rmtree(tempdir)
+
+def test_output_cache_old_index():
+    tempdir = tempfile.mkdtemp(prefix='ttname-test-cache-')
+    path = os.path.join(tempdir, 'outputs')
+    os.makedirs(path)
+    with open(os.path.join(path, 'old.font'), 'wb') as f:
+        f.write('x')
+    db = sqlite3.connect(os.path.join(path, 'index.sqlite'))
+    with db:
+        db.execute('CREATE TABLE outputs (key TEXT PRIMARY KEY, size INTEGER NOT NULL, '
+                   'used REAL NOT NULL, echo TEXT NOT NULL)')
+        db.execute("INSERT INTO outputs VALUES ('old', 1, 0, '[]')")
+    db.close()
+    
+    outputs = OutputCache(path)
+    assert outputs.get('old') is None
+    assert os.listdir(path) == ['index.sqlite']
+    outputs.close()
+    
+    shutil.rmtree(tempdir)
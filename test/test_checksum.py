@@ -0,0 +1,136 @@
+# This file is part of ttname.
+#
+# Copyright 2013 T.C. Hollingsworth <tchollingsworth@gmail.com>
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met: 
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer. 
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution. 
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+from StringIO import StringIO
+from nose.tools import assert_raises
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+
+from ttname import checksum, sfnt
+from ttname.cli import TTNameCLI
+
+_testfile = os.path.join(os.path.dirname(__file__), 'data/DejaVuSans.ttf')
+
+def _corrupt(tag, offset=0):
+    """a copy of the test font with a byte of a table flipped"""
+    data = bytearray(open(_testfile, 'rb').read())
+    entry = sfnt.SFNTReader(open(_testfile, 'rb')).tables[tag]
+    data[entry.offset + offset] ^= 0xFF
+    
+    tempdir = tempfile.mkdtemp(prefix='ttname-test-checksum-')
+    path = os.path.join(tempdir, 'font.ttf')
+    with open(path, 'wb') as f:
+        f.write(str(data))
+    return tempdir, path
+
+def test_engines():
+    rand = random.Random(4)
+    for length in (0, 1, 3, 4, 5, 1000, 65537, checksum._NUMPY_MIN_SIZE + 3):
+        data = ''.join(chr(rand.randrange(256)) for i in xrange(length))
+        padded = checksum._padded(data)
+        expected = checksum._structSum(padded) & 0xFFFFFFFF
+        
+        assert checksum.calcChecksum(data) == expected
+        assert checksum.calcChecksum(buffer(data)) == expected
+        assert checksum.calcChecksum(memoryview(data)) == expected
+        if checksum._numpy() is not None:
+            assert checksum._numpySum(padded) & 0xFFFFFFFF == expected
+    
+    assert checksum.calcChecksum('\xff\xff\xff\xff\0\0\0\x01') == 0
+    assert checksum.calcChecksum('\0\0\x01') == 0x100
+
+def test_numpy_is_lazy():
+    #it takes longer to import than a plain read takes altogether
+    script = ('import sys\n'
+              'from ttname.cli import TTNameCLI\n'
+              'TTNameCLI(["--no-cache", "-n", "family", sys.argv[1]])\n'
+              'sys.exit("numpy" in sys.modules)\n')
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    with open(os.devnull, 'w') as devnull:
+        assert subprocess.call([sys.executable, '-c', script, _testfile], cwd=root,
+                               stdout=devnull) == 0
+
+def test_verify():
+    with open(_testfile, 'rb') as f:
+        assert sfnt.SFNTReader(f).verify() == []
+    
+    tempdir, path = _corrupt('name', 10)
+    with open(path, 'rb') as f:
+        mismatches = sfnt.SFNTReader(f).verify()
+    assert [m.what for m in mismatches] == ['name', 'checkSumAdjustment']
+    assert mismatches[0].stored != mismatches[0].actual
+    shutil.rmtree(tempdir)
+    
+    #the adjustment itself doesn't count towards head's checksum
+    tempdir, path = _corrupt('head', 9)
+    with open(path, 'rb') as f:
+        mismatches = sfnt.SFNTReader(f).verify()
+        assert [m.what for m in mismatches] == ['checkSumAdjustment']
+        assert sfnt.SFNTReader(f, 0).verify(adjustment=False) == []
+    shutil.rmtree(tempdir)
+
+def test_write_unchanged():
+    reader = sfnt.SFNTReader(open(_testfile, 'rb'))
+    name = reader['name']
+    
+    summed = []
+    calcChecksum = sfnt.calcChecksum
+    sfnt.calcChecksum = lambda data: summed.append(len(data)) or calcChecksum(data)
+    try:
+        out = StringIO()
+        sfnt.write(reader, out, {'name': name})
+    finally:
+        sfnt.calcChecksum = calcChecksum
+    
+    #just head and the header
+    assert len(summed) == 2
+    assert out.getvalue() == open(_testfile, 'rb').read()
+
+def test_cli_verify():
+    stderr = StringIO()
+    cli = TTNameCLI(['--verify', '-n', 'family', _testfile], False, stdout=StringIO(),
+                    stderr=stderr)
+    assert cli.exitStatus == 0 and stderr.getvalue() == ''
+    
+    tempdir, path = _corrupt('name', 10)
+    cli = TTNameCLI(['--verify', '-n', 'family', path], False, stdout=StringIO(),
+                    stderr=stderr)
+    assert cli.exitStatus == 1
+    assert "'name' table checksum is 0x" in stderr.getvalue()
+    
+    #editing writes the right checksums, so the output is fine
+    out = os.path.join(tempdir, 'out.ttf')
+    stderr = StringIO()
+    cli = TTNameCLI(['--verify', '--family=Fixed', path, out], False, stdout=StringIO(),
+                    stderr=stderr)
+    assert cli.exitStatus == 0 and stderr.getvalue() == ''
+    
+    assert_raises(SystemExit, TTNameCLI, ['--verify', path], stdout=StringIO(),
+                  stderr=StringIO())
+    shutil.rmtree(tempdir)
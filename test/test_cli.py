@@ -23,13 +23,19 @@
 # SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
 from nose.tools import assert_raises, assert_raises_regexp
+from StringIO import StringIO
+import argparse
 import os
+import pstats
 import random
+import re
 import shutil
+import subprocess
 import sys
 import tempfile
+import threading
 
-from ttname import TTNameTable
+from ttname import TTNameTable, sfnt, table
 from ttname.cli import TTNameCLI, TTNameCLIError
 
 _testfile = os.path.join(os.path.dirname(__file__), 'data/DejaVuSans.ttf')
@@ -80,6 +86,53 @@ def test_stdout_write():
     
     os.unlink(tempfn)
     
+def _piped(argv):
+    #runs ttname between two pipes, like in a shell pipeline
+    inr, inw = os.pipe()
+    outr, outw = os.pipe()
+    result = []
+    
+    def feed():
+        with os.fdopen(inw, 'wb') as f:
+            f.write(open(_testfile, 'rb').read())
+    
+    def drain():
+        with os.fdopen(outr, 'rb') as f:
+            result.append(f.read())
+    
+    threads = [threading.Thread(target=feed), threading.Thread(target=drain)]
+    for t in threads:
+        t.start()
+    
+    stdin, stdout = sys.stdin, sys.stdout
+    sys.stdin = os.fdopen(inr, 'rb')
+    sys.stdout = os.fdopen(outw, 'wb')
+    try:
+        TTNameCLI(argv)
+    finally:
+        sys.stdin.close()
+        sys.stdout.close()
+        sys.stdin, sys.stdout = stdin, stdout
+    
+    for t in threads:
+        t.join()
+    return result[0]
+
+def test_pipe_read():
+    assert _piped(['-n', 'family', '-']) == 'DejaVu Sans\n'
+
+def test_pipe_write():
+    spoolSize = table._SPOOL_SIZE
+    table._SPOOL_SIZE = 4096
+    try:
+        data = _piped(['--copyright=piped', '-', '-'])
+    finally:
+        table._SPOOL_SIZE = spoolSize
+    
+    tt = TTNameTable(StringIO(data))
+    assert tt.getName(0, 1, 0, 0).string == 'piped'
+    assert len(data) - len(open(_testfile, 'rb').read()) < 1024
+
 def test_overwrite_write():
     tempfn = tempfile.mktemp(prefix='ttname-test-cli-overwrite-write-', suffix='.ttf')
     shutil.copy2(_testfile, tempfn)
@@ -142,6 +195,118 @@ def test_multiple_write():
     
     os.unlink(tempfn)
 
+def test_unchanged_write():
+    tempdir = tempfile.mkdtemp(prefix='ttname-test-cli-unchanged-')
+    tempfn = os.path.join(tempdir, 'font.ttf')
+    shutil.copy2(_testfile, tempfn)
+    os.utime(tempfn, (0, 0))
+    stderr = StringIO()
+    
+    cli = TTNameCLI(['--family=DejaVu Sans', '--script=/dev/null', tempfn], False,
+                    stderr=stderr)
+    assert not cli.modified
+    assert stderr.getvalue() == '{0}: unchanged\n'.format(tempfn)
+    assert os.stat(tempfn).st_mtime == 0
+    assert os.listdir(tempdir) == ['font.ttf']
+    
+    assert_raises(SystemExit, TTNameCLI, ['--unchanged-status=3', '--family=DejaVu Sans',
+                                          tempfn], stderr=stderr)
+    
+    cli = TTNameCLI(['--family=DejaVu Sans Mono', tempfn], False)
+    assert cli.modified
+    assert os.stat(tempfn).st_mtime != 0
+    
+    shutil.rmtree(tempdir)
+
+def test_bounded_memory():
+    tempdir = tempfile.mkdtemp(prefix='ttname-test-cli-bounded-')
+    tempfn = os.path.join(tempdir, 'font.ttf')
+    
+    cli = TTNameCLI(['--bounded-memory', '--family=DejaVu Sans Mono', _testfile, tempfn],
+                    False)
+    assert cli.table.bounded
+    assert TTNameTable(tempfn).getName(1, 1, 0, 0).string == 'DejaVu Sans Mono'
+    
+    shutil.rmtree(tempdir)
+
+def test_share_suffixes():
+    tempdir = tempfile.mkdtemp(prefix='ttname-test-cli-suffixes-')
+    tempfn = os.path.join(tempdir, 'font.ttf')
+    stderr = StringIO()
+    
+    cli = TTNameCLI(['--share-suffixes', '--storage-report', '--family=Sans', '-p', '3',
+                     '-e', '1', '-l', '1033', _testfile, tempfn], False, stderr=stderr)
+    new = TTNameTable(tempfn)
+    assert new.getName(1, 3, 1, 1033).string == 'Sans'
+    assert new.compile() == cli.table.compile()
+    
+    size, stored, saved = [int(n) for n in re.findall(r'\d+', stderr.getvalue())]
+    assert stderr.getvalue().startswith(_testfile + ': ')
+    assert saved == size - stored and saved >= len(u'Sans'.encode('utf_16_be'))
+    
+    shutil.rmtree(tempdir)
+
+def test_numeric_options():
+    cli = TTNameCLI.__new__(TTNameCLI)
+    cli.parse_cmdline(['--name150', '-bat', '--copyright=foo', '--name0=bar',
+                       '--name7=a=b', _testfile])
+    
+    assert cli.newnames == {0: 'bar', 7: 'a=b', 150: '-bat'}
+    assert cli.args.infile == _testfile
+    
+def test_highest_name_id():
+    cli = TTNameCLI.__new__(TTNameCLI)
+    cli.parse_cmdline(['--name32767=a', _testfile])
+    assert cli.newnames == {32767: 'a'}
+    cli.parse_cmdline(['--name-id', '32767=a', _testfile])
+    assert cli.newnames == {32767: 'a'}
+
+def test_startup_budget():
+    #this used to take the better part of a second registering every --nameN
+    added = []
+    add_argument = argparse.ArgumentParser.add_argument
+    def counting(self, *args, **kwargs):
+        added.append(args)
+        return add_argument(self, *args, **kwargs)
+    
+    argparse.ArgumentParser.add_argument = counting
+    try:
+        cli = TTNameCLI.__new__(TTNameCLI)
+        cli.parse_cmdline(['--name150=bat', '--license=foo', _testfile])
+    finally:
+        argparse.ArgumentParser.add_argument = add_argument
+    
+    assert cli.newnames == {150: 'bat', 13: 'foo'}
+    assert len(added) < 100
+    
+    #and the imports it needs stay cheap; this is generous, a cold start on a
+    #busy machine shouldn't come close
+    script = ('import time\n'
+              'start = time.time()\n'
+              'from ttname.cli import TTNameCLI\n'
+              'TTNameCLI.__new__(TTNameCLI).parse_cmdline(["--name150=bat", "x.ttf"])\n'
+              'print time.time() - start\n')
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    elapsed = float(subprocess.check_output([sys.executable, '-c', script], cwd=root))
+    assert elapsed < 0.5, elapsed
+
+def test_timings():
+    stderr = sys.stderr
+    sys.stderr = StringIO()
+    profile = tempfile.mktemp(prefix='ttname-test-cli-profile-', suffix='.prof')
+    
+    try:
+        cli = TTNameCLI(['--no-cache', '--timings', '--profile', profile, _testfile])
+        report = sys.stderr.getvalue()
+    finally:
+        sys.stderr = stderr
+    
+    assert [p.name for p in cli.timer.totals()] == ['parse', 'open', 'decode', 'read']
+    assert 'decode' in report
+    assert pstats.Stats(profile).total_calls > 0
+    
+    os.unlink(profile)
+
 def test_error_exits():
     stderr = sys.stderr
     sys.stderr = open(os.devnull, 'w')
@@ -163,6 +328,75 @@ def test_error_badfile():
     
     os.unlink(tempfn)
 
+def test_write_same_file():
+    tempdir = tempfile.mkdtemp(prefix='ttname-test-cli-same-file-')
+    tempfn = os.path.join(tempdir, 'font.ttf')
+    shutil.copy2(_testfile, tempfn)
+    
+    TTNameCLI(['--designer=Zed', tempfn, os.path.join(tempdir, '.', 'font.ttf')], False)
+    assert TTNameTable(tempfn).getName(9, 1, 0, 0).string == 'Zed'
+    assert TTNameTable(tempfn).getName(1, 1, 0, 0).string == 'DejaVu Sans'
+    assert os.listdir(tempdir) == ['font.ttf']
+    
+    shutil.rmtree(tempdir)
+
+def test_error_failed_save():
+    tempdir = tempfile.mkdtemp(prefix='ttname-test-cli-failed-save-')
+    tempfn = os.path.join(tempdir, 'font.ttf')
+    outfn = os.path.join(tempdir, 'out.ttf')
+    shutil.copy2(_testfile, tempfn)
+    
+    def failing(self, fileish, compile):
+        fileish.write('half a font')
+        raise sfnt.SFNTError("'glyf' table is truncated")
+    
+    _save = TTNameTable._save
+    TTNameTable._save = failing
+    try:
+        for args in ([tempfn], [tempfn, outfn]):
+            assert_raises_regexp(TTNameCLIError, "Unable to save font: 'glyf' table",
+                                 TTNameCLI, ['--designer=Zed'] + args, False)
+            assert os.listdir(tempdir) == ['font.ttf']
+    finally:
+        TTNameTable._save = _save
+    
+    assert open(tempfn, 'rb').read() == open(_testfile, 'rb').read()
+    shutil.rmtree(tempdir)
+
+def test_error_unencodable():
+    tempdir = tempfile.mkdtemp(prefix='ttname-test-cli-error-unencodable-')
+    tempfn = os.path.join(tempdir, 'font.ttf')
+    shutil.copy2(_testfile, tempfn)
+    
+    #the default section is Mac Roman
+    assert_raises_regexp(TTNameCLIError, 'Unable to set names: Unable to encode',
+                         TTNameCLI, [u'--family=\u3042'.encode('utf-8'), tempfn], False)
+    
+    #too big for the name table, which only shows when it's compiled
+    assert_raises_regexp(TTNameCLIError, 'Unable to save names: .* too large',
+                         TTNameCLI, ['--family=' + 'x' * 40000, '-p', '3', '-e', '1',
+                                     '-l', '1033', tempfn], False)
+    assert os.listdir(tempdir) == ['font.ttf']
+    assert TTNameTable(tempfn).getName(1, 3, 1, 1033).string == 'DejaVu Sans'
+    
+    shutil.rmtree(tempdir)
+
+def test_error_stdin_in_place():
+    tempdir = tempfile.mkdtemp(prefix='ttname-test-cli-error-stdin-')
+    cwd = os.getcwd()
+    stdin = sys.stdin
+    sys.stdin = open(_testfile)
+    os.chdir(tempdir)
+    try:
+        assert_raises_regexp(TTNameCLIError, 'needs an output file', TTNameCLI,
+                             ['--family=foo', '-'], False)
+        assert os.listdir(tempdir) == []
+    finally:
+        os.chdir(cwd)
+        sys.stdin.close()
+        sys.stdin = stdin
+        shutil.rmtree(tempdir)
+
 def test_error_bad_platform():
     assert_raises_regexp(TTNameCLIError, 'Invalid platform',
                          TTNameCLI, ['--platform=potato', _testfile], False)
@@ -171,6 +405,15 @@ def test_error_bad_name():
     assert_raises_regexp(TTNameCLIError, 'Invalid name',
                          TTNameCLI, ['--record=potato', _testfile], False)
 
+def test_error_bad_numeric_name():
+    stderr = sys.stderr
+    sys.stderr = open(os.devnull, 'w')
+    assert_raises(SystemExit, TTNameCLI, ['--name99999=foo', _testfile])
+    for option in ['--name-id=foo', '--name-id=x=y', '--name-id=40000=foo',
+                   '--name-id=-1=foo', '--name40000=foo']:
+        assert_raises(SystemExit, TTNameCLI, [option, _testfile])
+    sys.stderr = stderr
+
 def test_error_bad_outfile():
     assert_raises_regexp(TTNameCLIError, 'Unable to open output file',
         TTNameCLI, ['--designer=foo', _testfile, '/dev/readonly/nope'], False)
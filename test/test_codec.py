@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+
+# This file is part of ttname.
+#
+# Copyright 2013 T.C. Hollingsworth <tchollingsworth@gmail.com>
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met: 
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer. 
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution. 
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+from nose.tools import assert_raises
+from fontTools.ttLib import TTFont
+import os
+
+from ttname import codec
+
+_testfile = os.path.join(os.path.dirname(__file__), 'data/DejaVuSans.ttf')
+
+def _rawname():
+    return TTFont(_testfile).reader['name']
+
+def test_roundtrip():
+    format, records, langTags = codec.decompile(_rawname())
+    
+    assert format == 0
+    assert langTags == []
+    assert codec.decompile(codec.compile(records)) == (format, records, langTags)
+
+def test_record_order():
+    records = [(3, 1, 1033, 1, 'b'), (1, 0, 0, 2, 'a'), (1, 0, 0, 1, 'c')]
+    format, decoded, langTags = codec.decompile(codec.compile(records))
+    
+    assert [r[:4] for r in decoded] == [(1, 0, 0, 1), (1, 0, 0, 2), (3, 1, 1033, 1)]
+    
+def test_format1():
+    tag = u'en-GB'.encode('utf_16_be')
+    records = [(3, 1, 0x8000, 1, u'Colour'.encode('utf_16_be'))]
+    
+    format, decoded, langTags = codec.decompile(codec.compile(records, [tag]))
+    
+    assert format == 1
+    assert decoded == records
+    assert langTags == [tag]
+
+def test_shared_strings():
+    name = u'DejaVu Sans'.encode('utf_16_be')
+    records = [(3, 1, 1033, 1, name), (3, 1, 1031, 1, name), (1, 0, 0, 1, 'DejaVu Sans')]
+    data = codec.compile(records)
+    
+    assert len(data) == 6 + 3 * 12 + len(name) + 11
+    assert codec.decompile(data)[1] == sorted(records)
+    assert codec.storageStats(data) == (2 * len(name) + 11, len(name) + 11)
+    assert codec.storageStats(data).saved == len(name)
+
+def test_suffixes():
+    records = [(1, 0, 0, 1, 'DejaVu Sans'), (1, 0, 0, 2, 'Sans'), (1, 0, 0, 3, 'ans'),
+               (1, 0, 0, 4, 'DejaVu Sans Mono'), (1, 0, 0, 5, ''), (1, 0, 0, 6, 'Mono')]
+    
+    plain = codec.compile(records)
+    shared = codec.compile(records, suffixes=True)
+    
+    assert codec.decompile(plain)[1] == codec.decompile(shared)[1] == records
+    assert codec.storageStats(plain).saved == 0
+    assert codec.storageStats(shared) == (38, 27)
+    
+def test_roundtrip_suffixes():
+    format, records, langTags = codec.decompile(_rawname())
+    data = codec.compile(records, suffixes=True)
+    
+    assert codec.decompile(data) == (format, records, langTags)
+    assert len(data) <= len(codec.compile(records))
+
+def test_strings():
+    assert codec.decodeString('\x00A\x00b', 3, 1) == u'Ab'
+    assert codec.decodeString('\xa9 Foo', 1, 0) == u'\xa9 Foo'
+    assert codec.encodeString(u'€', 3, 1) == '\x20\xac'
+    assert codec.encodeString(u'€', 1, 0) == '\xdb'
+    
+def test_errors():
+    assert_raises(codec.NameTableError, codec.decompile, '\x00\x00')
+    assert_raises(codec.NameTableError, codec.decompile, '\x00\x07\x00\x00\x00\x06')
+    assert_raises(codec.NameTableError, codec.decompile, _rawname()[:100])
+    assert_raises(codec.NameTableError, codec.encodeString, u'あ', 1, 0)
+    
+    #offsets only have 16 bits, but shared strings don't need new ones
+    big = [(1, 0, 0, i, chr(i) * 0x8000) for i in xrange(3)]
+    assert_raises(codec.NameTableError, codec.compile, big)
+    codec.compile([(1, 0, 0, i, 'x' * 0x8000) for i in xrange(3)])
@@ -0,0 +1,167 @@
+# This file is part of ttname.
+#
+# Copyright 2013 T.C. Hollingsworth <tchollingsworth@gmail.com>
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met: 
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer. 
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution. 
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+from StringIO import StringIO
+from fontTools.ttLib import TTFont
+from nose.tools import assert_raises_regexp
+import os
+import shutil
+import struct
+import tempfile
+
+from ttname import TTNameTable, TTNameCollection, sfnt
+from ttname.cli import TTNameCLI, TTNameCLIError
+
+_testfile = os.path.join(os.path.dirname(__file__), 'data/DejaVuSans.ttf')
+
+def _makeCollection(count=2, version=1):
+    """a collection of copies of the test font, sharing every table"""
+    font = open(_testfile, 'rb').read()
+    reader = sfnt.SFNTReader(StringIO(font))
+    numTables = len(reader.tables)
+    
+    headerSize = 12 + 4 * count + (12 if version >= 2 else 0)
+    dirSize = 12 + 16 * numTables
+    shift = headerSize + dirSize * count - dirSize
+    
+    data = [struct.pack('>4sHHL', 'ttcf', version, 0, count)]
+    data.extend(struct.pack('>L', headerSize + dirSize * i) for i in xrange(count))
+    if version >= 2:
+        data.append(struct.pack('>4sLL', 'DSIG', 8, 0))
+    for i in xrange(count):
+        data.append(font[:12])
+        for tag in sorted(reader.tables):
+            entry = reader.tables[tag]
+            data.append(struct.pack('>4sLLL', tag, entry.checksum, entry.offset + shift,
+                                    entry.length))
+    data.append(font[dirSize:])
+    
+    tempdir = tempfile.mkdtemp(prefix='ttname-test-collection-')
+    path = os.path.join(tempdir, 'fonts.ttc')
+    with open(path, 'wb') as f:
+        f.write(''.join(data))
+    return tempdir, path
+
+def _offsets(path, tag):
+    with open(path, 'rb') as f:
+        return [font.tables[tag].offset for font in sfnt.TTCReader(f).fonts]
+
+def test_collection_read():
+    tempdir, path = _makeCollection(3)
+    
+    c = TTNameCollection(path)
+    assert len(c.fonts) == 3
+    assert [t.getName(1, 3, 1, 1033).string for t in c.fonts] == ['DejaVu Sans'] * 3
+    
+    assert TTNameTable(path, font=2).getName(4, 1, 0, 0).string == 'DejaVu Sans'
+    assert_raises_regexp(sfnt.SFNTError, 'no font 3', TTNameTable, path, font=3)
+    assert_raises_regexp(sfnt.SFNTError, 'Not a font collection', TTNameTable,
+                         _testfile, font=1)
+    
+    shutil.rmtree(tempdir)
+
+def test_collection_header_read_once():
+    tempdir, path = _makeCollection(8)
+    
+    opened = []
+    TTCReader = sfnt.TTCReader
+    def counting(file):
+        opened.append(file)
+        return TTCReader(file)
+    
+    sfnt.TTCReader = counting
+    try:
+        for readonly in (False, True):
+            c = TTNameCollection(path, readonly=readonly)
+            assert [t.getName(1, 3, 1, 1033).string for t in c.fonts] == ['DejaVu Sans'] * 8
+    finally:
+        sfnt.TTCReader = TTCReader
+    
+    assert len(opened) == 2
+    shutil.rmtree(tempdir)
+
+def test_collection_write_one():
+    tempdir, path = _makeCollection(3)
+    size = os.path.getsize(path)
+    
+    t = TTNameTable(path, font=1)
+    t.setNames({1: 'DejaVu Sans Two'}, None, None, None, True)
+    t.save(path)
+    
+    assert [TTFont(path, fontNumber=i)['name'].getName(1, 3, 1, 1033).string.decode('utf-16be')
+            for i in xrange(3)] == ['DejaVu Sans', 'DejaVu Sans Two', 'DejaVu Sans']
+    
+    #everything else is still shared, and only one new name table was added
+    assert len(set(_offsets(path, 'glyf'))) == 1
+    names = _offsets(path, 'name')
+    assert names[0] == names[2] != names[1]
+    with open(path, 'rb') as f:
+        newName = sfnt.TTCReader(f).fonts[1].tables['name'].length
+    assert os.path.getsize(path) - size <= newName + 3
+    
+    shutil.rmtree(tempdir)
+
+def test_collection_write_all():
+    tempdir, path = _makeCollection(2, version=2)
+    
+    c = TTNameCollection(path)
+    for t in c.fonts:
+        t.setNames({0: 'Shared'}, None, None, None, True)
+    c.save(path)
+    
+    #identical new name tables are shared too
+    assert len(set(_offsets(path, 'name'))) == 1
+    assert [t.getName(0, 1, 0, 0).string for t in TTNameCollection(path).fonts] == \
+           ['Shared', 'Shared']
+    
+    #and the signature that no longer matches is gone
+    with open(path, 'rb') as f:
+        f.seek(12 + 4 * 2)
+        assert struct.unpack('>4sLL', f.read(12)) == ('\0\0\0\0', 0, 0)
+    
+    shutil.rmtree(tempdir)
+
+def test_collection_single_font():
+    c = TTNameCollection(_testfile)
+    assert len(c.fonts) == 1
+    assert not c.modified
+
+def test_collection_cli():
+    tempdir, path = _makeCollection(2)
+    
+    out = StringIO()
+    TTNameCLI(['--no-cache', '-f', 'all', '-n', 'family', path], False, stdout=out)
+    assert out.getvalue() == 'Font 0\n######\n\nDejaVu Sans\nFont 1\n######\n\nDejaVu Sans\n'
+    
+    TTNameCLI(['-f', '1', '--family=Other', path], False, stdout=StringIO())
+    TTNameCLI(['-f', 'all', '--copyright=Both', path], False, stdout=StringIO())
+    
+    c = TTNameCollection(path)
+    assert [t.getName(1, 1, 0, 0).string for t in c.fonts] == ['DejaVu Sans', 'Other']
+    assert [t.getName(0, 1, 0, 0).string for t in c.fonts] == ['Both', 'Both']
+    
+    assert_raises_regexp(TTNameCLIError, 'Invalid font', TTNameCLI, ['-f', 'x', path], False)
+    assert_raises_regexp(TTNameCLIError, 'no font 2', TTNameCLI, ['-f', '2', path], False)
+    
+    shutil.rmtree(tempdir)
@@ -0,0 +1,96 @@
+# This file is part of ttname.
+#
+# Copyright 2013 T.C. Hollingsworth <tchollingsworth@gmail.com>
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met: 
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer. 
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution. 
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+from nose.tools import assert_raises_regexp
+from StringIO import StringIO
+import json
+import os
+import shutil
+import sys
+import tempfile
+
+from ttname import TTNameTable
+from ttname.query import Query, TTNameQueryCLI, TTNameQueryError, search
+
+_testfile = os.path.join(os.path.dirname(__file__), 'data/DejaVuSans.ttf')
+
+def _fontdir():
+    tempdir = tempfile.mkdtemp(prefix='ttname-test-query-')
+    for i, vendor in enumerate(['Acme', 'Globex', 'Acme Type']):
+        t = TTNameTable(_testfile)
+        t.setNames({8: vendor}, None, None, None, True)
+        t.save(os.path.join(tempdir, 'font{0}.ttf'.format(i)))
+    return tempdir
+
+def _run(argv):
+    stdout = sys.stdout
+    sys.stdout = StringIO()
+    try:
+        cli = TTNameQueryCLI(argv + ['--no-cache'], False)
+        return cli, sys.stdout.getvalue()
+    finally:
+        sys.stdout = stdout
+
+def test_query_equals():
+    tempdir = _fontdir()
+    
+    matches = list(search([tempdir], Query(['mfg-name'], 'macintosh', equals='Acme')))
+    assert [os.path.basename(m.path) for m in matches] == ['font0.ttf']
+    assert matches[0].record.string == 'Acme'
+    
+    shutil.rmtree(tempdir)
+
+def test_query_predicates():
+    tempdir = _fontdir()
+    
+    q = Query([8], 3, contains='acme', ignoreCase=True)
+    assert [os.path.basename(m.path) for m in search([tempdir], q)] == ['font0.ttf', 'font2.ttf']
+    
+    q = Query(['mfg-name'], regex=r'^Glo')
+    assert set(m.record.platformID for m in search([tempdir], q)) == set([1, 3])
+    
+    shutil.rmtree(tempdir)
+
+def test_query_skips_decoding():
+    t = TTNameTable(_testfile, readonly=True)
+    list(Query([8], 'macintosh', equals='nope').filter(t))
+    assert all(n._string is None for n in t.names)
+
+def test_query_cli():
+    tempdir = _fontdir()
+    
+    cli, out = _run(['-L', '-n', 'mfg-name', '-r', 'Acme', tempdir])
+    assert cli.matches == 4
+    assert [os.path.basename(l) for l in out.splitlines()] == ['font0.ttf', 'font2.ttf']
+    
+    cli, out = _run(['--json', '-n', '8', '-p', 'windows', '--equals', 'Globex', tempdir])
+    rows = [json.loads(l) for l in out.splitlines()]
+    assert len(rows) == 1
+    assert (rows[0]['nameID'], rows[0]['platform'], rows[0]['value']) == (8, 3, 'Globex')
+    
+    shutil.rmtree(tempdir)
+
+def test_error_bad_query():
+    assert_raises_regexp(TTNameQueryError, 'Invalid regex', Query, regex='(')
+    assert_raises_regexp(TTNameQueryError, 'Invalid name', Query, ['potato'])
@@ -22,10 +22,14 @@
 # (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
 # SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
+from nose.tools import assert_raises
+from StringIO import StringIO
 import os
 import random
+import sys
 
-from ttname import TTNameTable
+from ttname import TTNameTable, sfnt, table
+from ttname.table import TTNameTableError
 from util import get_fontconfig_data
 
 _testfile = os.path.join(os.path.dirname(__file__), 'data/DejaVuSans.ttf')
@@ -86,3 +90,59 @@ def test_get_names_by_sect():
         assert sectinfo.platformID == sect[random.randrange(0, len(sect))].platformID
         assert sectinfo.platEncID == sect[random.randrange(0, len(sect))].platEncID
         assert sectinfo.langID == sect[random.randrange(0, len(sect))].langID
+
+def test_records():
+    t = TTNameTable(_testfile)
+    rec = t.getName(1,3,1,1033)
+    
+    assert not hasattr(rec, '__dict__')
+    assert (rec.nameID, rec.platformID, rec.platEncID, rec.langID) == (1, 3, 1, 1033)
+    assert rec.data == u'DejaVu Sans'.encode('utf_16_be')
+    assert rec.string is rec.string
+
+def test_xml_fallback():
+    #a name table format we can't decode has to go through TTX instead
+    reader = sfnt.SFNTReader(open(_testfile, 'rb'))
+    data = reader['name']
+    out = StringIO()
+    sfnt.write(reader, out, {'name': '\0\x02' + data[2:]})
+    out.seek(0)
+    
+    stdout = sys.stdout
+    t = TTNameTable(out)
+    assert sys.stdout is stdout
+    
+    assert t.getName(1,1,0,0).string == 'DejaVu Sans'
+    assert len(list(t.names)) == len(list(TTNameTable(_testfile).names))
+
+def test_bounded():
+    t = TTNameTable(_testfile, bounded=True)
+    assert t.getName(1,1,0,0).string == 'DejaVu Sans'
+    
+    #falling back on TTX would mean loading the whole font
+    reader = sfnt.SFNTReader(open(_testfile, 'rb'))
+    out = StringIO()
+    sfnt.write(reader, out, {'name': '\0\x02' + reader['name'][2:]})
+    out.seek(0)
+    assert_raises(sfnt.SFNTError, TTNameTable, out, bounded=True)
+    
+    assert table.memoryCeiling(1024) < table.memoryCeiling(4096)
+    assert table.memoryCeiling(1024, piped=True) > table.memoryCeiling(1024)
+
+def test_readonly():
+    t = TTNameTable(_testfile, readonly=True)
+    rec = t.getName(1,3,1,1033)
+    
+    #the data points straight into the mapped file
+    assert not isinstance(rec.data, str)
+    assert rec.string == 'DejaVu Sans'
+    assert t.getName(0,1,0,0).string.startswith('Copyright (c) 2003 by Bitstream, Inc.')
+    assert t.compile() == TTNameTable(_testfile).compile()
+    
+    assert_raises(TTNameTableError, t.getName, 150, 1, 0, 0, True)
+    assert_raises(TTNameTableError, t.delName, 1, 1, 0, 0)
+    assert_raises(TTNameTableError, t.save, StringIO())
+
+def test_readonly_unmappable():
+    t = TTNameTable(StringIO(open(_testfile, 'rb').read()), readonly=True)
+    assert t.getName(1,1,0,0).string == 'DejaVu Sans'
@@ -0,0 +1,117 @@
+# This file is part of ttname.
+#
+# Copyright 2013 T.C. Hollingsworth <tchollingsworth@gmail.com>
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met: 
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer. 
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution. 
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+from StringIO import StringIO
+from nose.tools import assert_raises_regexp
+import os
+import shutil
+import tempfile
+
+from ttname import TTNameTable
+from ttname.cli import TTNameCLI, TTNameCLIError
+from ttname.script import TTNameScriptError, parse, run
+from ttname.timing import PhaseTimer
+
+_testfile = os.path.join(os.path.dirname(__file__), 'data/DejaVuSans.ttf')
+
+_script = '''
+# release metadata
+set copyright "Copyright Example"
+section windows/1/1033
+set sample 'Hello, world'
+delete 200
+copy-section 3/1/1033 3/1/1031
+section 3/1/1031
+set family "DejaVu Sans (de)"
+rename-section macintosh/0/0 1/0/11
+'''
+
+def test_parse():
+    ops = parse(StringIO(_script))
+    assert [op.command for op in ops] == ['set', 'section', 'set', 'delete', 'copy-section',
+                                          'section', 'set', 'rename-section']
+    assert ops[0].line == 3
+    assert ops[1].args == [(3, 1, 1033)]
+    assert ops[7].args == [(1, 0, 0), (1, 0, 11)]
+
+def test_parse_errors():
+    for text, message in [('frobnicate 1', 'line 1: Unknown command'),
+                          ('\nset copyright', 'line 2: set takes 2 arguments'),
+                          ('section 3/1', 'Invalid section'),
+                          ('delete potato', 'Invalid name'),
+                          ('copy-section all 3/1/1033', 'needs an explicit section'),
+                          ('set copyright "unterminated', 'line 1')]:
+        assert_raises_regexp(TTNameScriptError, message, parse, StringIO(text))
+
+def test_run():
+    t = TTNameTable(_testfile)
+    macNames = len(list(t.getSection(1, 0, 0)))
+    
+    run(t, parse(StringIO(_script)), (1, 0, 0))
+    
+    assert t.getName(0, 1, 0, 0) is None
+    assert t.getName(0, 1, 0, 11).string == 'Copyright Example'
+    assert len(list(t.getSection(1, 0, 11))) == macNames
+    assert t.getName(19, 3, 1, 1033).string == 'Hello, world'
+    assert t.getName(19, 3, 1, 1031).string == 'Hello, world'
+    assert t.getName(1, 3, 1, 1031).string == 'DejaVu Sans (de)'
+    assert t.getName(1, 3, 1, 1033).string == 'DejaVu Sans'
+
+def test_run_all():
+    t = TTNameTable(_testfile)
+    run(t, parse(StringIO('section all\nset copyright foo\ndelete license')), (1, 0, 0))
+    
+    assert [n.string for n in t.getNameFromAll(0)] == ['foo', 'foo']
+    assert list(t.getNameFromAll(13)) == []
+
+def test_cli_script():
+    tempdir = tempfile.mkdtemp(prefix='ttname-test-script-')
+    fontfile = os.path.join(tempdir, 'font.ttf')
+    scriptfile = os.path.join(tempdir, 'edits.ttname')
+    shutil.copy2(_testfile, fontfile)
+    with open(scriptfile, 'w') as f:
+        f.write(_script)
+    
+    timer = PhaseTimer()
+    TTNameCLI(['--script', scriptfile, '--name200=x', fontfile], False, timer=timer)
+    assert [p.name for p in timer.phases].count('write') == 1
+    
+    t = TTNameTable(fontfile)
+    assert t.getName(1, 3, 1, 1031).string == 'DejaVu Sans (de)'
+    assert t.getName(200, 1, 0, 11).string == 'x'
+    
+    shutil.rmtree(tempdir)
+
+def test_error_cli_script():
+    tempdir = tempfile.mkdtemp(prefix='ttname-test-script-')
+    scriptfile = os.path.join(tempdir, 'edits.ttname')
+    with open(scriptfile, 'w') as f:
+        f.write('section 1/0/0\nset copyright \xe2\x98\x83')
+    
+    assert_raises_regexp(TTNameCLIError, 'Invalid script: line 2', TTNameCLI,
+                         ['--script', scriptfile, _testfile, os.path.join(tempdir, 'out.ttf')],
+                         False)
+    assert os.listdir(tempdir) == ['edits.ttname']
+    
+    shutil.rmtree(tempdir)
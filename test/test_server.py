@@ -0,0 +1,241 @@
+# This file is part of ttname.
+#
+# Copyright 2013 T.C. Hollingsworth <tchollingsworth@gmail.com>
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met: 
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer. 
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution. 
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+from StringIO import StringIO
+from nose.tools import assert_raises_regexp
+import json
+import os
+import shutil
+import socket
+import tempfile
+import threading
+
+from ttname import TTNameTable
+from ttname.cli import TTNameCLI, TTNameCLIError, trustedSocket
+from ttname.server import TTNameServer, TTNameClient, TTNameClientError, _privateDirectory
+
+_testfile = os.path.join(os.path.dirname(__file__), 'data/DejaVuSans.ttf')
+
+class _Daemon(object):
+    def __init__(self):
+        self.tempdir = tempfile.mkdtemp(prefix='ttname-test-server-')
+        self.socket = os.path.join(self.tempdir, 'ttname.sock')
+        self.fontfile = os.path.join(self.tempdir, 'font.ttf')
+        shutil.copy2(_testfile, self.fontfile)
+        
+        self.server = TTNameServer(self.socket, maxTables=2)
+        self.thread = threading.Thread(target=self.server.serve_forever, args=(0.05,))
+        self.thread.start()
+        self.client = TTNameClient(self.socket)
+    
+    def stop(self):
+        self.client.call('shutdown')
+        self.thread.join()
+        self.server.server_close()
+        shutil.rmtree(self.tempdir)
+
+def test_server_read():
+    d = _Daemon()
+    try:
+        names = d.client.call('read', path=d.fontfile)
+        assert len(names) == len(list(TTNameTable(_testfile).names))
+        
+        [name] = d.client.call('read', path=d.fontfile, nameID='family')[:1]
+        assert (name['nameID'], name['value']) == (1, 'DejaVu Sans')
+        assert len(d.server.tables._tables) == 1
+    finally:
+        d.stop()
+
+def test_server_edit():
+    d = _Daemon()
+    try:
+        d.client.call('read', path=d.fontfile)
+        updated = d.client.call('edit', path=d.fontfile, names={'copyright': 'foo'},
+                                all=True)
+        assert [n['value'] for n in updated] == ['foo', 'foo']
+        
+        #the stale table was dropped, so this sees the edit
+        names = d.client.call('read', path=d.fontfile, nameID=0)
+        assert [n['value'] for n in names] == ['foo', 'foo']
+    finally:
+        d.stop()
+
+def test_server_run():
+    d = _Daemon()
+    try:
+        result = d.client.call('run', argv=['-n', 'family', 'font.ttf'], cwd=d.tempdir)
+        assert result['status'] == 0
+        assert result['stdout'] == 'DejaVu Sans\n'
+        
+        result = d.client.call('run', argv=['nonexistent.ttf'], cwd=d.tempdir)
+        assert result['status'] == 1
+        assert 'Unable to open input file' in result['stderr']
+    finally:
+        d.stop()
+
+def test_server_errors():
+    d = _Daemon()
+    try:
+        assert_raises_regexp(TTNameClientError, 'Method not found', d.client.call, 'potato')
+        assert_raises_regexp(TTNameClientError, 'Invalid params', d.client.call, 'read')
+        assert_raises_regexp(TTNameClientError, "can't serve", d.client.call, 'run',
+                             argv=['-', '--copyright=foo'])
+        
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(d.socket)
+        sock.sendall('{bad json\n')
+        response = json.loads(sock.makefile().readline())
+        sock.close()
+        assert response['error']['code'] == -32700
+    finally:
+        d.stop()
+
+def test_server_invalid_params():
+    d = _Daemon()
+    try:
+        for params in [{'encoding': '1'}, {'lang': 1.5}, {'platform': 'potato'},
+                       {'encoding': 0x10000}, {'names': {'potato': 'foo'}},
+                       {'names': {'40000': 'foo'}}, {'names': {'1': 1}},
+                       {'names': ['foo']}]:
+            request = dict({'path': d.fontfile, 'names': {'copyright': 'foo'},
+                            'platform': 3}, **params)
+            response = d.server.dispatch(json.dumps({'jsonrpc': '2.0', 'id': 1,
+                                                     'method': 'edit', 'params': request}))
+            assert response['error']['code'] == -32602, params
+        
+        assert_raises_regexp(TTNameClientError, 'encoding must be a number', d.client.call,
+                             'edit', path=d.fontfile, names={'family': 'foo'}, encoding='1')
+        assert TTNameTable(d.fontfile).getName(0, 3, 1, 1033).string != 'foo'
+    finally:
+        d.stop()
+
+def test_server_internal_error():
+    d = _Daemon()
+    try:
+        d.server.rpc_boom = lambda: 1 // 0
+        response = d.server.dispatch('{"jsonrpc": "2.0", "id": 7, "method": "boom"}')
+        assert response['id'] == 7
+        assert response['error']['code'] == -32603
+        
+        #and the server carries on
+        assert_raises_regexp(TTNameClientError, 'Internal error', d.client.call, 'boom')
+        assert d.client.call('read', path=d.fontfile, nameID='family')
+    finally:
+        d.stop()
+
+def test_trusted_socket():
+    tempdir = tempfile.mkdtemp(prefix='ttname-test-server-socket-')
+    path = os.path.join(tempdir, 'ttname.sock')
+    try:
+        assert not trustedSocket(path)
+        
+        #something that isn't a socket, like a file planted by someone else
+        open(path, 'w').close()
+        assert not trustedSocket(path)
+        os.unlink(path)
+        
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.bind(path)
+        assert trustedSocket(path)
+        
+        #a link to a socket doesn't count
+        link = os.path.join(tempdir, 'link.sock')
+        os.symlink(path, link)
+        assert not trustedSocket(link)
+        sock.close()
+    finally:
+        shutil.rmtree(tempdir)
+
+def test_cli_untrusted_socket():
+    tempdir = tempfile.mkdtemp(prefix='ttname-test-server-socket-')
+    path = os.path.join(tempdir, 'ttname.sock')
+    open(path, 'w').close()
+    try:
+        out = StringIO()
+        TTNameCLI(['--socket', path, '-n', 'family', _testfile], False, stdout=out)
+        assert out.getvalue() == 'DejaVu Sans\n'
+    finally:
+        shutil.rmtree(tempdir)
+
+def test_private_socket_directory():
+    tempdir = tempfile.mkdtemp(prefix='ttname-test-server-socket-')
+    try:
+        private = os.path.join(tempdir, 'private')
+        _privateDirectory(private)
+        assert os.stat(private).st_mode & 0777 == 0700
+        _privateDirectory(private)
+        
+        os.chmod(private, 0755)
+        assert_raises_regexp(TTNameCLIError, 'not a private directory',
+                             _privateDirectory, private)
+    finally:
+        shutil.rmtree(tempdir)
+
+def test_cli_forwarding():
+    d = _Daemon()
+    try:
+        out = StringIO()
+        TTNameCLI(['--socket', d.socket, '--copyright=bar', d.fontfile], False, stdout=out)
+        assert out.getvalue() == 'bar\n'
+        
+        out = StringIO()
+        TTNameCLI(['--socket', d.socket, '-n', 'copyright', d.fontfile], False, stdout=out)
+        assert out.getvalue() == 'bar\n'
+        assert len(d.server.tables._tables) == 1
+        
+        assert_raises_regexp(TTNameCLIError, 'Unable to open input file', TTNameCLI,
+                             ['--socket', d.socket, 'nonexistent.ttf'], False)
+    finally:
+        d.stop()
+
+def test_cli_forwarded_status():
+    d = _Daemon()
+    try:
+        runs = []
+        rpc_run = d.server.rpc_run
+        def counting(*args, **kwargs):
+            runs.append(args)
+            return rpc_run(*args, **kwargs)
+        d.server.rpc_run = counting
+        
+        stderr = StringIO()
+        try:
+            TTNameCLI(['--socket', d.socket, '--unchanged-status=3', '--family=DejaVu Sans',
+                       d.fontfile], stdout=StringIO(), stderr=stderr)
+        except SystemExit as e:
+            assert e.code == 3
+        else:
+            assert False, 'the unchanged status was lost'
+        
+        #it was the daemon that did it
+        assert stderr.getvalue() == '{0}: unchanged\n'.format(d.fontfile)
+        assert len(runs) == 1
+    finally:
+        d.stop()
+
+def test_cli_without_daemon():
+    out = StringIO()
+    TTNameCLI(['--socket', '/nonexistent/ttname.sock', '-n', 'family', _testfile],
+              False, stdout=out)
+    assert out.getvalue() == 'DejaVu Sans\n'
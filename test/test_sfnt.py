@@ -0,0 +1,136 @@
+# This file is part of ttname.
+#
+# Copyright 2013 T.C. Hollingsworth <tchollingsworth@gmail.com>
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met: 
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer. 
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution. 
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+from nose.tools import assert_raises_regexp
+from fontTools.ttLib import TTFont
+from StringIO import StringIO
+import os
+import shutil
+import tempfile
+
+from ttname import TTNameTable, sfnt
+
+_testfile = os.path.join(os.path.dirname(__file__), 'data/DejaVuSans.ttf')
+
+def _patched(string):
+    t = TTNameTable(_testfile)
+    t.getName(1, 1, 0, 0).string = string
+    out = StringIO()
+    t.save(out)
+    return out.getvalue()
+
+def test_other_tables_untouched():
+    old = sfnt.SFNTReader(open(_testfile, 'rb'))
+    new = sfnt.SFNTReader(StringIO(_patched('A Much Longer Family Name Than Before')))
+    
+    assert old.tables.keys() == new.tables.keys()
+    
+    for tag in old.tables:
+        if tag == 'head':
+            assert old[tag][:8] == new[tag][:8]
+            assert old[tag][12:] == new[tag][12:]
+        elif tag != 'name':
+            assert old[tag] == new[tag]
+            assert old.tables[tag].checksum == new.tables[tag].checksum
+
+def test_checksums():
+    data = _patched('Potato Sans')
+    
+    assert sfnt.calcChecksum(data) == 0xB1B0AFBA
+    
+    reader = sfnt.SFNTReader(StringIO(data))
+    for tag, entry in reader.tables.iteritems():
+        table = reader[tag]
+        if tag == 'head':
+            table = table[:8] + '\0\0\0\0' + table[12:]
+        assert sfnt.calcChecksum(table) == entry.checksum
+    
+    tt = TTFont(StringIO(data))
+    assert tt['name'].getName(1, 1, 0).string == 'Potato Sans'
+
+def test_save_over_source():
+    tempfn = tempfile.mktemp(prefix='ttname-test-sfnt-save-over-', suffix='.ttf')
+    shutil.copy2(_testfile, tempfn)
+    
+    t = TTNameTable(tempfn)
+    t.getName(1, 1, 0, 0).string = 'Cake Sans'
+    t.save(tempfn)
+    
+    assert TTNameTable(tempfn).getName(1, 1, 0, 0).string == 'Cake Sans'
+    
+    os.unlink(tempfn)
+
+def _fakeCopyFileRange(src, dst, count, offset_src, offset_dst):
+    #copies a few bytes at a time to make sure partial copies are carried on
+    os.lseek(src, offset_src, os.SEEK_SET)
+    data = os.read(src, min(count, 4093))
+    os.lseek(dst, offset_dst, os.SEEK_SET)
+    return os.write(dst, data)
+
+def _fakeSendfile(out, in_, offset, count):
+    os.lseek(in_, offset, os.SEEK_SET)
+    return os.write(out, os.read(in_, min(count, 4093)))
+
+def _unsupported(*args):
+    raise OSError(38, 'Function not implemented')
+
+def _savedWith(name, function):
+    had = hasattr(os, name)
+    old = getattr(os, name, None)
+    setattr(os, name, function)
+    
+    tempfn = tempfile.mktemp(prefix='ttname-test-sfnt-copy-', suffix='.ttf')
+    try:
+        t = TTNameTable(_testfile)
+        t.getName(1, 1, 0, 0).string = 'Potato Sans'
+        t.save(tempfn)
+        with open(tempfn, 'rb') as f:
+            return f.read()
+    finally:
+        if had:
+            setattr(os, name, old)
+        else:
+            delattr(os, name)
+        os.unlink(tempfn)
+
+def test_kernel_copy():
+    expected = _patched('Potato Sans')
+    
+    assert _savedWith('copy_file_range', _fakeCopyFileRange) == expected
+    assert _savedWith('sendfile', _fakeSendfile) == expected
+    assert _savedWith('copy_file_range', _unsupported) == expected
+
+def test_chunked_copy():
+    chunkSize = sfnt.CHUNK_SIZE
+    sfnt.CHUNK_SIZE = 1000
+    try:
+        assert _patched('Potato Sans') == _savedWith('sendfile', _unsupported)
+    finally:
+        sfnt.CHUNK_SIZE = chunkSize
+
+def test_bad_font():
+    assert_raises_regexp(sfnt.SFNTError, 'Not a TrueType or OpenType font',
+                         sfnt.SFNTReader, StringIO('potato'))
+    assert_raises_regexp(sfnt.SFNTError, 'Not a TrueType or OpenType font',
+                         sfnt.SFNTReader, StringIO('\0\1\0\0\0\xff' + '\0' * 6))
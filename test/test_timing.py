@@ -0,0 +1,74 @@
+# This file is part of ttname.
+#
+# Copyright 2013 T.C. Hollingsworth <tchollingsworth@gmail.com>
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met: 
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer. 
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution. 
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+from StringIO import StringIO
+import os
+
+from ttname import TTNameTable
+from ttname.timing import PhaseTimer, PhaseStats
+
+_testfile = os.path.join(os.path.dirname(__file__), 'data/DejaVuSans.ttf')
+
+def test_phases():
+    seen = []
+    timer = PhaseTimer([seen.append])
+    
+    with timer.phase('one') as p:
+        p.bytesRead += 10
+    with timer.phase('two') as p:
+        p.bytesWritten += 20
+    with timer.phase('one') as p:
+        p.bytesRead += 5
+    
+    assert [s.name for s in seen] == ['one', 'two', 'one']
+    assert all(s.wall >= 0 and s.cpu >= 0 for s in seen)
+    
+    totals = timer.totals()
+    assert [t.name for t in totals] == ['one', 'two']
+    assert totals[0].bytesRead == 15
+    assert totals[1].bytesWritten == 20
+
+def test_merge():
+    timer = PhaseTimer()
+    timer.merge([('open', 1.0, 0.5, 100, 0, 1000)])
+    timer.merge([PhaseStats('open', 2.0, 1.0, 50, 0, 2000)])
+    
+    [total] = timer.totals()
+    assert (total.wall, total.cpu, total.bytesRead, total.maxrss) == (3.0, 1.5, 150, 2000)
+
+def test_table_phases():
+    timer = PhaseTimer()
+    t = TTNameTable(_testfile, timer=timer)
+    t.setNames({0: 'foo'}, 1, 0, 0)
+    out = StringIO()
+    t.save(out)
+    
+    phases = dict((p.name, p) for p in timer.totals())
+    assert set(phases) == set(['open', 'decode', 'compile', 'write'])
+    assert phases['decode'].bytesRead > 0
+    assert phases['write'].bytesWritten == len(out.getvalue())
+    
+    report = StringIO()
+    timer.report(report)
+    assert 'decode' in report.getvalue()
@@ -0,0 +1,302 @@
+# This file is part of ttname.
+#
+# Copyright 2013 T.C. Hollingsworth <tchollingsworth@gmail.com>
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met: 
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer. 
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution. 
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+from StringIO import StringIO
+from nose.plugins.skip import SkipTest
+from nose.tools import assert_raises_regexp
+import os
+import shutil
+import struct
+import tempfile
+import zlib
+
+from ttname import TTNameTable, sfnt, woff
+from ttname.cli import TTNameCLI
+
+_testfile = os.path.join(os.path.dirname(__file__), 'data/DejaVuSans.ttf')
+
+_metadata = '<?xml version="1.0" encoding="UTF-8"?><metadata version="1.0"/>'
+_private = 'ttname test private data'
+
+def _makeWOFF():
+    """the test font as a WOFF, with a metadata and a private block"""
+    font = open(_testfile, 'rb').read()
+    reader = sfnt.SFNTReader(StringIO(font))
+    tags = sorted(reader.tables)
+    
+    pos = 44 + 20 * len(tags)
+    directory = []
+    data = []
+    for tag in tags:
+        entry = reader.tables[tag]
+        table = reader[tag]
+        compressed = zlib.compress(table)
+        if len(compressed) >= len(table):
+            compressed = table
+        directory.append(struct.pack('>4sLLLL', tag, pos, len(compressed), len(table),
+                                     entry.checksum))
+        data.append(compressed + '\0' * sfnt._pad(len(compressed)))
+        pos += len(data[-1])
+    
+    meta = zlib.compress(_metadata)
+    metaOffset = pos
+    pos += len(meta) + sfnt._pad(len(meta))
+    privOffset = pos
+    pos += len(_private)
+    
+    header = struct.pack('>4s4sLHHLHHLLLLL', 'wOFF', reader.sfntVersion, pos, len(tags), 0,
+                         len(font), 1, 0, metaOffset, len(meta), len(_metadata),
+                         privOffset, len(_private))
+    
+    tempdir = tempfile.mkdtemp(prefix='ttname-test-woff-')
+    path = os.path.join(tempdir, 'font.woff')
+    with open(path, 'wb') as f:
+        f.write(header + ''.join(directory) + ''.join(data))
+        f.write(meta + '\0' * sfnt._pad(len(meta)) + _private)
+    return tempdir, path
+
+def _makeWOFF2():
+    """the test font as a WOFF2, with none of its tables transformed"""
+    font = open(_testfile, 'rb').read()
+    reader = sfnt.SFNTReader(StringIO(font))
+    
+    directory = []
+    data = []
+    for tag in reader.tables:
+        #glyf and loca need transform version 3 to be left alone
+        flags = woff._woff2Tags.index(tag) if tag in woff._woff2Tags else 0x3F
+        if tag in ('glyf', 'loca'):
+            flags |= 0xC0
+        directory.append(chr(flags) + (tag if flags & 0x3F == 0x3F else ''))
+        directory.append(woff._packBase128(reader.tables[tag].length))
+        data.append(reader[tag])
+    
+    directory = ''.join(directory)
+    compressed = woff.brotli.compress(''.join(data))
+    length = 48 + len(directory) + len(compressed)
+    
+    header = struct.pack('>4s4sLHHLLHHLLLLL', 'wOF2', reader.sfntVersion, length,
+                         len(reader.tables), 0, len(font), len(compressed), 1, 0,
+                         0, 0, 0, 0, 0)
+    
+    tempdir = tempfile.mkdtemp(prefix='ttname-test-woff2-')
+    path = os.path.join(tempdir, 'font.woff2')
+    with open(path, 'wb') as f:
+        f.write(header + directory + compressed)
+    return tempdir, path
+
+def _decode(path):
+    """decompress a WOFF back to plain sfnt, the way a browser would"""
+    data = open(path, 'rb').read()
+    header = struct.unpack_from('>4s4sLHHLHHLLLLL', data)
+    numTables = header[3]
+    
+    tables = {}
+    for i in xrange(numTables):
+        tag, offset, compLength, origLength, checksum = \
+                struct.unpack_from('>4sLLLL', data, 44 + 20 * i)
+        table = data[offset:offset + compLength]
+        if compLength < origLength:
+            table = zlib.decompress(table)
+        tables[tag] = (checksum, table)
+    
+    pos = 12 + 16 * numTables
+    out = [struct.pack('>4sHHHH', header[1], numTables, *sfnt._searchParams(numTables))]
+    for tag in sorted(tables):
+        checksum, table = tables[tag]
+        out.append(struct.pack('>4sLLL', tag, checksum, pos, len(table)))
+        pos += len(table) + sfnt._pad(len(table))
+    for tag in sorted(tables):
+        table = tables[tag][1]
+        out.append(table + '\0' * sfnt._pad(len(table)))
+    
+    assert len(''.join(out)) == header[5]
+    return ''.join(out)
+
+def _raw(path, entry):
+    with open(path, 'rb') as f:
+        f.seek(entry.offset)
+        return f.read(entry.length)
+
+def test_woff_read():
+    tempdir, path = _makeWOFF()
+    
+    for readonly in (False, True):
+        table = TTNameTable(path, readonly)
+        assert table.getName(1, 3, 1, 1033).string == 'DejaVu Sans'
+        assert table.getName(4, 1, 0, 0).string == 'DejaVu Sans'
+    
+    with open(path, 'rb') as f:
+        reader = sfnt.openFont(f)
+        assert isinstance(reader, woff.WOFFReader)
+        assert reader['name'] == sfnt.SFNTReader(open(_testfile, 'rb'))['name']
+        assert_raises_regexp(sfnt.SFNTError, 'Not a font collection', sfnt.openFont, f, 1)
+    
+    shutil.rmtree(tempdir)
+
+def test_woff_write():
+    tempdir, path = _makeWOFF()
+    outpath = os.path.join(tempdir, 'out.woff')
+    
+    table = TTNameTable(path)
+    table.setNames({1: u'DejaVu Sans Web'}, 3, 1, 1033)
+    table.save(outpath)
+    
+    assert TTNameTable(outpath).getName(1, 3, 1, 1033).string == 'DejaVu Sans Web'
+    
+    with open(path, 'rb') as f, open(outpath, 'rb') as g:
+        old = woff.WOFFReader(f)
+        new = woff.WOFFReader(g)
+        assert list(new.tables) == sorted(new.tables) == list(old.tables)
+        
+        #every other table's compressed stream is just copied
+        for tag in old.tables:
+            if tag not in ('name', 'head'):
+                assert _raw(path, old.tables[tag]) == _raw(outpath, new.tables[tag])
+        assert new['name'] == table.compile()
+        assert old.verify() == new.verify() == []
+        
+        assert (new.metaOrigLength, new.privLength) == (len(_metadata), len(_private))
+        assert zlib.decompress(_raw(outpath, new.tables['name']._replace(
+                    offset=new.metaOffset, length=new.metaLength))) == _metadata
+        assert new.privOffset % 4 == 0
+        assert _raw(outpath, new.tables['name']._replace(
+                    offset=new.privOffset, length=new.privLength)) == _private
+        assert new.metaOffset + new.metaLength <= new.privOffset
+        assert os.path.getsize(outpath) == new.privOffset + new.privLength
+    
+    #what it decompresses to is a valid font with the right checksums
+    font = _decode(outpath)
+    assert sfnt.calcChecksum(font) == sfnt._checksumMagic
+    reader = sfnt.SFNTReader(StringIO(font))
+    for tag, entry in reader.tables.iteritems():
+        data = reader[tag]
+        if tag == 'head':
+            data = data[:8] + '\0\0\0\0' + data[12:]
+        assert sfnt.calcChecksum(data) == entry.checksum
+    
+    shutil.rmtree(tempdir)
+
+def test_woff_bounded():
+    tempdir, path = _makeWOFF()
+    
+    table = TTNameTable(path, bounded=True)
+    table.setNames({1: u'DejaVu Sans Web'}, 3, 1, 1033)
+    table.save(path)
+    assert TTNameTable(path).getName(1, 3, 1, 1033).string == 'DejaVu Sans Web'
+    
+    shutil.rmtree(tempdir)
+
+def test_woff_inplace():
+    tempdir, path = _makeWOFF()
+    
+    TTNameCLI(['--family=DejaVu Sans Web', path], False)
+    assert TTNameTable(path).getName(1, 1, 0, 0).string == 'DejaVu Sans Web'
+    assert os.listdir(tempdir) == ['font.woff']
+    
+    shutil.rmtree(tempdir)
+
+def test_woff2():
+    if woff.brotli is None:
+        raise SkipTest('brotli is not installed')
+    
+    tempdir, path = _makeWOFF2()
+    outpath = os.path.join(tempdir, 'out.woff2')
+    
+    table = TTNameTable(path)
+    assert table.getName(1, 3, 1, 1033).string == 'DejaVu Sans'
+    table.setNames({1: u'DejaVu Sans Web'}, 3, 1, 1033)
+    table.save(outpath)
+    
+    assert TTNameTable(outpath).getName(1, 3, 1, 1033).string == 'DejaVu Sans Web'
+    
+    with open(path, 'rb') as f, open(outpath, 'rb') as g:
+        old = woff.WOFF2Reader(f)
+        new = woff.WOFF2Reader(g)
+        assert list(new.tables) == list(old.tables)
+        for tag in old.tables:
+            if tag != 'name':
+                assert new[tag] == old[tag]
+        assert new['name'] == table.compile()
+        assert new.totalSfntSize == old.totalSfntSize + \
+                    len(new['name']) + sfnt._pad(len(new['name'])) - \
+                    len(old['name']) - sfnt._pad(len(old['name']))
+    
+    shutil.rmtree(tempdir)
+
+def test_woff2_transformed():
+    if woff.brotli is None:
+        raise SkipTest('brotli is not installed')
+    
+    tempdir, path = _makeWOFF2()
+    with open(path, 'rb') as f:
+        data = f.read()
+    
+    #mark glyf as transformed, with the same data
+    reader = woff.WOFF2Reader(StringIO(data))
+    index = 48
+    for tag, entry in reader.tables.iteritems():
+        if tag == 'glyf':
+            break
+        index += 1 + (4 if entry.flags & 0x3F == 0x3F else 0) + \
+                 len(woff._packBase128(entry.origLength))
+    glyf = reader.tables['glyf']
+    length = woff._packBase128(glyf.origLength)
+    data = data[:index] + chr(glyf.flags & 0x3F) + length + length + \
+           data[index + 1 + len(length):]
+    
+    reader = woff.WOFF2Reader(StringIO(data))
+    assert reader.tables['glyf'].transformLength == glyf.origLength
+    assert_raises_regexp(sfnt.SFNTError, 'transformed', reader.__getitem__, 'glyf')
+    assert TTNameTable(StringIO(data)).getName(1, 3, 1, 1033).string == 'DejaVu Sans'
+    
+    shutil.rmtree(tempdir)
+
+def test_woff2_bounded():
+    if woff.brotli is None:
+        raise SkipTest('brotli is not installed')
+    
+    #the whole font would have to be decompressed at once
+    tempdir, path = _makeWOFF2()
+    assert_raises_regexp(sfnt.SFNTError, 'bounded', TTNameTable, path, bounded=True)
+    assert_raises_regexp(sfnt.SFNTError, 'bounded', TTNameTable, path, readonly=True,
+                         bounded=True)
+    shutil.rmtree(tempdir)
+
+def test_woff2_without_brotli():
+    brotli = woff.brotli
+    woff.brotli = None
+    try:
+        assert_raises_regexp(sfnt.SFNTError, 'brotli', woff.WOFF2Reader,
+                             StringIO('wOF2' + '\0' * 44))
+    finally:
+        woff.brotli = brotli
+
+def test_base128():
+    for value in (0, 1, 127, 128, 16383, 16384, 2 ** 32 - 1):
+        data = woff._packBase128(value)
+        assert woff._readBase128(data + 'x', 0) == (value, len(data))
+    assert_raises_regexp(sfnt.SFNTError, 'UIntBase128', woff._readBase128, '\x80\x01', 0)
+    assert len(woff._woff2Tags) == 63
@@ -25,7 +25,10 @@
 import os
 import pprint
 import random
+import shutil
+import sys
 import tempfile
+import threading
 
 from ttname import TTNameTable
 from util import get_fontconfig_data
@@ -91,4 +94,90 @@ def test_write_new_fields():
         assert new_t.getName(i, 1, 0, 0).string == 'Cake'
         
     os.unlink(tempfn)
-    
\ No newline at end of file
+    
+def test_delete_fields():
+    tempfh = tempfile.NamedTemporaryFile(prefix='ttname-test-write-delete-', suffix='.ttf', delete=False)
+    tempfn = tempfh.name
+
+    t = TTNameTable(_testfile)
+    
+    assert t.delName(8, 1, 0, 0).string == 'DejaVu fonts team'
+    assert t.delName(8, 1, 0, 0) is None
+    assert t.getName(8, 1, 0, 0) is None
+    assert 8 not in [n.nameID for n in t.getSection(1, 0, 0)]
+    assert 1 not in [n.platformID for n in t.getNameFromAll(8)]
+    
+    t.save(tempfh)
+    tempfh.close()
+    
+    new_t = TTNameTable(tempfn)
+    assert new_t.getName(8, 1, 0, 0) is None
+    assert new_t.getName(8, 3, 1, 1033).string == 'DejaVu fonts team'
+    
+    os.unlink(tempfn)
+
+def test_new_fields_indexed():
+    t = TTNameTable(_testfile)
+    
+    new = t.getName(150, 3, 1, 1033, True)
+    
+    assert t.getName(150, 3, 1, 1033) is new
+    assert new in list(t.getNameFromAll(150))
+    assert new in list(t.getSection(3, 1, 1033))
+    assert t.getName(150, 3, 1, 1033, True) is new
+
+def test_modified():
+    t = TTNameTable(_testfile)
+    family = t.getName(1, 3, 1, 1033).string
+    
+    t.setNames({1: family}, 3, 1, 1033)
+    t.setNames({0: t.getName(0, 1, 0, 0).string}, None, None, None, True)
+    assert not t.modified
+    
+    t.setNames({1: family + ' Bold'}, 3, 1, 1033)
+    assert t.modified
+    
+    for change in [lambda t: t.delName(1, 1, 0, 0),
+                   lambda t: t.getName(150, 3, 1, 1033, True),
+                   lambda t: t.copySection((1, 0, 0), (1, 0, 11))]:
+        t = TTNameTable(_testfile)
+        change(t)
+        assert t.modified
+
+def test_threads():
+    tempdir = tempfile.mkdtemp(prefix='ttname-test-write-threads-')
+    stdout = sys.stdout
+    shared = TTNameTable(_testfile)
+    errors = []
+    
+    def work(i):
+        try:
+            tempfn = os.path.join(tempdir, 'font{0}.ttf'.format(i))
+            shutil.copy2(_testfile, tempfn)
+            
+            t = TTNameTable(tempfn)
+            t.setNames({1: 'Font {0}'.format(i)}, 1, 0, 0)
+            t.save(tempfn)
+            
+            shared.setNames({200 + i: 'Thread {0}'.format(i)}, 3, 1, 1033)
+        except Exception as e:
+            errors.append(e)
+    
+    threads = [threading.Thread(target=work, args=(i,)) for i in xrange(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    
+    assert errors == []
+    assert sys.stdout is stdout
+    
+    for i in xrange(8):
+        t = TTNameTable(os.path.join(tempdir, 'font{0}.ttf'.format(i)))
+        assert t.getName(1, 1, 0, 0).string == 'Font {0}'.format(i)
+        assert shared.getName(200 + i, 3, 1, 1033).string == 'Thread {0}'.format(i)
+    
+    assert len(list(shared.getSection(3, 1, 1033))) == \
+                len(list(TTNameTable(_testfile).getSection(3, 1, 1033))) + 8
+    
+    shutil.rmtree(tempdir)
@@ -26,7 +26,8 @@ Manages the "name" table that stores metadata for OpenType and TrueType fonts
 # (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
 # SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
-from table import TTNameTable
-import info, cli
+from table import TTNameTable, TTNameCollection
+import info, cli, codec, checksum, sfnt, woff, batch, stamp, timing, cache, query, server, script
 
-__all__ = [TTNameTable, table, info, cli]
+__all__ = [TTNameTable, TTNameCollection, table, info, cli, codec, checksum, sfnt, woff, batch,
+           stamp, timing, cache, query, server, script]
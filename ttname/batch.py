@@ -0,0 +1,516 @@
+"""
+Applies name table edits to many fonts in one process, driven by an edit
+manifest and/or lists of files, directories and glob patterns.
+"""
+
+# This file is part of ttname.
+#
+# Copyright 2013 T.C. Hollingsworth <tchollingsworth@gmail.com>
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met: 
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer. 
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution. 
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+from StringIO import StringIO
+from fontTools.ttLib import TTLibError
+import argparse
+import collections
+import csv
+import glob
+import json
+import multiprocessing
+import os
+import sys
+
+from table import TTNameCollection
+import cli
+import codec
+import info
+import stamp
+import timing
+
+#which files to pick up when walking a directory
+FONT_EXTENSIONS = ('.ttf', '.otf', '.ttc', '.otc', '.woff', '.woff2')
+
+#how many seconds a worker gets for each font before it's given up on
+DEFAULT_TIMEOUT = 600
+
+#the platform of an Edit that applies to every section that has the name
+ALL = 'all'
+
+Edit = collections.namedtuple('Edit', ['path', 'platform', 'encoding', 'lang', 'nameID', 'value'])
+
+BatchResult = collections.namedtuple('BatchResult', ['path', 'updated', 'names', 'error', 'timings'])
+
+#a picklable copy of a name record, for shipping reads back from workers
+NameData = collections.namedtuple('NameData', ['nameID', 'platformID', 'platEncID', 'langID', 'string'])
+
+class TTNameBatchError(Exception):
+    pass
+
+def _number(value, what):
+    if value is None or value == '':
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise TTNameBatchError('Invalid {0}: {1}'.format(what, value))
+
+def _platformID(value):
+    if isinstance(value, basestring) and value.lower() in info.platforms_short:
+        return info.platforms_short[value.lower()]
+    elif isinstance(value, basestring) and value.lower() == ALL:
+        return ALL
+    return _number(value, 'platform')
+
+def _nameID(value):
+    if value in info.names_short:
+        return info.names_short[value]
+    nameID = _number(value, 'name')
+    if nameID is None:
+        raise TTNameBatchError('Invalid name: {0}'.format(value))
+    return nameID
+
+def _edit(entry, basedir):
+    """turns a manifest entry into an Edit"""
+    if not isinstance(entry, dict):
+        raise TTNameBatchError('Invalid manifest entry: {0}'.format(entry))
+    
+    for key in ('path', 'nameID', 'value'):
+        if entry.get(key) is None:
+            raise TTNameBatchError('Manifest entry is missing "{0}"'.format(key))
+    
+    return Edit(os.path.join(basedir, entry['path']),
+                _platformID(entry.get('platform')),
+                _number(entry.get('encoding'), 'encoding'),
+                _number(entry.get('lang'), 'lang'),
+                _nameID(entry['nameID']),
+                entry['value'])
+
+def _guessFormat(name, data):
+    ext = os.path.splitext(name)[1].lower()
+    
+    if ext == '.json':
+        return 'json'
+    elif ext in ('.ndjson', '.jsonl'):
+        return 'ndjson'
+    elif ext == '.csv':
+        return 'csv'
+    elif data.lstrip().startswith('['):
+        return 'json'
+    elif data.lstrip().startswith('{'):
+        return 'ndjson'
+    else:
+        return 'csv'
+
+def loadManifest(fileish, format=None):
+    """
+    Read a list of Edits from a JSON, NDJSON or CSV manifest.
+    
+    Every entry needs a path, nameID and value, and may have a platform,
+    encoding and lang; missing ones default to the first section in the font,
+    just like the CLI, and a platform of "all" updates every section that has
+    the name.  Relative paths are relative to the manifest.  The format is
+    guessed from the file name or its contents if it isn't given.
+    """
+    if hasattr(fileish, 'read'):
+        data = fileish.read()
+        name = getattr(fileish, 'name', '')
+        #sys.stdin is named "<stdin>"
+        basedir = '' if name.startswith('<') else os.path.dirname(name)
+    else:
+        with open(fileish, 'rb') as f:
+            data = f.read()
+        name = fileish
+        basedir = os.path.dirname(fileish)
+    
+    if format is None:
+        format = _guessFormat(name, data)
+    
+    try:
+        if format == 'json':
+            entries = json.loads(data)
+            if not isinstance(entries, list):
+                raise TTNameBatchError('JSON manifest must be a list of edits')
+        elif format == 'ndjson':
+            entries = [json.loads(line) for line in data.splitlines() if line.strip()]
+        elif format == 'csv':
+            entries = list(csv.DictReader(StringIO(data)))
+        else:
+            raise TTNameBatchError('Unknown manifest format: {0}'.format(format))
+    except (ValueError, csv.Error) as e:
+        raise TTNameBatchError('Invalid manifest: {0}'.format(e))
+    
+    return [_edit(entry, basedir) for entry in entries]
+
+def findFonts(operands):
+    """expand a list of files, directories and glob patterns into font paths"""
+    for operand in operands:
+        if os.path.isdir(operand):
+            for dirpath, dirnames, filenames in os.walk(operand):
+                dirnames.sort()
+                for fn in sorted(filenames):
+                    if os.path.splitext(fn)[1].lower() in FONT_EXTENSIONS:
+                        yield os.path.join(dirpath, fn)
+        elif glob.has_magic(operand):
+            matches = sorted(glob.glob(operand))
+            if not matches:
+                raise TTNameBatchError('No files match "{0}"'.format(operand))
+            for path in findFonts(matches):
+                yield path
+        else:
+            yield operand
+
+def groupEdits(edits):
+    """returns a mapping of font paths to their Edits, in the order given"""
+    result = collections.OrderedDict()
+    
+    for edit in edits:
+        result.setdefault(os.path.normpath(edit.path), []).append(edit)
+    
+    return result
+
+def applyEdits(table, edits):
+    """apply Edits to a TTNameTable, returning the records that were updated"""
+    first = table.firstSection()
+    updated = []
+    
+    for edit in edits:
+        if edit.platform == ALL:
+            updated.extend(table.setNames({edit.nameID: edit.value}, None, None,
+                                          None, True))
+            continue
+        
+        section = [edit.platform, edit.encoding, edit.lang]
+        if None in section:
+            if first is None:
+                raise TTNameBatchError('Font has no names to take the '
+                                       'platform/encoding/lang from')
+            section = [f if s is None else s for s, f in zip(section, first)]
+        
+        updated.extend(table.setNames({edit.nameID: edit.value}, *section))
+    
+    return updated
+
+def processFont(path, edits, bounded=False):
+    """
+    Open a font, apply its Edits and save it back in place, with one parse and
+    one save.  If the edits don't change anything, the font isn't saved and
+    the result has no updates.  If there are no edits, the font's names are
+    read instead.  In a font collection, every font gets the edits.
+    
+    Errors are reported in the BatchResult rather than raised, so one bad font
+    doesn't take down the rest of the batch.  The phases of the work are timed
+    into the result's timings, as a list of timing.PhaseStats.
+    
+    bounded opens the font's tables as bounded TTNameTables.
+    """
+    timer = timing.PhaseTimer()
+    
+    try:
+        collection = TTNameCollection(path, timer=timer, bounded=bounded)
+        
+        if not edits:
+            with timer.phase('read'):
+                names = [NameData(n.nameID, n.platformID, n.platEncID, n.langID, n.string)
+                            for table in collection.fonts for n in table.names]
+            return BatchResult(path, 0, names, None, timer.phases)
+        
+        with timer.phase('edit'):
+            updated = []
+            for table in collection.fonts:
+                updated.extend(applyEdits(table, edits))
+        if not collection.modified:
+            return BatchResult(path, 0, None, None, timer.phases)
+        collection.save(path)
+    except (IOError, OSError) as e:
+        return BatchResult(path, 0, None, '{0}'.format(e.strerror or e), timer.phases)
+    except (TTLibError, codec.NameTableError, TTNameBatchError, UnicodeError) as e:
+        return BatchResult(path, 0, None, '{0}'.format(e), timer.phases)
+    
+    return BatchResult(path, len(updated), None, None, timer.phases)
+
+def _processItem(item):
+    #this runs in the worker processes, where anything escaping would take
+    #down the whole pool
+    path, edits, bounded = item
+    try:
+        return processFont(path, edits, bounded)
+    except Exception as e:
+        return BatchResult(path, 0, None, 'Unexpected error: {0!r}'.format(e), [])
+
+def process(groups, jobs=1, bounded=False, timeout=DEFAULT_TIMEOUT):
+    """
+    Process a mapping of font paths to Edits, yielding a BatchResult for each
+    font in order.
+    
+    With more than one job, the fonts are spread across a pool of worker
+    processes; a jobs of 0 or less uses one per CPU.  A font whose worker
+    doesn't answer within timeout seconds of the previous font, because it's
+    stuck or was killed, gets an error result.  bounded is passed on to
+    processFont.
+    """
+    if jobs <= 0:
+        jobs = multiprocessing.cpu_count()
+    
+    items = ((path, edits, bounded) for path, edits in groups.iteritems())
+    
+    if jobs == 1 or len(groups) < 2:
+        for item in items:
+            yield _processItem(item)
+        return
+    
+    pool = multiprocessing.Pool(min(jobs, len(groups)))
+    try:
+        #a worker that dies takes its font with it, and the pool would wait
+        #for that result forever
+        results = [(item[0], pool.apply_async(_processItem, (item,))) for item in items]
+        for path, result in results:
+            try:
+                yield result.get(timeout)
+            except multiprocessing.TimeoutError:
+                yield BatchResult(path, 0, None, 'Worker died or took more than {0} '
+                                  'seconds'.format(timeout), [])
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+
+class BatchSummary(object):
+    "Totals for a batch run, aggregated across however many workers ran it"
+    def __init__(self):
+        self.fonts = 0
+        self.updated = 0
+        self.names = 0
+        self.unchanged = 0
+        self.upToDate = 0
+        self.failed = 0
+        self.timer = timing.PhaseTimer()
+    
+    def add(self, result):
+        self.fonts += 1
+        self.timer.merge(result.timings)
+        if result.error is not None:
+            self.failed += 1
+        elif result.updated:
+            self.updated += 1
+            self.names += result.updated
+        elif result.names is None:
+            self.unchanged += 1
+    
+    def __str__(self):
+        result = '{0} fonts, {1} updated ({2} names), {3} unchanged, {4} failed'.format(
+                    self.fonts, self.updated, self.names, self.unchanged, self.failed)
+        if self.upToDate:
+            result += ', {0} up to date'.format(self.upToDate)
+        return result
+
+class TTNameBatchCLI(object):
+    def __init__(self, argv=sys.argv[1:], swallow_exceptions=True):
+        try:
+            self.parse_cmdline(argv)
+            self.run()
+        except TTNameBatchError as e:
+            #normally we'll just output an error and quit
+            if swallow_exceptions:
+                sys.stderr.write(e.message)
+                sys.stderr.write('\n')
+                sys.exit(1)
+            #but sometimes we re-raise the error so the tests can see it more easily
+            else:
+                raise
+        
+        if swallow_exceptions and self.failed:
+            sys.exit(1)
+        elif swallow_exceptions and self.args.unchanged_status and \
+                    self.summary.unchanged and not self.summary.updated:
+            sys.exit(self.args.unchanged_status)
+    
+    def parse_cmdline(self, argv):
+        p = argparse.ArgumentParser(description=__doc__)
+        
+        #which files to operate on
+        p.add_argument('paths', nargs='*', metavar='PATH',
+                       help='font file, directory or glob pattern to apply the '
+                       'name options to')
+        
+        #where the rest of the edits come from
+        p.add_argument('-m', '--manifest', action='append', default=[],
+                       help='JSON, NDJSON or CSV file listing (path, platform, '
+                       'encoding, lang, nameID, value) edits (use "-" for stdin)')
+        p.add_argument('--format', choices=('json', 'ndjson', 'csv'),
+                       help='manifest format (defaults to guessing)')
+        
+        #how many fonts to work on at once
+        p.add_argument('-j', '--jobs', type=int, default=1,
+                       help='number of worker processes to use (0 for one per '
+                       'CPU, defaults to 1)')
+        p.add_argument('--timeout', type=float, default=DEFAULT_TIMEOUT,
+                       metavar='SECONDS', help='give up on a font when its worker '
+                       'takes longer than SECONDS (defaults to %(default)s)')
+        
+        p.add_argument('--unchanged-status', type=int, default=0, metavar='STATUS',
+                       help='exit with STATUS when the edits leave every font as '
+                       'it was (defaults to 0)')
+        
+        #where the time went, summed over every font
+        p.add_argument('--timings', action='store_true',
+                       help='report the time, I/O and peak memory of each phase '
+                       'to stderr')
+        
+        #huge fonts, with lots of workers
+        p.add_argument('--bounded-memory', action='store_true',
+                       help='use memory in proportion to the name table, not the '
+                       'font, refusing fonts that would need more')
+        
+        #make-like builds
+        p.add_argument('--stamps', metavar='FILE',
+                       help='record what was built in FILE, and skip fonts whose '
+                       'edits and contents are the same as last time')
+        
+        #the same section options as ttname itself
+        p.add_argument('-a', '--all', action='store_true',
+                    help='operate on all platform/encoding/language combinations '
+                    'simultaneously')
+        p.add_argument('-p', '--platform', default=None,
+                            help='name or number specifiying the platform ID to '
+                            'operate on (defaults to first in table)')
+        p.add_argument('-e', '--encoding', type=int, default=None,
+                            help='the platform specific encoding ID to operate '
+                            'on (defaults to first in table)')
+        p.add_argument('-l', '--lang', type=int, default=None,
+                            help='which language ID to operate on (defaults to '
+                            'first in table)')
+        
+        cli._add_name_options(p)
+        
+        self.args = p.parse_args(args=cli._rewrite_numeric_names(argv))
+        self.newnames = getattr(self.args, 'newnames', {})
+    
+    def edits(self):
+        """all the Edits requested on the command line"""
+        edits = []
+        
+        for manifest in self.args.manifest:
+            try:
+                if manifest == '-':
+                    edits.extend(loadManifest(sys.stdin, self.args.format))
+                else:
+                    edits.extend(loadManifest(manifest, self.args.format))
+            except IOError as e:
+                raise TTNameBatchError('Unable to open manifest "{0}": {1}'.format(
+                    manifest, e.strerror))
+        
+        platform = ALL if self.args.all else _platformID(self.args.platform)
+        for path in findFonts(self.args.paths):
+            #no name options means we're just reading
+            if not self.newnames:
+                edits.append(Edit(path, None, None, None, None, None))
+            for nameID, value in self.newnames.iteritems():
+                edits.append(Edit(path, platform, self.args.encoding,
+                                  self.args.lang, nameID, value))
+        
+        if not edits:
+            raise TTNameBatchError('Nothing to do: no fonts or edits given')
+        
+        return edits
+    
+    def groups(self):
+        """the edits to do for each font, minus the placeholders for reads"""
+        groups = groupEdits(self.edits())
+        for path, edits in groups.iteritems():
+            groups[path] = [e for e in edits if e.nameID is not None]
+        return groups
+    
+    def loadStamps(self, groups):
+        """
+        Drop the fonts that are up to date from groups, returning the
+        StampFile and why each remaining font is being built, along with the
+        digest of each font before it's built.
+        """
+        try:
+            stamps = stamp.StampFile(self.args.stamps)
+        except stamp.TTNameStampError as e:
+            raise TTNameBatchError(e.message)
+        
+        reasons = {}
+        for path, edits in groups.items():
+            #reads don't build anything
+            if not edits:
+                continue
+            
+            reason = stamps.check(path, edits)
+            if reason is None:
+                del groups[path]
+                self.summary.upToDate += 1
+                print u'{0}: up to date'.format(path)
+                continue
+            
+            try:
+                reasons[path] = (reason, stamp.digest(path))
+            except IOError:
+                #processing it will say what's wrong
+                reasons[path] = (reason, None)
+        
+        return stamps, reasons
+    
+    def run(self):
+        self.results = []
+        self.summary = BatchSummary()
+        
+        groups = self.groups()
+        stamps = None
+        reasons = {}
+        if self.args.stamps is not None:
+            stamps, reasons = self.loadStamps(groups)
+        
+        for result in process(groups, self.args.jobs, self.args.bounded_memory,
+                              self.args.timeout):
+            self.results.append(result)
+            self.summary.add(result)
+            
+            why = ''
+            if result.path in reasons:
+                reason, inputDigest = reasons[result.path]
+                why = ' ({0})'.format(reason)
+                if result.error is None:
+                    stamps.record(result.path, groups[result.path], inputDigest)
+            
+            if result.error is not None:
+                sys.stderr.write(u'{0}: {1}\n'.format(result.path, result.error))
+            elif result.names is not None:
+                for n in result.names:
+                    print u'{0}: {1}: {2}'.format(result.path, info.quad(n), n.string)
+            elif result.updated:
+                print u'{0}: updated {1} names{2}'.format(result.path, result.updated, why)
+            else:
+                print u'{0}: unchanged{1}'.format(result.path, why)
+        
+        if stamps is not None:
+            try:
+                stamps.save()
+            except (IOError, OSError) as e:
+                raise TTNameBatchError('Unable to write stamp file "{0}": {1}'.format(
+                    self.args.stamps, e.strerror))
+        
+        self.failed = self.summary.failed
+        print self.summary
+        
+        if self.args.timings:
+            self.summary.timer.report(sys.stderr)
@@ -0,0 +1,369 @@
+"""
+On-disk caches of decoded name records, keyed by path, size and mtime, and of
+edited fonts, keyed by what went in
+"""
+
+# This file is part of ttname.
+#
+# Copyright 2013 T.C. Hollingsworth <tchollingsworth@gmail.com>
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met: 
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer. 
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution. 
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import collections
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import struct
+import threading
+import time
+
+import codec
+
+#32 MiB of name tables is a few tens of thousands of fonts
+DEFAULT_MAX_SIZE = 32 * 1024 * 1024
+
+#whole fonts take rather more room
+DEFAULT_OUTPUT_MAX_SIZE = 256 * 1024 * 1024
+
+#bumped whenever the same edit would give a different font, so old outputs
+#aren't used any more
+_OUTPUT_VERSION = 2
+
+CacheKey = collections.namedtuple('CacheKey', ['path', 'size', 'mtime', 'digest'])
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS fonts (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL,
+    digest TEXT,
+    used REAL NOT NULL,
+    names BLOB NOT NULL
+)
+'''
+
+_OUTPUT_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS outputs (
+    key TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    used REAL NOT NULL,
+    echo TEXT NOT NULL,
+    modified INTEGER NOT NULL
+)
+'''
+
+_RECORD = struct.Struct('>HHHHH')
+_COUNT = struct.Struct('>HH')
+
+def defaultPath():
+    """where the cache lives unless told otherwise, following the XDG spec"""
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'ttname', 'names.sqlite')
+
+def defaultOutputPath():
+    """where the output cache lives unless told otherwise"""
+    return os.path.join(os.path.dirname(defaultPath()), 'outputs')
+
+def _pack(records, langTags):
+    #the records are kept in their original order, unlike in a real name table
+    parts = [_COUNT.pack(len(records), len(langTags))]
+    for platformID, platEncID, langID, nameID, data in records:
+        parts.append(_RECORD.pack(platformID, platEncID, langID, nameID, len(data)))
+        parts.append(codec.toBytes(data))
+    for tag in langTags:
+        parts.append(struct.pack('>H', len(tag)))
+        parts.append(codec.toBytes(tag))
+    return ''.join(parts)
+
+def _unpack(blob):
+    count, tagCount = _COUNT.unpack_from(blob, 0)
+    pos = _COUNT.size
+    records = []
+    langTags = []
+    
+    for i in xrange(count):
+        platformID, platEncID, langID, nameID, length = _RECORD.unpack_from(blob, pos)
+        pos += _RECORD.size
+        records.append((platformID, platEncID, langID, nameID, blob[pos:pos + length]))
+        pos += length
+    
+    for i in xrange(tagCount):
+        length, = struct.unpack_from('>H', blob, pos)
+        pos += 2
+        langTags.append(blob[pos:pos + length])
+        pos += length
+    
+    if pos != len(blob):
+        raise ValueError('trailing data in cache entry')
+    
+    return records, langTags
+
+class NameCache(object):
+    """
+    An on-disk cache of the name records of fonts, stored in SQLite.
+    
+    Entries are keyed by the font's real path and only used while its size and
+    modification time (and, with verify, a SHA-1 of its contents) still match,
+    so changed fonts are simply read again.  Once the stored records grow past
+    maxSize bytes, the least recently used fonts are evicted.
+    
+    The cache is only ever an optimization: if the database can't be read or
+    written, lookups miss and stores are dropped.
+    """
+    def __init__(self, path=None, maxSize=DEFAULT_MAX_SIZE, verify=False):
+        self.path = defaultPath() if path is None else path
+        self.maxSize = maxSize
+        self.verify = verify
+        self._lock = threading.Lock()
+        
+        directory = os.path.dirname(os.path.abspath(self.path))
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        
+        #several ttname processes may share the cache, so wait on each other
+        self._db = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+        self._db.text_factory = str
+        with self._db:
+            self._db.execute(_SCHEMA)
+    
+    def close(self):
+        self._db.close()
+    
+    def key(self, path):
+        """
+        Returns the CacheKey of a font as it is right now, or None if it can't
+        be looked at.  Take the key before reading the font, so a change made
+        while it's being read invalidates the entry rather than hiding.
+        """
+        try:
+            path = os.path.realpath(path)
+            st = os.stat(path)
+            digest = self._digest(path) if self.verify else None
+        except (IOError, OSError):
+            return None
+        return CacheKey(path, st.st_size, st.st_mtime, digest)
+    
+    def _digest(self, path):
+        sha = hashlib.sha1()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), ''):
+                sha.update(chunk)
+        return sha.hexdigest()
+    
+    def get(self, key):
+        """
+        Returns the (records, langTags) stored for a CacheKey, or None if there
+        aren't any or the font has changed since.  The records are
+        (platformID, platEncID, langID, nameID, data) tuples.
+        """
+        if key is None:
+            return None
+        
+        with self._lock:
+            try:
+                row = self._db.execute('SELECT size, mtime, digest, names FROM fonts '
+                                       'WHERE path = ?', (key.path,)).fetchone()
+                if row is None:
+                    return None
+                
+                size, mtime, digest, blob = row
+                if (size, mtime) != (key.size, key.mtime) or \
+                        (key.digest is not None and digest != key.digest):
+                    return None
+                
+                with self._db:
+                    self._db.execute('UPDATE fonts SET used = ? WHERE path = ?',
+                                     (time.time(), key.path))
+                return _unpack(str(blob))
+            except (sqlite3.Error, struct.error, ValueError):
+                return None
+    
+    def put(self, key, records, langTags=()):
+        """store the records for a CacheKey, evicting old fonts if need be"""
+        if key is None:
+            return
+        
+        blob = _pack(records, langTags)
+        with self._lock:
+            try:
+                with self._db:
+                    self._db.execute('INSERT OR REPLACE INTO fonts VALUES (?, ?, ?, ?, ?, ?)',
+                                     (key.path, key.size, key.mtime, key.digest,
+                                      time.time(), sqlite3.Binary(blob)))
+                    self._evict()
+            except (sqlite3.Error, struct.error):
+                pass
+    
+    def _evict(self):
+        total = self._db.execute('SELECT COALESCE(SUM(LENGTH(names)), 0) FROM fonts').fetchone()[0]
+        if total <= self.maxSize:
+            return
+        
+        victims = []
+        for path, length in self._db.execute('SELECT path, LENGTH(names) FROM fonts '
+                                             'ORDER BY used').fetchall():
+            if total <= self.maxSize:
+                break
+            victims.append((path,))
+            total -= length
+        
+        self._db.executemany('DELETE FROM fonts WHERE path = ?', victims)
+
+def openDefault():
+    """the NameCache in the default location, or None if it can't be opened"""
+    try:
+        return NameCache()
+    except (sqlite3.Error, IOError, OSError):
+        return None
+
+def openOutputs(path=None, maxSize=DEFAULT_OUTPUT_MAX_SIZE):
+    """an OutputCache, or None if it can't be opened"""
+    try:
+        return OutputCache(path, maxSize)
+    except (sqlite3.Error, IOError, OSError):
+        return None
+
+def editKey(path, edit):
+    """
+    The key of an edit in an OutputCache: a SHA-256 of the font's bytes and of
+    edit, anything JSON can canonically describe the edit with.
+    """
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), ''):
+            sha.update(chunk)
+    sha.update('\0')
+    sha.update(json.dumps([_OUTPUT_VERSION, edit], sort_keys=True))
+    return sha.hexdigest()
+
+class OutputCache(object):
+    """
+    An on-disk cache of the fonts edits produce, so that making the same edit
+    to the same font again is just a copy.
+    
+    Each font is kept in a file named after its key from editKey, in the
+    directory at path, along with a SQLite index of when each was last used
+    and what the edit printed and whether it changed anything.  Once the fonts
+    grow past maxSize bytes, the least recently used ones are evicted.
+    
+    Like the NameCache, it's only ever an optimization: anything that goes
+    wrong with it is a miss.
+    """
+    def __init__(self, path=None, maxSize=DEFAULT_OUTPUT_MAX_SIZE):
+        self.path = defaultOutputPath() if path is None else path
+        self.maxSize = maxSize
+        self._lock = threading.Lock()
+        
+        if not os.path.isdir(self.path):
+            os.makedirs(self.path)
+        
+        self._db = sqlite3.connect(os.path.join(self.path, 'index.sqlite'), timeout=10,
+                                   check_same_thread=False)
+        with self._db:
+            #an index from before edits recorded whether they changed anything
+            columns = [row[1] for row in self._db.execute('PRAGMA table_info(outputs)')]
+            if columns and 'modified' not in columns:
+                self._forget([key for key, in self._db.execute('SELECT key FROM outputs')])
+                self._db.execute('DROP TABLE outputs')
+            self._db.execute(_OUTPUT_SCHEMA)
+    
+    def close(self):
+        self._db.close()
+    
+    def _file(self, key):
+        return os.path.join(self.path, key + '.font')
+    
+    def get(self, key):
+        """
+        Returns the lines the edit printed, whether it changed the font, and
+        the font stored under key, as a file open for reading, or None if
+        there's no such font.
+        """
+        with self._lock:
+            try:
+                row = self._db.execute('SELECT echo, modified FROM outputs WHERE key = ?',
+                                       (key,)).fetchone()
+                if row is None:
+                    return None
+                echo = json.loads(row[0])
+                modified = bool(row[1])
+                
+                try:
+                    font = open(self._file(key), 'rb')
+                except IOError:
+                    #the font went missing, so forget about it
+                    self._forget([key])
+                    return None
+                
+                with self._db:
+                    self._db.execute('UPDATE outputs SET used = ? WHERE key = ?',
+                                     (time.time(), key))
+                return echo, modified, font
+            except (sqlite3.Error, ValueError):
+                return None
+    
+    def put(self, key, path, echo=(), modified=True):
+        """
+        Store a copy of the font at path under key, along with the lines the
+        edit printed and whether it changed the font, evicting old fonts if
+        need be.
+        """
+        #copy it somewhere private first, so nobody sees half a font
+        temp = '{0}.{1}.tmp'.format(self._file(key), os.getpid())
+        with self._lock:
+            try:
+                shutil.copyfile(path, temp)
+                os.rename(temp, self._file(key))
+                with self._db:
+                    self._db.execute('INSERT OR REPLACE INTO outputs VALUES '
+                                     '(?, ?, ?, ?, ?)',
+                                     (key, os.path.getsize(self._file(key)), time.time(),
+                                      json.dumps(list(echo)), int(modified)))
+                self._evict()
+            except (sqlite3.Error, IOError, OSError):
+                if os.path.exists(temp):
+                    os.unlink(temp)
+    
+    def _evict(self):
+        total = self._db.execute('SELECT COALESCE(SUM(size), 0) FROM outputs').fetchone()[0]
+        if total <= self.maxSize:
+            return
+        
+        victims = []
+        for key, size in self._db.execute('SELECT key, size FROM outputs '
+                                          'ORDER BY used').fetchall():
+            if total <= self.maxSize:
+                break
+            victims.append(key)
+            total -= size
+        
+        self._forget(victims)
+    
+    def _forget(self, keys):
+        with self._db:
+            self._db.executemany('DELETE FROM outputs WHERE key = ?', [(k,) for k in keys])
+        for key in keys:
+            try:
+                os.unlink(self._file(key))
+            except OSError:
+                pass
@@ -0,0 +1,78 @@
+"""
+Table checksums, summed a whole buffer at a time
+"""
+
+# This file is part of ttname.
+#
+# Copyright 2013 T.C. Hollingsworth <tchollingsworth@gmail.com>
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met: 
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer. 
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution. 
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import collections
+import struct
+
+import codec
+
+#numpy sums big tables ten times faster than struct, but importing it takes
+#as long as struct takes to sum several megabytes, so it's only brought in
+#for data at least this big
+_NUMPY_MIN_SIZE = 256 * 1024
+
+#numpy once it's been imported, or False if it isn't installed
+_numpyModule = None
+
+# a table whose checksum (or the font whose checkSumAdjustment) isn't what the
+# font says it is; what is the table's tag, or 'checkSumAdjustment'
+Mismatch = collections.namedtuple('Mismatch', ['what', 'stored', 'actual'])
+
+def _padded(data):
+    if len(data) % 4:
+        return codec.toBytes(data) + '\0' * (4 - len(data) % 4)
+    return data
+
+def _numpy():
+    """numpy, imported the first time it's asked for, or None without it"""
+    global _numpyModule
+    if _numpyModule is None:
+        try:
+            import numpy
+            _numpyModule = numpy
+        except ImportError: #pragma: no cover
+            _numpyModule = False
+    return _numpyModule or None
+
+def _numpySum(data):
+    numpy = _numpy()
+    #numpy on python 2 only takes the old buffer protocol
+    if isinstance(data, memoryview):
+        data = data.tobytes()
+    #uint64 can't overflow for anything smaller than 16GB
+    return int(numpy.frombuffer(data, '>u4').sum(dtype=numpy.uint64))
+
+def _structSum(data):
+    return sum(struct.unpack('>{0}L'.format(len(data) // 4), codec.toBytes(data)))
+
+def calcChecksum(data):
+    """the sum of a table's data as big-endian uint32s, mod 2**32"""
+    data = _padded(data)
+    if len(data) >= _NUMPY_MIN_SIZE and _numpy() is not None:
+        return _numpySum(data) & 0xFFFFFFFF
+    return _structSum(data) & 0xFFFFFFFF
@@ -28,40 +28,191 @@ OpenType fonts, which contains metadata regarding the font.
 from fontTools.ttLib import TTLibError
 import argparse
 import collections
+import hashlib
 import os
+import re
+import shutil
+import stat
 import sys
 import tempfile
 
-from table import TTNameTable
+from table import TTNameTable, TTNameCollection, SectionData
+import cache
+import codec
 import info
+import script
+import sfnt
+import timing
 
-class TTNameCLI(object):
-    def __init__(self, argv=sys.argv[1:], swallow_exceptions=True):
-        try:
-            self.parse_cmdline(argv)
+#the highest name ID that can be passed as --nameN or --name-id
+_MAX_NAMEID = 32767
+
+#registering thousands of --nameN options makes argparse crawl, so they get
+#rewritten to a single hidden option before argparse ever sees them
+_NUMERIC_NAME = re.compile(r'^--name(\d+)(?:=(.*))?$', re.DOTALL)
+_NUMERIC_OPTION = '--name-id'
+
+def _rewrite_numeric_names(argv):
+    result = []
+    args = iter(argv)
+    
+    for arg in args:
+        if arg == '--':
+            result.append(arg)
+            result.extend(args)
+            break
         
-            self.open()
+        m = _NUMERIC_NAME.match(arg)
+        if m is not None and int(m.group(1)) <= _MAX_NAMEID:
+            value = m.group(2)
+            if value is None:
+                value = next(args, None)
+                if value is None:
+                    #let argparse complain about the missing value
+                    result.append(arg)
+                    break
+            result.append('{0}={1}={2}'.format(_NUMERIC_OPTION, int(m.group(1)), value))
+        else:
+            result.append(arg)
+    
+    return result
+
+def defaultSocket():
+    """where the daemon listens unless told otherwise"""
+    runtime = os.environ.get('XDG_RUNTIME_DIR')
+    if runtime:
+        return os.path.join(runtime, 'ttname.sock')
+    #anyone can make files in /tmp, so it goes in a directory only we can use
+    return os.path.join(tempfile.gettempdir(), 'ttname-{0}'.format(os.getuid()),
+                        'ttname.sock')
+
+def trustedSocket(path):
+    """
+    Whether path is a socket made by this user, and not something another user
+    put there to have our runs handed to them.
+    """
+    try:
+        st = os.lstat(path)
+    except OSError:
+        return False
+    return stat.S_ISSOCK(st.st_mode) and st.st_uid == os.getuid()
+
+class _NameAction(argparse.Action):
+    """collects the values of all the --nameN style options into one dict"""
+    def __call__(self, parser, namespace, values, option_string=None):
+        if self.const is None:
+            try:
+                nameID, value = values.split('=', 1)
+                nameID = int(nameID)
+            except ValueError:
+                parser.error('{0} needs a name ID and a value, like {0}=256=DATA, '
+                             'not "{1}"'.format(option_string, values))
+            values = value
+            if not 0 <= nameID <= _MAX_NAMEID:
+                parser.error('name ID {0} is out of range (0-{1})'.format(nameID,
+                                                                         _MAX_NAMEID))
+        else:
+            nameID = self.const
         
-            if self.newnames:
-                self.write()
-            else:
-                self.read()
+        if getattr(namespace, self.dest, None) is None:
+            setattr(namespace, self.dest, {})
+        getattr(namespace, self.dest)[nameID] = values
+
+def _add_name_options(p):
+    """adds the --nameN options and their friendly aliases to a parser"""
+    #the numeric options for each permissible name id all end up here
+    p.add_argument(_NUMERIC_OPTION, dest='newnames', action=_NameAction,
+                   default=argparse.SUPPRESS, help=argparse.SUPPRESS)
+
+    #add stringed options for each permissible name id
+    for name, number in info.names_short.iteritems():
+        p.add_argument('--{0}'.format(name), dest='newnames', const=number,
+            action=_NameAction, metavar='DATA', default=argparse.SUPPRESS,
+            help=info.names[number])
+
+class TTNameCLI(object):
+    """
+    Runs ttname with the given arguments.
+    
+    Each phase of the run is recorded in self.timer, a timing.PhaseTimer; pass
+    your own to add hooks or to collect the phases of several runs.
+    
+    Output goes to stdout and stderr, which default to sys.stdout and
+    sys.stderr, and relative paths are relative to cwd, which defaults to the
+    current directory.  When a ttname daemon is running on the socket named by
+    --socket or $TTNAME_SOCKET, or the default one, the run is handed to it
+    instead.
+    """
+    def __init__(self, argv=sys.argv[1:], swallow_exceptions=True, timer=None,
+                 stdout=None, stderr=None, cwd=None):
+        self.timer = timing.PhaseTimer() if timer is None else timer
+        self.stdout = sys.stdout if stdout is None else stdout
+        self.stderr = sys.stderr if stderr is None else stderr
+        self.modified = False
+        self.exitStatus = 0
+        self.outputs = None
+        self.outputKey = None
+        
+        try:
+            with self.timer.phase('parse'):
+                self.parse_cmdline(argv)
+                if cwd is not None:
+                    self.resolve(cwd)
+            
+            #there's no file to save a font from stdin back over
+            if self.editing and self.args.infile == '-' and self.args.outfile is None:
+                raise TTNameCLIError('Editing a font from standard input needs an '
+                                     'output file (use "-" for stdout)')
+            
+            if self.args.serve:
+                import server
+                server.serve(self.args.socket)
+                return
+            
+            #a run the daemon did still exits with its status
+            if not self.forward(argv):
+                self.run()
                 
         except TTNameCLIError as e:
             #normally we'll just output an error and quit
             if swallow_exceptions:
-                sys.stderr.write(e.message)
-                sys.stderr.write('\n')
+                self.stderr.write(e.message)
+                self.stderr.write('\n')
                 sys.exit(1)
             #but sometimes we re-raise the error so the tests can see it more easily
             else:
                 raise
+        
+        if swallow_exceptions and self.exitStatus:
+            sys.exit(self.exitStatus)
 
+    def run(self):
+        """do the run here, rather than in the daemon"""
+        profiler = self.profile()
+        try:
+            if not self.writeCached():
+                self.open()
+                
+                if self.editing:
+                    self.write()
+                else:
+                    self.read()
+            
+            if self.args.verify:
+                self.verify()
+        finally:
+            if profiler is not None:
+                profiler.disable()
+                profiler.dump_stats(self.args.profile)
+        
+        if self.args.timings:
+            self.timer.report(self.stderr)
+    
     def parse_cmdline(self, argv):
         p = argparse.ArgumentParser(description=__doc__)
         
         #which files to operate on
-        p.add_argument('infile', metavar='INFILE',
+        p.add_argument('infile', nargs='?', metavar='INFILE',
                        help='input file (use "-" for stdin)')
         p.add_argument('outfile', nargs='?', metavar='OUTFILE',
                        help='output file (use "-" for stdout)')
@@ -87,42 +238,250 @@ class TTNameCLI(object):
                             help='which language ID to operate on (defaults to '
                             'first in table)')
 
+        #which font of a collection to operate on
+        p.add_argument('-f', '--font', default=None,
+                            help='which font of a collection to operate on, '
+                            'counting from 0, or "all" (defaults to the first)')
+
         #for outputting, which name id to output
         p.add_argument('-n', '--record',
                     help='output a specific name instead of the whole list')
         
-        #add numeric options for each permissible name id
-        for i in xrange(0, 23768):
-            p.add_argument('--name{0}'.format(i), 
-                        default=argparse.SUPPRESS, help=argparse.SUPPRESS)
-
-        #add stringed options for each permissible name id
-        for name, number in info.names_short.iteritems():
-            p.add_argument('--{0}'.format(name), dest='name{0}'.format(number),
-                metavar='DATA', default=argparse.SUPPRESS, help=info.names[number])
+        #reads can be answered from a cache of fonts that haven't changed, though
+        #reading the name table itself is usually just as quick
+        p.add_argument('--cache', dest='cache', action='store_true', default=False,
+                    help='use and update the cache of name records when reading')
+        p.add_argument('--no-cache', dest='cache', action='store_false',
+                    help="don't use the cache of name records (the default)")
+        
+        _add_name_options(p)
+        
+        #where the time went
+        p.add_argument('--timings', action='store_true',
+                       help='report the time, I/O and peak memory of each phase '
+                       'to stderr')
+        p.add_argument('--profile', metavar='FILE',
+                       help='write cProfile stats for the run to FILE')
+        
+        #keeping everything warm between runs
+        p.add_argument('--serve', action='store_true',
+                       help='run as a daemon that answers ttname runs and '
+                       'JSON-RPC requests on a Unix socket')
+        p.add_argument('--socket', metavar='PATH',
+                       default=os.environ.get('TTNAME_SOCKET'),
+                       help='the daemon socket to serve on or hand runs to '
+                       '(defaults to $TTNAME_SOCKET, then a per-user socket)')
+        
+        #lots of edits at once
+        p.add_argument('--script', metavar='FILE',
+                       help='apply the set, delete, copy-section and '
+                       'rename-section commands in FILE (use "-" for stdin)')
+        p.add_argument('--unchanged-status', type=int, default=0, metavar='STATUS',
+                       help='exit with STATUS when the edits leave the font as it '
+                       'was (defaults to 0)')
+        
+        #checking our work
+        p.add_argument('--verify', action='store_true',
+                       help="check the font's table checksums and "
+                       'head.checkSumAdjustment, after saving any edits')
+        
+        #the same edits over and over
+        p.add_argument('--output-cache', nargs='?', const='', metavar='DIR',
+                       help='reuse the output of an identical earlier edit of '
+                       'the same font, keeping outputs in DIR (defaults to a '
+                       'per-user cache)')
+        p.add_argument('--output-cache-size', type=int,
+                       default=cache.DEFAULT_OUTPUT_MAX_SIZE // (1024 * 1024),
+                       metavar='MB', help='how big the output cache can grow '
+                       '(defaults to %(default)sMB)')
+        
+        #huge fonts
+        p.add_argument('--bounded-memory', action='store_true',
+                       help='use memory in proportion to the name table, not the '
+                       'font, refusing fonts that would need more')
+        
+        #small web fonts
+        p.add_argument('--share-suffixes', action='store_true',
+                       help='store a string that ends a longer one inside it '
+                       'instead of storing it again')
+        p.add_argument('--storage-report', action='store_true',
+                       help="report how many bytes of strings the saved name "
+                       'table has, and how many sharing storage saved')
 
         #phew
-        self.args = p.parse_args(args=argv)
-
-        #convert the ugly argparse list of name values to a nice dict
-        self.newnames = {}
-        for i in xrange(0, 23768):
-            if 'name{0}'.format(i) in self.args:
-                self.newnames[i] = self.args.__dict__['name{0}'.format(i)]
+        self.args = p.parse_args(args=_rewrite_numeric_names(argv))
+        self.newnames = getattr(self.args, 'newnames', {})
+        self.editing = bool(self.newnames or self.args.script)
+        
+        if self.args.infile is None and not self.args.serve:
+            p.error('too few arguments')
+        if self.args.script == '-' and self.args.infile == '-':
+            p.error("the script and the font can't both come from stdin")
+    
+    def resolve(self, cwd):
+        """make the paths given on the command line relative to cwd"""
+        for arg in ('infile', 'outfile', 'profile', 'script', 'output_cache'):
+            value = getattr(self.args, arg)
+            if value and value != '-':
+                setattr(self.args, arg, os.path.join(cwd, value))
+    
+    def forward(self, argv):
+        """
+        Hand the run to the daemon, if there is one, returning whether it did.
+        Runs that use stdin or stdout, ask for timings, bound their memory or
+        verify the font stay here.
+        """
+        if self.args.timings or self.args.profile or self.args.bounded_memory or \
+                    self.args.verify or \
+                    '-' in (self.args.infile, self.args.outfile, self.args.script):
+            return False
+        
+        path = self.args.socket
+        if path is None:
+            path = defaultSocket()
+        if not trustedSocket(path):
+            return False
+        
+        import server
+        try:
+            result = server.TTNameClient(path).call('run',
+                                            argv=argv, cwd=os.getcwd())
+        except server.TTNameClientError:
+            return False
+        
+        self.stdout.write(result['stdout'].encode('utf-8'))
+        if result['status'] not in (0, self.args.unchanged_status):
+            raise TTNameCLIError(result['stderr'].rstrip('\n'))
+        self.stderr.write(result['stderr'].encode('utf-8'))
+        self.exitStatus = result['status']
+        return True
                         
+    def profile(self):
+        """starts profiling if it was asked for, returning the profiler"""
+        if self.args.profile is None:
+            return None
+        
+        #only pay for importing the profiler when it's used
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+        return profiler
+    
+    def openTable(self, path, readonly, font=None):
+        """opens the TTNameTable of a font file"""
+        names = None
+        if self.args.cache and readonly:
+            names = cache.openDefault()
+        
+        return TTNameTable(path, readonly=readonly, timer=self.timer, cache=names,
+                           font=font, bounded=self.args.bounded_memory)
+    
+    def editKey(self):
+        """the OutputCache key of this run's edit, or None if it can't be cached"""
+        if '-' in (self.args.infile, self.args.outfile, self.args.script):
+            return None
+        
+        #the report needs the name tables, which a cached output skips reading
+        if self.args.storage_report:
+            return None
+        
+        platform = self.args.platform
+        if platform is not None:
+            platform = str(info.platforms_short.get(platform.lower(), platform))
+        
+        try:
+            script = None
+            if self.args.script is not None:
+                with open(self.args.script, 'rb') as f:
+                    script = hashlib.sha256(f.read()).hexdigest()
+            
+            return cache.editKey(self.args.infile, {
+                'names': sorted(self.newnames.iteritems()),
+                'platform': platform,
+                'encoding': self.args.encoding,
+                'lang': self.args.lang,
+                'all': self.args.all,
+                'font': self.args.font and self.args.font.lower(),
+                'script': script,
+                'suffixes': self.args.share_suffixes,
+            })
+        except IOError:
+            #whatever went wrong will come up again when it's done for real
+            return None
+    
+    def writeCached(self):
+        """
+        Make the edit by copying the output of the same edit to the same font
+        from the output cache, if there is one, returning whether it did.
+        """
+        if not self.editing or self.args.output_cache is None:
+            return False
+        
+        with self.timer.phase('output-cache'):
+            self.outputs = cache.openOutputs(self.args.output_cache or None,
+                                             self.args.output_cache_size * 1024 * 1024)
+            if self.outputs is not None:
+                self.outputKey = self.editKey()
+            if self.outputKey is None:
+                return False
+            
+            found = self.outputs.get(self.outputKey)
+            if found is None:
+                return False
+            
+            echo, self.modified, font = found
+            with font:
+                #an edit that changed nothing leaves the font alone, as ever
+                unchanged = self.inPlace() and not self.modified
+                if not unchanged:
+                    self.save(lambda outfile: shutil.copyfileobj(font, outfile,
+                                                                 sfnt.CHUNK_SIZE))
+        
+        for line in echo:
+            print >>self.stdout, line
+        if unchanged:
+            self.stderr.write('{0}: unchanged\n'.format(self.args.infile))
+            self.exitStatus = self.args.unchanged_status
+        return True
+    
     def open(self):
-        #open the font
+        #which font of a collection
+        font = self.args.font
+        if font is not None and font.lower() == 'all':
+            font = 'all'
+        elif font is not None:
+            try:
+                font = int(font)
+            except ValueError:
+                font = -1
+            if font < 0:
+                raise TTNameCLIError('Invalid font: {0}'.format(self.args.font))
+        
+        #open the font, and if we're only reading it, map it straight in
         try:
-            if self.args.infile == '-':
-                self.table = TTNameTable(sys.stdin)
+            infile = sys.stdin if self.args.infile == '-' else self.args.infile
+            
+            if font == 'all':
+                self.collection = TTNameCollection(infile, readonly=not self.editing,
+                                                   timer=self.timer,
+                                                   bounded=self.args.bounded_memory)
+                self.tables = self.collection.fonts
+            elif infile is sys.stdin:
+                self.collection = None
+                self.tables = [TTNameTable(sys.stdin, readonly=not self.editing,
+                                           timer=self.timer, font=font,
+                                           bounded=self.args.bounded_memory)]
             else:
-                self.table = TTNameTable(self.args.infile)
+                self.collection = None
+                self.tables = [self.openTable(infile, not self.editing, font)]
         except IOError as e:
             raise TTNameCLIError('Unable to open input file "{0}": {1}'.format(
                 self.args.infile, e.strerror))
         except TTLibError as e:
             raise TTNameCLIError('Unable to open font: {0}'.format(e.message))
         
+        self.table = self.tables[0]
+        
         #resolve the platform/encoding/lang
         first = next(self.table.names)
         
@@ -147,8 +506,21 @@ class TTNameCLI(object):
         else:
             self.lang = self.args.lang
     
-    #FIXME: the output is fugly.  ideas for how to do it better are welcome
     def read(self):
+        with self.timer.phase('read'):
+            for i, table in enumerate(self.tables):
+                #the fonts of a collection get a heading each
+                if self.collection is not None:
+                    heading = 'Font {0}'.format(i)
+                    print >>self.stdout, heading
+                    print >>self.stdout, '#' * len(heading)
+                    print >>self.stdout
+                
+                self.table = table
+                self._read()
+    
+    #FIXME: the output is fugly.  ideas for how to do it better are welcome
+    def _read(self):
         #outputting a single name
         if self.args.record is not None:
             if self.args.record in info.names_short:
@@ -162,33 +534,105 @@ class TTNameCLI(object):
             if self.args.all:
                 names = self.table.getNameFromAll(nameID)
                 for n in names:
-                    print u'{0}: {1}'.format(info.trip(n), n.string)
+                    print >>self.stdout, u'{0}: {1}'.format(info.trip(n), n.string)
                     
             else:
-                print self.table.getName(nameID, self.platform, 
-                                   self.encoding, self.lang)
+                n = self.table.getName(nameID, self.platform, self.encoding,
+                                       self.lang)
+                if n is not None:
+                    print >>self.stdout, n.string
                 
         #outputting the whole table
         else:
             if self.args.all:
                 for sd, names in self.table.getNamesBySection().iteritems():
-                    print info.trip(names[0])
-                    print '=' * len(info.trip(names[0]))
+                    print >>self.stdout, info.trip(names[0])
+                    print >>self.stdout, '=' * len(info.trip(names[0]))
                     
                     for n in names:
-                        print u'{0}: {1}'.format(info.name(n), n.string)
+                        print >>self.stdout, u'{0}: {1}'.format(info.name(n), n.string)
                             
-                    print
+                    print >>self.stdout
             
             else:
                 names = self.table.getSection(self.platform, self.encoding,
                                               self.lang)
                 
                 for n in names:
-                    print u'{0}: {1}'.format(info.name(n), n.string)
+                    print >>self.stdout, u'{0}: {1}'.format(info.name(n), n.string)
 
+    def loadScript(self):
+        """the Operations of the --script, if there is one"""
+        if self.args.script is None:
+            return []
+        
+        try:
+            if self.args.script == '-':
+                return script.parse(sys.stdin)
+            return script.parse(self.args.script)
+        except IOError as e:
+            raise TTNameCLIError('Unable to open script "{0}": {1}'.format(
+                self.args.script, e.strerror))
+        except script.TTNameScriptError as e:
+            raise TTNameCLIError('Invalid script: {0}'.format(e.message))
+    
     def write(self):
-        if self.args.outfile is not None:
+        operations = self.loadScript()
+        
+        #everything happens in memory before anything is written
+        with self.timer.phase('edit'):
+            entries = []
+            for table in self.tables:
+                try:
+                    entries.extend(table.setNames(self.newnames, self.platform,
+                                                  self.encoding, self.lang, self.args.all))
+                    script.run(table, operations, script.ALL if self.args.all else
+                               SectionData(self.platform, self.encoding, self.lang))
+                except script.TTNameScriptError as e:
+                    raise TTNameCLIError('Invalid script: {0}'.format(e.message))
+                except codec.NameTableError as e:
+                    raise TTNameCLIError('Unable to set names: {0}'.format(e))
+        
+        self.modified = any(table.modified for table in self.tables)
+        
+        #don't mix this in with the font when it's going to stdout
+        echo = []
+        if not self.args.all and self.args.outfile != '-':
+            echo = [entry.string for entry in entries]
+            for line in echo:
+                print >>self.stdout, line
+        
+        #leave the font alone, mtime and all, if it would come out the same
+        if self.inPlace() and not self.modified:
+            self.stderr.write('{0}: unchanged\n'.format(self.args.infile))
+            self.exitStatus = self.args.unchanged_status
+            return
+        
+        suffixes = self.args.share_suffixes
+        self.save(lambda outfile: (self.collection or self.table).save(outfile, suffixes))
+        
+        if self.args.storage_report:
+            self.reportStorage()
+        
+        if self.outputKey is not None:
+            with self.timer.phase('output-cache'):
+                self.outputs.put(self.outputKey, self.args.outfile or self.args.infile, echo,
+                                 self.modified)
+    
+    def inPlace(self):
+        """whether the output replaces the input, named as OUTFILE or not"""
+        return self.args.outfile is None or (self.args.infile != '-' and
+                    self.args.outfile != '-' and os.path.exists(self.args.outfile) and
+                    os.path.samefile(self.args.outfile, self.args.infile))
+    
+    def save(self, writeFont):
+        """open the output, have writeFont write the font to it, and put it in place"""
+        #the original is read while the new font is written, so it can only be
+        #replaced once the new one is done
+        target = self.args.outfile or self.args.infile
+        inPlace = self.inPlace()
+        
+        if not inPlace:
             if self.args.outfile == '-':
                 outfile = sys.stdout
             else:
@@ -196,34 +640,82 @@ class TTNameCLI(object):
                     outfile = open(self.args.outfile, 'w')
                 except IOError as e:
                     raise TTNameCLIError('Unable to open output file '
-                        '"{0}": {1}'.format(self.args.infile, e.strerror))
+                        '"{0}": {1}'.format(self.args.outfile, e.strerror))
                     
         else:
             try:
-                outfile = tempfile.NamedTemporaryFile(dir=os.path.dirname(self.args.infile),
-                        prefix=os.path.basename(self.args.infile), suffix='.ttname-tmp', delete=False)
+                outfile = tempfile.NamedTemporaryFile(dir=os.path.dirname(target),
+                        prefix=os.path.basename(target), suffix='.ttname-tmp', delete=False)
                 tempfn = outfile.name
             except OSError as e:
                 raise TTNameCLIError('Unable to replace file')
         
-        if self.args.all:
-            for name, value in self.newnames.iteritems():
-                for rec in self.table.getNameFromAll(name):
-                    rec.string = value
-        else:
-            
-            for name, value in self.newnames.iteritems():
-                entry = self.table.getName(name, self.platform, self.encoding,
-                                        self.lang, True)
-                entry.string = value
-                print entry.string
-            
-        self.table.save(outfile)
+        try:
+            writeFont(outfile)
+        except (codec.NameTableError, TTLibError, IOError, OSError) as e:
+            #don't leave half a font behind
+            if outfile is not sys.stdout:
+                outfile.close()
+                os.unlink(outfile.name)
+            if isinstance(e, codec.NameTableError):
+                raise TTNameCLIError('Unable to save names: {0}'.format(e))
+            raise TTNameCLIError('Unable to save font: {0}'.format(
+                                 getattr(e, 'strerror', None) or e))
         outfile.close()
     
-        if self.args.outfile is None:
-            os.unlink(self.args.infile)
-            os.rename(tempfn, self.args.infile)
+        if inPlace:
+            with self.timer.phase('replace'):
+                os.unlink(target)
+                os.rename(tempfn, target)
+
+    def reportStorage(self):
+        """report the string storage of each name table that was saved"""
+        for i, table in enumerate(self.tables):
+            #a collection's other fonts keep the name tables they had
+            if self.collection is not None and not table.modified:
+                continue
+            
+            stats = codec.storageStats(table.compile(self.args.share_suffixes))
+            label = self.args.infile
+            if self.collection is not None:
+                label += ' (font {0})'.format(i)
+            self.stderr.write('{0}: {1} bytes of strings stored in {2} bytes, '
+                              '{3} saved\n'.format(label, stats.size, stats.stored,
+                                                   stats.saved))
+    
+    def verify(self):
+        """check the checksums of the font we read, or the one we wrote"""
+        path = self.args.infile
+        if self.editing and self.args.outfile is not None:
+            path = self.args.outfile
+        if path == '-':
+            raise TTNameCLIError('Unable to verify a font on standard input or output')
+        
+        with self.timer.phase('verify') as p:
+            try:
+                with open(path, 'rb') as f:
+                    if sfnt.isCollection(f):
+                        readers = sfnt.TTCReader(f).fonts
+                    else:
+                        readers = [sfnt.openFont(f)]
+                    
+                    for i, reader in enumerate(readers):
+                        #a head shared between fonts can't be right for all of them
+                        mismatches = reader.verify(adjustment=len(readers) == 1)
+                        p.bytesRead += reader.bytesRead
+                        
+                        prefix = path if len(readers) == 1 else '{0}: font {1}'.format(path, i)
+                        for m in mismatches:
+                            what = m.what if m.what == 'checkSumAdjustment' else \
+                                   "'{0}' table checksum".format(m.what)
+                            self.stderr.write('{0}: {1} is 0x{2:08X}, should be '
+                                              '0x{3:08X}\n'.format(prefix, what, m.stored,
+                                                                   m.actual))
+                            self.exitStatus = 1
+            except IOError as e:
+                raise TTNameCLIError('Unable to verify "{0}": {1}'.format(path, e.strerror))
+            except TTLibError as e:
+                raise TTNameCLIError('Unable to verify "{0}": {1}'.format(path, e.message))
 
 class TTNameCLIError(Exception):
     pass
@@ -0,0 +1,237 @@
+"""
+A binary encoder and decoder for the OpenType "name" table
+"""
+
+# This file is part of ttname.
+#
+# Copyright 2013 T.C. Hollingsworth <tchollingsworth@gmail.com>
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met: 
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer. 
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution. 
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import collections
+import struct
+
+_header = struct.Struct('>HHH')
+_record = struct.Struct('>HHHHHH')
+_langTagCount = struct.Struct('>H')
+_langTag = struct.Struct('>HH')
+
+class NameTableError(Exception):
+    pass
+
+def view(data, offset, length):
+    """a zero-copy slice of a buffer, such as a memory-mapped file"""
+    try:
+        return memoryview(data)[offset:offset + length]
+    except TypeError:
+        #python 2's mmap only speaks the old buffer protocol
+        return buffer(data, offset, length)
+
+def toBytes(data):
+    """the contents of a string or zero-copy slice as a string"""
+    if isinstance(data, str):
+        return data
+    elif isinstance(data, memoryview):
+        return data.tobytes()
+    else:
+        return str(data)
+
+def isUnicode(platformID, platEncID):
+    """whether strings for this platform/encoding are stored as UTF-16BE"""
+    return platformID == 0 or (platformID == 3 and platEncID in (0, 1, 10))
+
+def codec(platformID, platEncID):
+    """the python codec used for strings of this platform/encoding"""
+    if isUnicode(platformID, platEncID):
+        return 'utf_16_be'
+    elif platformID == 1 and platEncID == 0:
+        return 'mac_roman'
+    else:
+        # we don't know any better, so at least keep the bytes intact
+        return 'latin_1'
+
+def decodeString(data, platformID, platEncID):
+    """decode the raw bytes of a name record to unicode"""
+    data = toBytes(data)
+    if isUnicode(platformID, platEncID) and len(data) % 2:
+        # no, shouldn't happen, but some of the Apple tools cause this anyway
+        data += '\0'
+    return data.decode(codec(platformID, platEncID))
+
+def encodeString(string, platformID, platEncID):
+    """encode unicode text to the raw bytes of a name record"""
+    try:
+        return string.encode(codec(platformID, platEncID))
+    except UnicodeError:
+        raise NameTableError('Unable to encode "{0}" for platform {1}, '
+                             'encoding {2}'.format(string.encode('utf-8'),
+                                                   platformID, platEncID))
+
+def decompile(data):
+    """
+    Decode a binary name table.
+    
+    Returns a tuple of (format, records, langTags), where records is a list of
+    (platformID, platEncID, langID, nameID, data) tuples in table order and
+    langTags is a list of the raw UTF-16BE language tags of a format 1 table.
+    
+    If data is anything other than a string, such as a memory-mapped file,
+    the record and tag data are zero-copy slices of it.
+    """
+    if isinstance(data, str):
+        substring = lambda start, length: data[start:start+length]
+    else:
+        substring = lambda start, length: view(data, start, length)
+    
+    if len(data) < _header.size:
+        raise NameTableError('name table is truncated')
+    
+    format, count, stringOffset = _header.unpack_from(data)
+    if format not in (0, 1):
+        raise NameTableError('unknown name table format {0}'.format(format))
+    
+    end = _header.size + count * _record.size
+    if end > len(data) or stringOffset > len(data):
+        raise NameTableError('name table is truncated')
+    
+    records = []
+    for pos in xrange(_header.size, end, _record.size):
+        platformID, platEncID, langID, nameID, length, offset = \
+                                            _record.unpack_from(data, pos)
+        start = stringOffset + offset
+        if start + length > len(data):
+            raise NameTableError('name record {0} points past the end of the '
+                                 'table'.format(nameID))
+        records.append((platformID, platEncID, langID, nameID,
+                        substring(start, length)))
+    
+    langTags = []
+    if format == 1:
+        if end + _langTagCount.size > len(data):
+            raise NameTableError('name table is truncated')
+        count, = _langTagCount.unpack_from(data, end)
+        pos = end + _langTagCount.size
+        if pos + count * _langTag.size > len(data):
+            raise NameTableError('name table is truncated')
+        for pos in xrange(pos, pos + count * _langTag.size, _langTag.size):
+            length, offset = _langTag.unpack_from(data, pos)
+            start = stringOffset + offset
+            if start + length > len(data):
+                raise NameTableError('language tag points past the end of the '
+                                     'table')
+            langTags.append(substring(start, length))
+    
+    return format, records, langTags
+
+def _layout(strings, suffixes=False):
+    """
+    Lay out the string storage, storing identical strings once and, with
+    suffixes, storing a string that ends a longer one as part of it.
+    
+    Returns a dict of each string's offset and the list of strings to store.
+    """
+    offsets = {}
+    storage = []
+    offset = 0
+    
+    if suffixes:
+        #sorted back to front, a string comes right after the longer strings
+        #it ends, and the last of those is what it gets stored in
+        previous = None
+        for data in sorted(set(strings), key=lambda s: s[::-1], reverse=True):
+            if previous is not None and previous.endswith(data):
+                offsets[data] = offsets[previous] + len(previous) - len(data)
+                continue
+            offsets[data] = offset
+            storage.append(data)
+            offset += len(data)
+            previous = data
+    else:
+        for data in strings:
+            if data not in offsets:
+                offsets[data] = offset
+                storage.append(data)
+                offset += len(data)
+    
+    return offsets, storage
+
+def compile(records, langTags=(), suffixes=False):
+    """
+    Encode a binary name table.
+    
+    records is an iterable of (platformID, platEncID, langID, nameID, data)
+    tuples, which are written in the order required by the specification.  If
+    any langTags are given, a format 1 table is written.
+    
+    Identical strings share the same storage.  If suffixes is true, a string
+    that is the end of a longer one points into it instead of being stored
+    again, which makes for a smaller table at the cost of a little more time.
+    """
+    records = sorted((r[:4] + (toBytes(r[4]),) for r in records), key=lambda r: r[:4])
+    langTags = [toBytes(data) for data in langTags]
+    format = 1 if langTags else 0
+    
+    stringOffset = _header.size + len(records) * _record.size
+    if format == 1:
+        stringOffset += _langTagCount.size + len(langTags) * _langTag.size
+    
+    strings = [r[4] for r in records] + langTags
+    for data in strings:
+        if len(data) > 0xFFFF:
+            raise NameTableError('name table string storage is too large')
+    offsets, storage = _layout(strings, suffixes)
+    
+    def place(data):
+        if offsets[data] > 0xFFFF:
+            raise NameTableError('name table string storage is too large')
+        return offsets[data]
+    
+    result = [_header.pack(format, len(records), stringOffset)]
+    
+    for platformID, platEncID, langID, nameID, data in records:
+        result.append(_record.pack(platformID, platEncID, langID, nameID,
+                                   len(data), place(data)))
+    
+    if format == 1:
+        result.append(_langTagCount.pack(len(langTags)))
+        for data in langTags:
+            result.append(_langTag.pack(len(data), place(data)))
+    
+    return ''.join(result + storage)
+
+class StorageStats(collections.namedtuple('StorageStats', ['size', 'stored'])):
+    """
+    How many bytes of strings a name table has (size) and how many bytes of
+    string storage it keeps them in (stored).
+    """
+    __slots__ = ()
+    
+    @property
+    def saved(self):
+        """the bytes saved by sharing storage between strings"""
+        return self.size - self.stored
+
+def storageStats(data):
+    """the StorageStats of a binary name table"""
+    format, records, langTags = decompile(data)
+    stringOffset = _header.unpack_from(data)[2]
+    size = sum(len(r[4]) for r in records) + sum(len(tag) for tag in langTags)
+    return StorageStats(size, len(data) - stringOffset)
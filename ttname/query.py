@@ -0,0 +1,274 @@
+"""
+Search the name records of many fonts at once
+"""
+
+# This file is part of ttname.
+#
+# Copyright 2013 T.C. Hollingsworth <tchollingsworth@gmail.com>
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met: 
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer. 
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution. 
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+from fontTools.ttLib import TTLibError
+import argparse
+import collections
+import itertools
+import json
+import re
+import sys
+
+from table import TTNameTable
+import batch
+import cache
+import codec
+import info
+
+Match = collections.namedtuple('Match', ['path', 'record'])
+
+class TTNameQueryError(Exception):
+    pass
+
+def _text(value):
+    #command line arguments and the like come in as utf-8 byte strings
+    if isinstance(value, str):
+        return value.decode('utf-8')
+    return value
+
+def _number(value, what):
+    if value is None:
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise TTNameQueryError('Invalid {0}: {1}'.format(what, value))
+
+def _nameID(value):
+    if value in info.names_short:
+        return info.names_short[value]
+    return _number(value, 'name')
+
+def _platformID(value):
+    if isinstance(value, basestring) and value.lower() in info.platforms_short:
+        return info.platforms_short[value.lower()]
+    return _number(value, 'platform')
+
+class Query(object):
+    """
+    Which name records to look for.
+    
+    Name IDs and platforms may be given by number or by the short names the CLI
+    accepts.  A record matches when its IDs match all the ones given, and its
+    string equals, contains and/or has a match for the regex given.
+    
+    The IDs are checked before the string, and only records that could match
+    ever have their strings decoded.
+    """
+    def __init__(self, nameIDs=None, platformID=None, platEncID=None, langID=None,
+                 equals=None, contains=None, regex=None, ignoreCase=False):
+        self.nameIDs = None if nameIDs is None else [_nameID(n) for n in nameIDs]
+        self.platformID = _platformID(platformID)
+        self.platEncID = _number(platEncID, 'encoding')
+        self.langID = _number(langID, 'lang')
+        self.equals = _text(equals)
+        self.contains = _text(contains)
+        self.ignoreCase = ignoreCase
+        
+        if ignoreCase:
+            self.equals = self.equals and self.equals.lower()
+            self.contains = self.contains and self.contains.lower()
+        
+        try:
+            flags = re.UNICODE | (re.IGNORECASE if ignoreCase else 0)
+            self.regex = None if regex is None else re.compile(_text(regex), flags)
+        except re.error as e:
+            raise TTNameQueryError('Invalid regex: {0}'.format(e))
+        
+        #equals is checked against the raw bytes, encoded once per encoding
+        self._encoded = {}
+    
+    def _equalsData(self, n):
+        key = (n.platformID, n.platEncID)
+        if key not in self._encoded:
+            try:
+                self._encoded[key] = codec.encodeString(self.equals, *key)
+            except codec.NameTableError:
+                self._encoded[key] = None
+        
+        encoded = self._encoded[key]
+        return encoded is not None and len(n.data) == len(encoded) and \
+               codec.toBytes(n.data) == encoded
+    
+    def matches(self, n):
+        """whether a name record matches"""
+        if self.nameIDs is not None and n.nameID not in self.nameIDs:
+            return False
+        if self.platformID is not None and n.platformID != self.platformID:
+            return False
+        if self.platEncID is not None and n.platEncID != self.platEncID:
+            return False
+        if self.langID is not None and n.langID != self.langID:
+            return False
+        
+        #the cheap checks passed; now for the string
+        if self.equals is not None and not self.ignoreCase and not self._equalsData(n):
+            return False
+        if self.equals is None and self.contains is None and self.regex is None:
+            return True
+        
+        string = n.string
+        folded = string.lower() if self.ignoreCase else string
+        
+        if self.equals is not None and self.ignoreCase and folded != self.equals:
+            return False
+        if self.contains is not None and self.contains not in folded:
+            return False
+        if self.regex is not None and self.regex.search(string) is None:
+            return False
+        
+        return True
+    
+    def filter(self, table):
+        """yields the records of a TTNameTable that match"""
+        if self.nameIDs is None:
+            candidates = table.names
+        else:
+            #go straight to the names asked for through the table's index
+            candidates = itertools.chain.from_iterable(table.getNameFromAll(nameID)
+                                                       for nameID in self.nameIDs)
+        
+        for n in candidates:
+            if self.matches(n):
+                yield n
+
+def search(paths, query, cache=None, errors=None):
+    """
+    Scan files, directories and glob patterns for name records matching a
+    Query, yielding a Match for each one as it's found.
+    
+    Fonts are opened read-only, and answered from the cache.NameCache if one
+    is given, so unchanged fonts that were seen before aren't parsed again.
+    Fonts that can't be read raise, unless an errors callable is given, in
+    which case it's called with the path and the exception and the scan goes on.
+    """
+    try:
+        for path in batch.findFonts(paths):
+            try:
+                table = TTNameTable(path, readonly=True, cache=cache)
+            except (IOError, TTLibError, codec.NameTableError) as e:
+                if errors is None:
+                    raise
+                errors(path, e)
+                continue
+            
+            for n in query.filter(table):
+                yield Match(path, n)
+    except batch.TTNameBatchError as e:
+        raise TTNameQueryError(e.message)
+
+class TTNameQueryCLI(object):
+    def __init__(self, argv=sys.argv[1:], swallow_exceptions=True):
+        try:
+            self.parse_cmdline(argv)
+            self.run()
+        except TTNameQueryError as e:
+            #normally we'll just output an error and quit
+            if swallow_exceptions:
+                sys.stderr.write(e.message)
+                sys.stderr.write('\n')
+                sys.exit(2)
+            #but sometimes we re-raise the error so the tests can see it more easily
+            else:
+                raise
+        
+        #like grep, finding nothing is a failure
+        if swallow_exceptions and not self.matches:
+            sys.exit(1)
+    
+    def parse_cmdline(self, argv):
+        p = argparse.ArgumentParser(description=__doc__)
+        
+        #which files to search
+        p.add_argument('paths', nargs='+', metavar='PATH',
+                       help='font file, directory or glob pattern to search')
+        
+        #which records to look at
+        p.add_argument('-n', '--name', action='append', dest='names',
+                       help='name ID or short name to look for (may be given '
+                       'more than once)')
+        p.add_argument('-p', '--platform', default=None,
+                       help='name or number of the platform ID to look in')
+        p.add_argument('-e', '--encoding', type=int, default=None,
+                       help='the platform specific encoding ID to look in')
+        p.add_argument('-l', '--lang', type=int, default=None,
+                       help='the language ID to look in')
+        
+        #what the string has to look like
+        p.add_argument('--equals', metavar='TEXT',
+                       help='only match names that are exactly TEXT')
+        p.add_argument('--contains', metavar='TEXT',
+                       help='only match names containing TEXT')
+        p.add_argument('-r', '--regex', metavar='PATTERN',
+                       help='only match names with a match for PATTERN')
+        p.add_argument('-i', '--ignore-case', action='store_true',
+                       help='ignore case when matching names')
+        
+        #how to show what was found
+        p.add_argument('-L', '--files-with-matches', action='store_true',
+                       help='only print the path of each font with a match')
+        p.add_argument('--json', action='store_true',
+                       help='print each match as a line of JSON, in the same '
+                       'form as a ttname-batch manifest')
+        
+        p.add_argument('--cache', dest='cache', action='store_true', default=False,
+                       help='use and update the cache of name records')
+        p.add_argument('--no-cache', dest='cache', action='store_false',
+                       help="don't use the cache of name records (the default)")
+        
+        self.args = p.parse_args(args=argv)
+    
+    def _error(self, path, e):
+        sys.stderr.write(u'{0}: {1}\n'.format(path, getattr(e, 'strerror', None) or e))
+        self.failed += 1
+    
+    def run(self):
+        query = Query(self.args.names, self.args.platform, self.args.encoding,
+                      self.args.lang, self.args.equals, self.args.contains,
+                      self.args.regex, self.args.ignore_case)
+        names = cache.openDefault() if self.args.cache else None
+        
+        self.matches = 0
+        self.failed = 0
+        lastPath = None
+        
+        for m in search(self.args.paths, query, names, self._error):
+            self.matches += 1
+            n = m.record
+            
+            if self.args.files_with_matches:
+                if m.path != lastPath:
+                    print m.path
+                lastPath = m.path
+            elif self.args.json:
+                print json.dumps({'path': m.path, 'platform': n.platformID,
+                                  'encoding': n.platEncID, 'lang': n.langID,
+                                  'nameID': n.nameID, 'value': n.string},
+                                 sort_keys=True)
+            else:
+                print u'{0}: {1}: {2}'.format(m.path, info.quad(n), n.string)
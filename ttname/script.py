@@ -0,0 +1,165 @@
+"""
+Edit scripts: many operations applied to one font in a single pass
+"""
+
+# This file is part of ttname.
+#
+# Copyright 2013 T.C. Hollingsworth <tchollingsworth@gmail.com>
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met: 
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer. 
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution. 
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import collections
+import shlex
+
+from table import SectionData
+import codec
+import info
+
+#the section a command applies to everywhere the name exists
+ALL = 'all'
+
+Operation = collections.namedtuple('Operation', ['line', 'command', 'args'])
+
+class TTNameScriptError(Exception):
+    pass
+
+def _nameID(value, line):
+    if value in info.names_short:
+        return info.names_short[value]
+    try:
+        return int(value)
+    except ValueError:
+        raise TTNameScriptError('line {0}: Invalid name: {1}'.format(line, value))
+
+def _section(value, line):
+    """parses "{platform}/{encoding}/{lang}" or "all" """
+    if value.lower() == ALL:
+        return ALL
+    
+    parts = value.split('/')
+    if len(parts) != 3:
+        raise TTNameScriptError('line {0}: Invalid section: {1} (expected '
+                                'PLATFORM/ENCODING/LANG)'.format(line, value))
+    
+    platform = info.platforms_short.get(parts[0].lower(), parts[0])
+    try:
+        return SectionData(int(platform), int(parts[1]), int(parts[2]))
+    except ValueError:
+        raise TTNameScriptError('line {0}: Invalid section: {1}'.format(line, value))
+
+def _explicit(section, command, line):
+    if section == ALL:
+        raise TTNameScriptError('line {0}: {1} needs an explicit section'.format(
+                                line, command))
+    return section
+
+#how to parse the arguments of each command
+_COMMANDS = {
+    'section': lambda args, line: [_section(args[0], line)],
+    'set': lambda args, line: [_nameID(args[0], line), args[1].decode('utf-8')],
+    'delete': lambda args, line: [_nameID(args[0], line)],
+    'copy-section': lambda args, line: [_explicit(_section(a, line), 'copy-section', line)
+                                        for a in args],
+    'rename-section': lambda args, line: [_explicit(_section(a, line), 'rename-section', line)
+                                          for a in args],
+}
+
+_ARGCOUNTS = {'section': 1, 'set': 2, 'delete': 1, 'copy-section': 2, 'rename-section': 2}
+
+def parse(fileish):
+    """
+    Read an edit script into a list of Operations, checking it all before
+    anything is done.  Each line is a command and its arguments, split like a
+    shell would, and # starts a comment:
+    
+    section PLATFORM/ENCODING/LANG|all
+        where the following set and delete commands apply
+    set NAME VALUE
+        set a name, by number or short name
+    delete NAME
+        remove a name
+    copy-section FROM TO
+        copy every name in a section to another
+    rename-section FROM TO
+        move every name in a section to another
+    """
+    if hasattr(fileish, 'read'):
+        lines = fileish.read().splitlines()
+    else:
+        with open(fileish, 'rb') as f:
+            lines = f.read().splitlines()
+    
+    operations = []
+    for number, text in enumerate(lines, 1):
+        try:
+            tokens = shlex.split(text, comments=True)
+        except ValueError as e:
+            raise TTNameScriptError('line {0}: {1}'.format(number, e))
+        if not tokens:
+            continue
+        
+        command, args = tokens[0].lower(), tokens[1:]
+        if command not in _COMMANDS:
+            raise TTNameScriptError('line {0}: Unknown command: {1}'.format(number, command))
+        if len(args) != _ARGCOUNTS[command]:
+            raise TTNameScriptError('line {0}: {1} takes {2} arguments'.format(
+                                    number, command, _ARGCOUNTS[command]))
+        
+        try:
+            operations.append(Operation(number, command, _COMMANDS[command](args, number)))
+        except UnicodeError:
+            raise TTNameScriptError('line {0}: Invalid UTF-8'.format(number))
+    
+    return operations
+
+def run(table, operations, section):
+    """
+    Apply Operations to a TTNameTable in memory, starting in the given section.
+    Returns the number of records changed; nothing is saved.
+    """
+    changed = 0
+    
+    for op in operations:
+        try:
+            if op.command == 'section':
+                section = op.args[0]
+            elif op.command == 'set':
+                if section == ALL:
+                    updated = table.setNames({op.args[0]: op.args[1]}, None, None, None, True)
+                else:
+                    updated = table.setNames({op.args[0]: op.args[1]}, *section)
+                changed += len(updated)
+            elif op.command == 'delete':
+                if section == ALL:
+                    names = list(table.getNameFromAll(op.args[0]))
+                else:
+                    names = [n for n in [table.getName(op.args[0], *section)] if n]
+                for n in names:
+                    table.delName(n.nameID, n.platformID, n.platEncID, n.langID)
+                changed += len(names)
+            elif op.command == 'copy-section':
+                changed += len(table.copySection(*op.args))
+            elif op.command == 'rename-section':
+                changed += len(table.renameSection(*op.args))
+        except (codec.NameTableError, UnicodeError) as e:
+            raise TTNameScriptError('line {0}: {1}'.format(op.line, e))
+    
+    return changed
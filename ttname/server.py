@@ -0,0 +1,379 @@
+"""
+A long-running ttname daemon answering JSON-RPC on a Unix socket
+"""
+
+# This file is part of ttname.
+#
+# Copyright 2013 T.C. Hollingsworth <tchollingsworth@gmail.com>
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met: 
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer. 
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution. 
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+from StringIO import StringIO
+from fontTools.ttLib import TTLibError
+import SocketServer
+import collections
+import errno
+import json
+import os
+import signal
+import socket
+import stat
+import sys
+import threading
+
+from table import TTNameTable
+import batch
+import cli
+import codec
+import info
+import query
+
+#JSON-RPC 2.0 error codes
+PARSE_ERROR = -32700
+INVALID_REQUEST = -32600
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+INTERNAL_ERROR = -32603
+FONT_ERROR = -32000
+
+class TTNameServerError(Exception):
+    "An error to send back to the client"
+    def __init__(self, code, message):
+        Exception.__init__(self, message)
+        self.code = code
+
+class TTNameClientError(Exception):
+    pass
+
+def _id(value, what, highest=0xFFFF):
+    """check that an ID param is a number that fits in the name table"""
+    if value is None:
+        return None
+    if isinstance(value, bool) or not isinstance(value, (int, long)) or \
+                not 0 <= value <= highest:
+        raise TTNameServerError(INVALID_PARAMS, 'Invalid params: {0} must be a number '
+                                'from 0 to {1}, not {2}'.format(what, highest,
+                                                                json.dumps(value)))
+    return value
+
+def _record(n):
+    return {'nameID': n.nameID, 'platform': n.platformID, 'encoding': n.platEncID,
+            'lang': n.langID, 'value': n.string}
+
+class TableCache(object):
+    """
+    A thread-safe LRU of read-only TTNameTables, keyed by real path and
+    reopened whenever the font's size or modification time changes.
+    """
+    def __init__(self, maxTables=64):
+        self.maxTables = maxTables
+        self._tables = collections.OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, path):
+        path = os.path.realpath(path)
+        st = os.stat(path)
+        stamp = (st.st_size, st.st_mtime)
+        
+        with self._lock:
+            entry = self._tables.pop(path, None)
+            if entry is not None and entry[0] == stamp:
+                self._tables[path] = entry
+                return entry[1]
+        
+        #opening can take a while, so don't hold everyone else up
+        table = TTNameTable(path, readonly=True)
+        
+        with self._lock:
+            self._tables[path] = (stamp, table)
+            while len(self._tables) > self.maxTables:
+                self._tables.popitem(last=False)
+        
+        return table
+    
+    def discard(self, path):
+        with self._lock:
+            self._tables.pop(os.path.realpath(path), None)
+
+class _ServedCLI(cli.TTNameCLI):
+    "A ttname run inside the daemon, reading through its TableCache"
+    def forward(self, argv):
+        return False
+    
+    def openTable(self, path, readonly, font=None):
+        if readonly and not font:
+            try:
+                return self.server.tables.get(path)
+            except OSError as e:
+                raise IOError(e.errno, e.strerror)
+        return cli.TTNameCLI.openTable(self, path, readonly, font)
+
+class _Handler(SocketServer.StreamRequestHandler):
+    #one JSON-RPC request per line, answered in order
+    def handle(self):
+        for line in iter(self.rfile.readline, ''):
+            if not line.strip():
+                continue
+            
+            response = self.server.dispatch(line)
+            if response is not None:
+                self.wfile.write(json.dumps(response) + '\n')
+                self.wfile.flush()
+
+class TTNameServer(SocketServer.ThreadingMixIn, SocketServer.UnixStreamServer):
+    """
+    Answers JSON-RPC 2.0 requests on a Unix socket, one request per line,
+    each connection in its own thread.
+    
+    Methods:
+    
+    run(argv, cwd): a ttname run, returning its status, stdout and stderr
+    read(path, nameID=None): the name records of a font
+    edit(path, names, platform=None, encoding=None, lang=None, all=False,
+         outfile=None): set names like ttname-batch and save the font in place
+         (unless nothing changed) or to outfile, returning the records that
+         were updated
+    shutdown(): stop the server
+    
+    Reads come from an LRU of open tables, so a font that's asked about again
+    is only opened again once it changes.  Edits to the same font are done one
+    at a time.
+    """
+    daemon_threads = True
+    
+    def __init__(self, path, maxTables=64):
+        SocketServer.UnixStreamServer.__init__(self, path, _Handler)
+        self.tables = TableCache(maxTables)
+        self._fileLocks = collections.defaultdict(threading.Lock)
+        self._fileLocksLock = threading.Lock()
+    
+    def fileLock(self, path):
+        """the lock to hold while editing a font"""
+        with self._fileLocksLock:
+            return self._fileLocks[os.path.realpath(path)]
+    
+    def dispatch(self, line):
+        """answer a line of JSON-RPC, returning the response or None"""
+        id = None
+        request = None
+        try:
+            try:
+                request = json.loads(line)
+            except ValueError as e:
+                raise TTNameServerError(PARSE_ERROR, 'Parse error: {0}'.format(e))
+            
+            if not isinstance(request, dict) or 'method' not in request:
+                raise TTNameServerError(INVALID_REQUEST, 'Invalid request')
+            id = request.get('id')
+            
+            method = getattr(self, 'rpc_' + str(request['method']), None)
+            if method is None:
+                raise TTNameServerError(METHOD_NOT_FOUND, 'Method not found: {0}'.format(
+                                        request['method']))
+            
+            params = request.get('params', {})
+            try:
+                if isinstance(params, list):
+                    result = method(*params)
+                else:
+                    result = method(**dict((str(k), v) for k, v in params.iteritems()))
+            except TypeError as e:
+                raise TTNameServerError(INVALID_PARAMS, 'Invalid params: {0}'.format(e))
+            except (IOError, OSError) as e:
+                raise TTNameServerError(FONT_ERROR, '{0}'.format(e.strerror or e))
+            except (TTLibError, codec.NameTableError, batch.TTNameBatchError,
+                    query.TTNameQueryError, UnicodeError) as e:
+                raise TTNameServerError(FONT_ERROR, '{0}'.format(e))
+            
+            response = {'jsonrpc': '2.0', 'id': id, 'result': result}
+        except TTNameServerError as e:
+            response = {'jsonrpc': '2.0', 'id': id,
+                        'error': {'code': e.code, 'message': e.message}}
+        except Exception as e:
+            #whatever went wrong, the server keeps serving everyone else
+            response = {'jsonrpc': '2.0', 'id': id,
+                        'error': {'code': INTERNAL_ERROR,
+                                  'message': 'Internal error: {0}'.format(e)}}
+        
+        #notifications don't get an answer
+        if isinstance(request, dict) and 'id' not in request and 'error' not in response:
+            return None
+        return response
+    
+    def rpc_run(self, argv, cwd=None):
+        stdout = StringIO()
+        stderr = StringIO()
+        status = 0
+        
+        #edits hold their font's lock from reading it to replacing it
+        probe = cli.TTNameCLI.__new__(cli.TTNameCLI)
+        try:
+            probe.parse_cmdline(argv)
+            if cwd is not None:
+                probe.resolve(cwd)
+        except SystemExit:
+            raise TTNameServerError(INVALID_PARAMS, 'Invalid arguments')
+        
+        if probe.args.serve or '-' in (probe.args.infile, probe.args.outfile):
+            raise TTNameServerError(INVALID_PARAMS, "The daemon can't serve or use "
+                                    'stdin and stdout')
+        
+        lock = self.fileLock(probe.args.infile) if probe.editing else threading.Lock()
+        with lock:
+            run = _ServedCLI.__new__(_ServedCLI)
+            run.server = self
+            try:
+                run.__init__(argv, False, stdout=stdout, stderr=stderr, cwd=cwd)
+                status = run.exitStatus
+            except cli.TTNameCLIError as e:
+                stderr.write(e.message + '\n')
+                status = 1
+            except SystemExit as e:
+                status = e.code
+            finally:
+                if probe.editing:
+                    self.tables.discard(probe.args.infile)
+        
+        return {'status': status, 'stdout': stdout.getvalue(), 'stderr': stderr.getvalue()}
+    
+    def rpc_read(self, path, nameID=None):
+        table = self.tables.get(path)
+        if nameID is None:
+            return [_record(n) for n in table.names]
+        return [_record(n) for n in table.getNameFromAll(query._nameID(nameID))]
+    
+    def rpc_edit(self, path, names, platform=None, encoding=None, lang=None,
+                 all=False, outfile=None):
+        if not isinstance(path, basestring) or not isinstance(names, dict) or \
+                    not isinstance(outfile, (basestring, type(None))):
+            raise TTNameServerError(INVALID_PARAMS, 'Invalid params: path and outfile '
+                                    'must be strings and names an object')
+        
+        #platforms may be named, IDs otherwise have to be numbers already
+        if isinstance(platform, basestring) and platform.lower() in info.platforms_short:
+            platform = info.platforms_short[platform.lower()]
+        platformID = batch.ALL if all else _id(platform, 'platform')
+        encoding = _id(encoding, 'encoding')
+        lang = _id(lang, 'lang')
+        
+        edits = []
+        for nameID, value in names.iteritems():
+            if not isinstance(value, basestring):
+                raise TTNameServerError(INVALID_PARAMS, 'Invalid params: the value of '
+                                        'name {0} must be a string'.format(nameID))
+            try:
+                nameID = query._nameID(nameID)
+            except query.TTNameQueryError as e:
+                raise TTNameServerError(INVALID_PARAMS, 'Invalid params: {0}'.format(e))
+            edits.append(batch.Edit(path, platformID, encoding, lang,
+                                    _id(nameID, 'nameID', 0x7FFF), value))
+        
+        with self.fileLock(path):
+            table = TTNameTable(path)
+            updated = batch.applyEdits(table, edits)
+            if table.modified or outfile is not None:
+                table.save(path if outfile is None else outfile)
+                self.tables.discard(path if outfile is None else outfile)
+        
+        return [_record(n) for n in updated]
+    
+    def rpc_shutdown(self):
+        #shutdown() waits for serve_forever(), which is waiting on us
+        threading.Thread(target=self.shutdown).start()
+        return True
+
+class TTNameClient(object):
+    "Makes JSON-RPC calls to a TTNameServer"
+    def __init__(self, path):
+        self.path = path
+        self._id = 0
+    
+    def call(self, method, **params):
+        """call a method on the server, returning its result"""
+        self._id += 1
+        request = {'jsonrpc': '2.0', 'id': self._id, 'method': method, 'params': params}
+        
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(self.path)
+            sock.sendall(json.dumps(request) + '\n')
+            line = sock.makefile('rb').readline()
+        except socket.error as e:
+            raise TTNameClientError('Unable to reach daemon at "{0}": {1}'.format(
+                                    self.path, e))
+        finally:
+            sock.close()
+        
+        try:
+            response = json.loads(line)
+        except ValueError:
+            raise TTNameClientError('Invalid response from daemon')
+        
+        if 'error' in response:
+            raise TTNameClientError(response['error']['message'])
+        return response['result']
+
+def _privateDirectory(path):
+    """make sure path is a directory only this user can get into"""
+    try:
+        os.mkdir(path, 0700)
+    except OSError as e:
+        if e.errno != errno.EEXIST:
+            raise cli.TTNameCLIError('Unable to make socket directory "{0}": {1}'.format(
+                                     path, e.strerror))
+    
+    st = os.lstat(path)
+    if not stat.S_ISDIR(st.st_mode) or st.st_uid != os.getuid() or \
+                st.st_mode & (stat.S_IRWXG | stat.S_IRWXO):
+        raise cli.TTNameCLIError('Socket directory "{0}" is not a private directory '
+                                 'of this user'.format(path))
+
+def serve(path=None, maxTables=64):
+    """run a TTNameServer on a socket until it's shut down or terminated"""
+    if path is None:
+        path = cli.defaultSocket()
+        _privateDirectory(os.path.dirname(path))
+    
+    if os.path.exists(path):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(path)
+        except socket.error:
+            #a leftover from a daemon that didn't clean up
+            os.unlink(path)
+        else:
+            raise cli.TTNameCLIError('A daemon is already running on "{0}"'.format(path))
+        finally:
+            sock.close()
+    
+    server = TTNameServer(path, maxTables)
+    
+    try:
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    except ValueError:
+        #not the main thread
+        pass
+    
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        os.unlink(path)
@@ -0,0 +1,463 @@
+"""
+Low-level access to the sfnt container wrapping TrueType and OpenType fonts
+"""
+
+# This file is part of ttname.
+#
+# Copyright 2013 T.C. Hollingsworth <tchollingsworth@gmail.com>
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met: 
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer. 
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution. 
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+from fontTools.ttLib import TTLibError
+import collections
+import mmap
+import os
+import stat
+import struct
+
+import checksum
+import codec
+
+_offsetTable = struct.Struct('>4sHHHH')
+_dirEntry = struct.Struct('>4sLLL')
+_ulong = struct.Struct('>L')
+_ttcHeader = struct.Struct('>4sHHL')
+_dsigHeader = struct.Struct('>4sLL')
+
+# the magic number that the checksum of an entire font is supposed to add up to
+_checksumMagic = 0xB1B0AFBA
+
+# where head.checkSumAdjustment lives
+_adjustmentOffset = 8
+
+# how much of a table to hold in memory at once when copying it
+CHUNK_SIZE = 1024 * 1024
+
+# subclassing TTLibError means code expecting fontTools exceptions still works
+class SFNTError(TTLibError):
+    pass
+
+TableEntry = collections.namedtuple('TableEntry', ['tag', 'checksum', 'offset', 'length'])
+
+# where it's always been
+calcChecksum = checksum.calcChecksum
+
+def _setAdjustment(head, adjustment):
+    """head table data with a different checkSumAdjustment"""
+    return head[:_adjustmentOffset] + _ulong.pack(adjustment) + head[_adjustmentOffset + 4:]
+
+def _dropUnchanged(reader, tables):
+    """
+    Leave out the tables in a mapping for write that are the same as in the
+    source, so they get copied, checksum and all, instead of being written
+    out and summed again.
+    """
+    for tag in list(tables):
+        if tag != 'head' and tag in reader and reader[tag] == tables[tag]:
+            del tables[tag]
+
+def _pad(length):
+    return (4 - length % 4) % 4
+
+def _fileno(f):
+    #spooled files would have to be rolled over to disk to get one
+    if getattr(f, '_rolled', True) is False:
+        return None
+    try:
+        return f.fileno()
+    except (AttributeError, IOError, ValueError):
+        return None
+
+def _copyRange(infd, outfd, inOffset, outOffset, count):
+    """
+    Copy bytes between two files inside the kernel, with copy_file_range or
+    sendfile where the os module has them.  Returns how many bytes were
+    copied, which is 0 if neither is available or the files aren't suitable.
+    """
+    copy_file_range = getattr(os, 'copy_file_range', None)
+    sendfile = getattr(os, 'sendfile', None)
+    done = 0
+    
+    if copy_file_range is None and sendfile is None:
+        return done
+    
+    try:
+        if copy_file_range is not None:
+            while done < count:
+                n = copy_file_range(infd, outfd, count - done, inOffset + done,
+                                    outOffset + done)
+                if not n:
+                    break
+                done += n
+        else:
+            os.lseek(outfd, outOffset, os.SEEK_SET)
+            while done < count:
+                n = sendfile(outfd, infd, inOffset + done, count - done)
+                if not n:
+                    break
+                done += n
+    except OSError:
+        #cross-device, unsupported filesystem and so on; the rest gets copied
+        #the slow way
+        pass
+    
+    return done
+
+def _searchParams(numTables):
+    entrySelector = 0
+    while 2 ** (entrySelector + 1) <= numTables:
+        entrySelector += 1
+    searchRange = 2 ** entrySelector * 16
+    return searchRange, entrySelector, numTables * 16 - searchRange
+
+class SFNTReader(object):
+    """
+    Reads the table directory of a font, and the raw data of its tables.  The
+    directory is read from where the file is, unless an offset is given.
+    """
+    def __init__(self, file, offset=None):
+        self.file = file
+        self.bytesRead = 0
+        
+        if offset is not None:
+            file.seek(offset)
+        self.offset = file.tell()
+        data = file.read(_offsetTable.size)
+        if len(data) < _offsetTable.size:
+            raise SFNTError('Not a TrueType or OpenType font (not enough data)')
+        
+        self.sfntVersion, numTables = _offsetTable.unpack(data)[:2]
+        if self.sfntVersion not in ('\0\1\0\0', 'OTTO', 'true'):
+            raise SFNTError('Not a TrueType or OpenType font (bad sfntVersion)')
+        
+        data = file.read(numTables * _dirEntry.size)
+        if len(data) < numTables * _dirEntry.size:
+            raise SFNTError('Not a TrueType or OpenType font (not enough data)')
+        self.bytesRead += _offsetTable.size + len(data)
+        
+        self.tables = collections.OrderedDict()
+        for i in xrange(numTables):
+            entry = TableEntry._make(_dirEntry.unpack_from(data, i * _dirEntry.size))
+            self.tables[entry.tag] = entry
+    
+    def __contains__(self, tag):
+        return tag in self.tables
+    
+    def __getitem__(self, tag):
+        """fetch the raw table data"""
+        entry = self.tables[tag]
+        self.file.seek(entry.offset)
+        data = self.file.read(entry.length)
+        if len(data) < entry.length:
+            raise SFNTError("'{0}' table is truncated".format(tag))
+        self.bytesRead += len(data)
+        return data
+    
+    def view(self, tag):
+        """
+        Fetch the raw table data without copying it, if the font was read from
+        a memory-mapped file.
+        """
+        if not isinstance(self.file, mmap.mmap):
+            return self[tag]
+        
+        entry = self.tables[tag]
+        if entry.offset + entry.length > len(self.file):
+            raise SFNTError("'{0}' table is truncated".format(tag))
+        self.bytesRead += entry.length
+        return codec.view(self.file, entry.offset, entry.length)
+    
+    def copy(self, tag, outfile):
+        """
+        Copy the raw table data straight to another file.  Between two real
+        files it never passes through Python where the OS can help, and
+        otherwise it goes a chunk at a time, so big tables are never held in
+        memory whole.
+        """
+        self.copyEntry(self.tables[tag], outfile)
+    
+    def copyEntry(self, entry, outfile):
+        """copy the data a TableEntry points to in this file"""
+        tag = entry.tag
+        done = 0
+        
+        infd = _fileno(self.file)
+        outfd = _fileno(outfile)
+        #pipes can't say where they're up to
+        if infd is not None and outfd is not None and \
+                    stat.S_ISREG(os.fstat(outfd).st_mode):
+            outfile.flush()
+            start = outfile.tell()
+            done = _copyRange(infd, outfd, entry.offset, start, entry.length)
+            outfile.seek(start + done)
+        
+        self.file.seek(entry.offset + done)
+        while done < entry.length:
+            data = self.file.read(min(entry.length - done, CHUNK_SIZE))
+            if not data:
+                raise SFNTError("'{0}' table is truncated".format(tag))
+            outfile.write(data)
+            done += len(data)
+        
+        self.bytesRead += entry.length
+    
+    def checksum(self, tag):
+        """sum up a table's data a chunk at a time"""
+        entry = self.tables[tag]
+        total = done = 0
+        
+        self.file.seek(entry.offset)
+        while done < entry.length:
+            data = self.file.read(min(entry.length - done, CHUNK_SIZE))
+            if not data:
+                raise SFNTError("'{0}' table is truncated".format(tag))
+            total += calcChecksum(data)
+            done += len(data)
+        
+        self.bytesRead += entry.length
+        return total & 0xFFFFFFFF
+    
+    def verify(self, adjustment=True):
+        """
+        Check every table's checksum, and head.checkSumAdjustment too unless
+        adjustment is false, returning a checksum.Mismatch for each one that's
+        wrong.
+        """
+        mismatches = []
+        total = 0
+        
+        for tag, entry in self.tables.iteritems():
+            if tag == 'head':
+                head = self['head']
+                actual = calcChecksum(_setAdjustment(head, 0))
+            else:
+                actual = self.checksum(tag)
+            if actual != entry.checksum:
+                mismatches.append(checksum.Mismatch(tag, entry.checksum, actual))
+            total += actual
+        
+        if adjustment and 'head' in self and len(head) >= _adjustmentOffset + 4:
+            self.file.seek(self.offset)
+            header = self.file.read(_offsetTable.size + len(self.tables) * _dirEntry.size)
+            stored = _ulong.unpack_from(head, _adjustmentOffset)[0]
+            actual = (_checksumMagic - calcChecksum(header) - total) & 0xFFFFFFFF
+            if actual != stored:
+                mismatches.append(checksum.Mismatch('checkSumAdjustment', stored, actual))
+        
+        return mismatches
+    
+    def rebuild(self, outfile, tables):
+        """write the font to outfile like write does, in whatever format it's in"""
+        return write(self, outfile, tables)
+
+def write(reader, outfile, tables):
+    """
+    Write the font read by reader to outfile, replacing the raw data of the
+    tables in the tables mapping.
+    
+    Every other table is copied byte-for-byte from the source, in the same
+    order, and only the table directory and head.checkSumAdjustment are
+    recomputed.  Replacement tables that turn out the same as the source are
+    copied the same way, and their checksums aren't recomputed.  Tables that
+    aren't in the source at all are added at the end.  Returns the number of
+    bytes written.
+    """
+    tables = dict(tables)
+    _dropUnchanged(reader, tables)
+    if 'head' in reader and 'head' not in tables:
+        tables['head'] = reader['head']
+    if 'head' in tables:
+        tables['head'] = _setAdjustment(tables['head'], 0)
+    
+    #lay the tables out in the same order they're in the source
+    entries = sorted(reader.tables.itervalues(), key=lambda e: e.offset)
+    entries.extend(TableEntry(tag, 0, 0, 0) for tag in sorted(tables)
+                                            if tag not in reader)
+    pos = _offsetTable.size + len(entries) * _dirEntry.size
+    directory = {}
+    
+    for entry in entries:
+        if entry.tag in tables:
+            data = tables[entry.tag]
+            entry = TableEntry(entry.tag, calcChecksum(data), pos, len(data))
+        else:
+            entry = entry._replace(offset=pos)
+        directory[entry.tag] = entry
+        pos += entry.length + _pad(entry.length)
+    
+    header = [_offsetTable.pack(reader.sfntVersion, len(entries),
+                                *_searchParams(len(entries)))]
+    for tag in sorted(directory):
+        header.append(_dirEntry.pack(*directory[tag]))
+    header = ''.join(header)
+    
+    if 'head' in tables:
+        total = calcChecksum(header)
+        for entry in directory.itervalues():
+            total += entry.checksum
+        tables['head'] = _setAdjustment(tables['head'],
+                                        (_checksumMagic - total) & 0xFFFFFFFF)
+    
+    outfile.write(header)
+    for entry in entries:
+        if entry.tag in tables:
+            outfile.write(tables[entry.tag])
+        else:
+            reader.copy(entry.tag, outfile)
+        outfile.write('\0' * _pad(directory[entry.tag].length))
+    
+    return pos
+
+class TTCReader(object):
+    "Reads the header of a font collection, and the directory of each font in it"
+    def __init__(self, file):
+        self.file = file
+        
+        file.seek(0)
+        data = file.read(_ttcHeader.size)
+        if len(data) < _ttcHeader.size:
+            raise SFNTError('Not a font collection (not enough data)')
+        
+        tag, self.majorVersion, self.minorVersion, numFonts = _ttcHeader.unpack(data)
+        if tag != 'ttcf':
+            raise SFNTError('Not a font collection (bad TTCTag)')
+        
+        data = file.read(numFonts * _ulong.size)
+        if len(data) < numFonts * _ulong.size:
+            raise SFNTError('Not a font collection (not enough data)')
+        self._headerRead = _ttcHeader.size + len(data)
+        
+        offsets = struct.unpack('>{0}L'.format(numFonts), data)
+        self.fonts = [SFNTReader(file, offset) for offset in offsets]
+    
+    @property
+    def bytesRead(self):
+        return self._headerRead + sum(f.bytesRead for f in self.fonts)
+
+def _signature(file):
+    file.seek(0)
+    tag = file.read(4)
+    file.seek(0)
+    return tag
+
+def isCollection(file):
+    """whether a seekable file holds a font collection"""
+    return _signature(file) == 'ttcf'
+
+def openFont(file, font=None):
+    """
+    Returns a SFNTReader for a font file, or for one of the fonts in a
+    collection: the one numbered font, or the first.  WOFF and WOFF2 fonts
+    get one of the readers from the woff module instead.
+    """
+    signature = _signature(file)
+    if signature != 'ttcf':
+        if font:
+            raise SFNTError('Not a font collection, so there is no font {0}'.format(font))
+        if signature == 'wOFF':
+            #woff builds on this module, so it can't be imported up top
+            import woff
+            return woff.WOFFReader(file)
+        if signature == 'wOF2':
+            import woff
+            return woff.WOFF2Reader(file)
+        return SFNTReader(file)
+    
+    fonts = TTCReader(file).fonts
+    if not 0 <= (font or 0) < len(fonts):
+        raise SFNTError('Font collection has no font {0}, only {1}'.format(font, len(fonts)))
+    return fonts[font or 0]
+
+def writeCollection(collection, outfile, tables):
+    """
+    Write the collection read by a TTCReader to outfile, with tables being a
+    list of mappings for each font like write takes.
+    
+    Tables shared between fonts stay shared, and so do new tables with the
+    same data, and unchanged tables are copied byte-for-byte in their
+    original order, followed by the new ones.  head.checkSumAdjustment is left
+    alone, since a shared head can't be right for every font, and the DSIG
+    of a version 2 collection is dropped, since it can't match any more.
+    Returns the number of bytes written.
+    """
+    fonts = collection.fonts
+    tags = [sorted(set(reader.tables) | set(new)) for reader, new in zip(fonts, tables)]
+    
+    pos = _ttcHeader.size + len(fonts) * _ulong.size
+    if collection.majorVersion >= 2:
+        pos += _dsigHeader.size
+    
+    fontOffsets = []
+    for fontTags in tags:
+        fontOffsets.append(pos)
+        pos += _offsetTable.size + len(fontTags) * _dirEntry.size
+    
+    #where each unique table ends up, keyed by its source or its new data
+    placed = {}
+    layout = []
+    
+    unchanged = {}
+    for reader, new in zip(fonts, tables):
+        for entry in reader.tables.itervalues():
+            if entry.tag not in new:
+                unchanged.setdefault(('copy', entry.offset, entry.length), entry)
+    
+    sources = sorted(unchanged.iteritems(), key=lambda item: item[1].offset)
+    for new in tables:
+        sources.extend((('new', new[tag]), new[tag]) for tag in sorted(new))
+    
+    for key, source in sources:
+        if key in placed:
+            continue
+        if isinstance(source, TableEntry):
+            checksum, length = source.checksum, source.length
+        else:
+            checksum, length = calcChecksum(source), len(source)
+        placed[key] = (checksum, pos, length)
+        layout.append((source, length))
+        pos += length + _pad(length)
+    
+    header = [_ttcHeader.pack('ttcf', collection.majorVersion, collection.minorVersion,
+                              len(fonts))]
+    header.extend(_ulong.pack(offset) for offset in fontOffsets)
+    if collection.majorVersion >= 2:
+        header.append(_dsigHeader.pack('\0\0\0\0', 0, 0))
+    
+    for reader, new, fontTags in zip(fonts, tables, tags):
+        header.append(_offsetTable.pack(reader.sfntVersion, len(fontTags),
+                                        *_searchParams(len(fontTags))))
+        for tag in fontTags:
+            if tag in new:
+                key = ('new', new[tag])
+            else:
+                entry = reader.tables[tag]
+                key = ('copy', entry.offset, entry.length)
+            header.append(_dirEntry.pack(tag, *placed[key]))
+    
+    outfile.write(''.join(header))
+    for source, length in layout:
+        if isinstance(source, TableEntry):
+            fonts[0].copyEntry(source, outfile)
+        else:
+            outfile.write(source)
+        outfile.write('\0' * _pad(length))
+    
+    return pos
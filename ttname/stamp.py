@@ -0,0 +1,145 @@
+"""
+Stamps of the fonts a batch run built, for skipping them when nothing changed
+"""
+
+# This file is part of ttname.
+#
+# Copyright 2013 T.C. Hollingsworth <tchollingsworth@gmail.com>
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met: 
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer. 
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution. 
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import collections
+import hashlib
+import json
+import os
+import tempfile
+
+#bumped whenever the same edits would give a different font, so everything
+#gets rebuilt
+STAMP_VERSION = 1
+
+Stamp = collections.namedtuple('Stamp', ['edits', 'input', 'output', 'size', 'mtime'])
+
+# why a font needs building again
+NOT_BUILT = 'not built before'
+EDITS_CHANGED = 'edits changed'
+FONT_CHANGED = 'font changed since it was built'
+
+class TTNameStampError(Exception):
+    pass
+
+def digest(path):
+    """a SHA-256 of a file's contents"""
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), ''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+def editsDigest(edits):
+    """a SHA-256 of a font's batch.Edits, in order, minus the path"""
+    canonical = [[e.platform, e.encoding, e.lang, e.nameID, e.value] for e in edits]
+    return hashlib.sha256(json.dumps(canonical)).hexdigest()
+
+class StampFile(object):
+    """
+    A record of the fonts a batch run built, so later runs can skip the ones
+    that would come out the same.
+    
+    It's a JSON file holding each font's stamp: the digest of its edits, of
+    the font before and after they were made, and the size and modification
+    time of the result.  Font paths are relative to the stamp file.  A font is
+    up to date while its edits are the same and it's still the font that was
+    built; the size and modification time save hashing it when they match.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.base = os.path.dirname(os.path.abspath(path))
+        self.stamps = {}
+        
+        try:
+            with open(path, 'rb') as f:
+                data = json.load(f)
+        except IOError:
+            #nothing's been built yet
+            return
+        except ValueError as e:
+            raise TTNameStampError('Invalid stamp file "{0}": {1}'.format(path, e))
+        
+        if not isinstance(data, dict) or not isinstance(data.get('fonts'), dict):
+            raise TTNameStampError('Invalid stamp file "{0}"'.format(path))
+        
+        #stamps from another version of ttname don't count
+        if data.get('version') != STAMP_VERSION:
+            return
+        
+        for name, stamp in data['fonts'].iteritems():
+            try:
+                self.stamps[name] = Stamp(**stamp)
+            except TypeError:
+                raise TTNameStampError('Invalid stamp for "{0}" in "{1}"'.format(name,
+                                                                               path))
+    
+    def _name(self, path):
+        return os.path.relpath(os.path.abspath(path), self.base)
+    
+    def check(self, path, edits):
+        """returns why the font at path needs building with edits, or None if it doesn't"""
+        stamp = self.stamps.get(self._name(path))
+        if stamp is None:
+            return NOT_BUILT
+        if stamp.edits != editsDigest(edits):
+            return EDITS_CHANGED
+        
+        try:
+            st = os.stat(path)
+            if (st.st_size, st.st_mtime) != (stamp.size, stamp.mtime) and \
+                        digest(path) != stamp.output:
+                return FONT_CHANGED
+        except (IOError, OSError):
+            return FONT_CHANGED
+        
+        return None
+    
+    def record(self, path, edits, inputDigest):
+        """stamp the font at path as built with edits, from a font with inputDigest"""
+        st = os.stat(path)
+        self.stamps[self._name(path)] = Stamp(editsDigest(edits), inputDigest, digest(path),
+                                              st.st_size, st.st_mtime)
+    
+    def save(self):
+        """write the stamps out, replacing the old file in one go"""
+        data = {
+            'version': STAMP_VERSION,
+            'fonts': dict((name, stamp._asdict()) for name, stamp in self.stamps.iteritems()),
+        }
+        
+        f = tempfile.NamedTemporaryFile(dir=self.base, prefix=os.path.basename(self.path),
+                                        suffix='.ttname-tmp', delete=False)
+        try:
+            json.dump(data, f, indent=2, sort_keys=True)
+            f.write('\n')
+            f.close()
+            os.rename(f.name, self.path)
+        except:
+            f.close()
+            os.unlink(f.name)
+            raise
@@ -4,9 +4,10 @@ objects representing the font metadata "name" table and its Records
 
 # Once upon a time, this file used the TTFont API to all the editing.  And it
 # works great for reading, but when you call save() all you get is garbage out.
-# Rather than try and figure out what the hell is wrong with that, we just do
-# the XML serialization dance, since that code path seems to have been well used
-# for at least a decade.
+# So then we did the XML serialization dance, since that code path seems to
+# have been well used for at least a decade.  But that costs far more than the
+# edit itself, so now we just decode and encode the binary table ourselves and
+# only fall back to the XML dance for tables we can't make sense of.
 
 # This file is part of ttname.
 #
@@ -34,9 +35,11 @@ objects representing the font metadata "name" table and its Records
 
 from StringIO import StringIO
 from fontTools.ttLib import TTFont
-import fontTools.ttLib.xmlImport
 import collections
+import functools
+import mmap
 import tempfile
+import threading
 import sys
 import os
 
@@ -46,17 +49,10 @@ try:
 except ImportError: #pragma: no cover
     import xml.etree.ElementTree as etree
 
-# EVIL MONKEYPATCH HACKS
-
-# everything in TTFont takes a file object but the XML reader.  fml.
-def _parse(self):
-    if hasattr(self.fileName, 'read'):
-        self.parseFile(self.fileName)
-    #this never gets used, it's just to be exceedingly correct
-    else:   #pragma: no cover
-        self.parseFile(open(fileName))
-
-fontTools.ttLib.xmlImport.ExpatParser.parse = _parse
+import codec
+import sfnt
+import timing
+import woff
 
 class StrungIO(StringIO):
     "A special StringIO that ignores ttx's foolish close operations"
@@ -66,123 +62,529 @@ class StrungIO(StringIO):
     def free(self):
         StringIO.close(self)
 
-# and now the normal stuff...
+class _QuietProgress(object):
+    "Keeps saveXML from printing what it's up to, without touching sys.stdout"
+    def set(self, *args):
+        pass
+    
+    def setLabel(self, label):
+        pass
+
+# TTFont still prints its warnings (like the name table's bad stringOffset,
+# which is just what sends a font its way) straight to sys.stdout, so the
+# rare trip through it has to muzzle stdout, one thread at a time, or they'd
+# end up in the middle of a font being written to stdout
+_fallbackLock = threading.Lock()
+
+def _locked(method):
+    """run a TTNameTable method while holding the table's lock"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
+#fonts piped in are kept in memory up to this size, and on disk beyond it
+_SPOOL_SIZE = 16 * 1024 * 1024
+
+# what bounded tables can use besides their name table, see memoryCeiling
+_BOUNDED_OVERHEAD = 4 * 1024 * 1024
+_NAME_FACTOR = 8
+
+def memoryCeiling(nameSize, piped=False):
+    """
+    The most memory, in bytes, that opening, editing and saving a font with a
+    bounded TTNameTable adds to the process, for a name table of nameSize
+    bytes.  It doesn't depend on the size of the font at all, but a font
+    piped in can take up to another 16MB before it's spooled to disk.
+    """
+    ceiling = _BOUNDED_OVERHEAD + sfnt.CHUNK_SIZE + _NAME_FACTOR * nameSize
+    if piped:
+        ceiling += _SPOOL_SIZE
+    return ceiling
+
+def _seekable(f):
+    try:
+        f.seek(0, os.SEEK_CUR)
+        return True
+    except (AttributeError, EnvironmentError):
+        return False
+
+def _spool(f):
+    """copy a stream into a temporary file a chunk at a time"""
+    spooled = tempfile.SpooledTemporaryFile(max_size=_SPOOL_SIZE)
+    for chunk in iter(lambda: f.read(sfnt.CHUNK_SIZE), ''):
+        spooled.write(chunk)
+    spooled.seek(0)
+    return spooled
+
+def _map(infile):
+    """memory-map a font file, or return None if that's not possible"""
+    #the mapping outlives the file, and it's only unmapped once the last
+    #record pointing into it is gone, so never close it ourselves
+    if isinstance(infile, tempfile.SpooledTemporaryFile):
+        return None
+    try:
+        return mmap.mmap(infile.fileno(), 0, access=mmap.ACCESS_READ)
+    except (AttributeError, ValueError, EnvironmentError):
+        #StringIO, empty files, pipes and the like
+        return None
+
+class TTNameTableError(Exception):
+    pass
 
 SectionData = collections.namedtuple('SectionData', ['platformID', 'platEncID', 'langID'])
 
 class TTNameRecord(object):
     "An object representing a name record that mimics those returned by TTFont"
     #...so I don't have to rewrite cli.py  ;-)
-    def __init__(self, *args):
-        if len(args) == 1:
-            self._elem = args[0]
-        elif len(args) == 5:
-            parent, nameID, platformID, platEncID, langID = args
-            self._elem = elem = etree.SubElement(parent, 'namerecord')
-    
-            self.nameID = nameID
-            self.platformID = platformID
-            self.platEncID = platEncID
-            self.langID = langID
-        else:
-            raise TypeError('either 1 or 5 arguments expected')
-        
-    def __getattr__(self, name):
-        if name == 'langID':
-            return int(self._elem.get(name), 16)
-        elif name in self._elem.keys():
-            return int(self._elem.get(name))
-        elif name == 'string':
-            return self._elem.text.strip()
-        else:
-            raise AttributeError
-    
-    def __setattr__(self, name, value):
-        if name == '_elem': #chicken, meet egg
-            object.__setattr__(self, name, value)
-        elif name == 'langID':
-            self._elem.set(name, hex(value))
-        elif name in ['nameID', 'platformID', 'platEncID']:
-            self._elem.set(name, str(value))
-        elif name == 'string':
-            self._elem.text = value
-        else:
-            object.__setattr__(self, name, value)
+    
+    # there can be thousands of these, so keep them small
+    __slots__ = ('nameID', 'platformID', 'platEncID', 'langID', 'data', '_string')
+    
+    def __init__(self, nameID, platformID, platEncID, langID, data=''):
+        self.nameID = nameID
+        self.platformID = platformID
+        self.platEncID = platEncID
+        self.langID = langID
+        self.data = data
+        self._string = None
+    
+    @property
+    def string(self):
+        #don't bother decoding strings nobody looks at
+        if self._string is None:
+            self._string = codec.decodeString(self.data, self.platformID, self.platEncID)
+        return self._string
+    
+    @string.setter
+    def string(self, value):
+        if isinstance(value, str):
+            value = value.decode('utf-8')
+        self.data = codec.encodeString(value, self.platformID, self.platEncID)
+        self._string = value
 
 class TTNameTable(object):
-    'The "name" table of an OpenType font, containing metadata regarding the font'
-    def __init__(self, fileish):
+    """
+    The "name" table of an OpenType font, containing metadata regarding the font
+    
+    Each table has its own lock, so they can be used from as many threads as
+    you like.  The one piece of global state they touch is sys.stdout: when a
+    name table is too broken for the decoder and has to go through TTFont
+    instead, TTFont prints its warnings with print, so sys.stdout is pointed
+    at /dev/null while it runs, and anything other threads print meanwhile is
+    lost.
+    
+    A readonly table memory-maps the font where it can and only ever looks at
+    the table directory and the name table, and its records point straight
+    into the mapping until their strings are decoded.  It can't be edited or
+    saved.
+    
+    If a timing.PhaseTimer is given, opening and saving the table is recorded
+    in it phase by phase.
+    
+    If a cache.NameCache is given, a font loaded from a path is answered from
+    it when the font hasn't changed since it was cached, without being opened
+    at all, and is cached otherwise.
+    
+    modified is set once the table's own methods actually change something,
+    so setting a name to the value it already has leaves it alone.  Records
+    changed directly through their string aren't noticed.
+    
+    In a font collection, font picks which font's name table to use, the
+    first one by default.  Saving writes the whole collection back.
+    
+    A bounded table never needs more memory than memoryCeiling says, however
+    big the font is.  That rules out falling back on TTFont for name tables
+    the decoder can't handle, and WOFF2 fonts, whose tables can only be
+    decompressed all at once, so those raise sfnt.SFNTError instead.
+    
+    reader is an sfnt reader for the font that's already been opened, so a
+    collection's header doesn't get read again for each of its fonts.  Its
+    file has to stay open until the table has been loaded.
+    """
+    def __init__(self, fileish, readonly=False, timer=None, cache=None, font=None,
+                 bounded=False, reader=None):
+        #fonts from pipes get spooled so they can be read twice
+        if hasattr(fileish, 'read') and not _seekable(fileish):
+            fileish = _spool(fileish)
+        
         self._infile = fileish
-        self._xml = StrungIO()
+        self._langTags = []
+        self._lock = threading.RLock()
+        self._timer = timing.NULL_TIMER if timer is None else timer
+        self.readonly = readonly
+        self.modified = False
+        self.font = font
+        self.bounded = bounded
+        
+        if cache is None or hasattr(fileish, 'read') or reader is not None:
+            self._load(reader)
+        else:
+            with self._timer.phase('cache'):
+                key = cache.key(fileish)
+                if key is not None and font:
+                    key = key._replace(path='{0}#{1}'.format(key.path, font))
+                cached = cache.get(key)
+            
+            if cached is not None:
+                records, self._langTags = cached
+                self._records = [TTNameRecord(nameID, platformID, platEncID, langID, data)
+                        for platformID, platEncID, langID, nameID, data in records]
+            else:
+                self._load()
+                with self._timer.phase('cache'):
+                    cache.put(key, [(n.platformID, n.platEncID, n.langID, n.nameID, n.data)
+                                    for n in self._records], self._langTags)
+        
+        self._reindex()
     
-        #grrrrrrrr
-        stdout = sys.stdout
-        sys.stdout = open(os.devnull, 'w')
-        tt = TTFont(fileish)
-        tt.saveXML(self._xml, tables=['name'], progress=False)
-        sys.stdout = stdout
+    def _load(self, reader=None):
+        """read the records from the font itself, or from reader"""
+        fileish = self._infile
+        infile = self._open() if reader is None else None
+        try:
+            with self._timer.phase('open') as p:
+                if reader is None:
+                    mapping = _map(infile) if self.readonly else None
+                    reader = sfnt.openFont(infile if mapping is None else mapping, self.font)
+                p.bytesRead += reader.bytesRead
+                if self.bounded and isinstance(reader, woff.WOFF2Reader):
+                    raise sfnt.SFNTError("WOFF2 fonts can't be read with bounded "
+                                         'memory')
+            
+            if 'name' not in reader:
+                self._records = []
+            else:
+                try:
+                    with self._timer.phase('decode') as p:
+                        data = reader.view('name')
+                        p.bytesRead += len(data)
+                        format, records, self._langTags = codec.decompile(data)
+                        self._records = [TTNameRecord(nameID, platformID, platEncID, langID, data)
+                                for platformID, platEncID, langID, nameID, data in records]
+                except codec.NameTableError as e:
+                    if self.bounded:
+                        raise sfnt.SFNTError('Unable to decode the name table with '
+                                             'bounded memory: {0}'.format(e))
+                    with self._timer.phase('xml-fallback'):
+                        self._records = self._loadXML()
+        finally:
+            if infile is not None and infile is not fileish:
+                infile.close()
+    
+    def _reindex(self):
+        """rebuild the lookup tables for names from scratch"""
+        self._index = {}
+        self._byName = collections.defaultdict(list)
+        self._bySection = collections.OrderedDict()
+        
+        for n in self._records:
+            self._addIndex(n)
+    
+    def _addIndex(self, n):
+        key = (n.nameID, n.platformID, n.platEncID, n.langID)
+        
+        #if a font has duplicate records, the first one wins like it always has
+        self._index.setdefault(key, n)
+        self._byName[n.nameID].append(n)
+        self._bySection.setdefault(SectionData(n.platformID, n.platEncID, n.langID),
+                                   []).append(n)
+    
+    def _delIndex(self, n):
+        key = (n.nameID, n.platformID, n.platEncID, n.langID)
+        sd = SectionData(n.platformID, n.platEncID, n.langID)
         
-        self._xml.seek(0)
-        self._tree = etree.parse(self._xml)
-        self._name = self._tree.getroot().find('name')
+        self._byName[n.nameID].remove(n)
+        if not self._byName[n.nameID]:
+            del self._byName[n.nameID]
+        
+        self._bySection[sd].remove(n)
+        if not self._bySection[sd]:
+            del self._bySection[sd]
+        
+        if self._index[key] is n:
+            del self._index[key]
+            for other in self._byName.get(n.nameID, ()):
+                if (other.platformID, other.platEncID, other.langID) == key[1:]:
+                    self._index[key] = other
+                    break
+    
+    def _open(self):
+        """returns a file object for the original font"""
+        if hasattr(self._infile, 'read'):
+            return self._infile
+        else:
+            return open(self._infile, 'rb')
+    
+    def _setString(self, n, value):
+        #only count it as a change if the encoded bytes differ
+        old = n.data
+        n.string = value
+        if len(old) != len(n.data) or codec.toBytes(old) != codec.toBytes(n.data):
+            self.modified = True
     
-    def __del__(self):
-        self._xml.free()
+    def _checkWritable(self):
+        if self.readonly:
+            raise TTNameTableError('name table was opened read-only')
+    
+    def _loadXML(self):
+        """fall back on TTFont's more forgiving decoder via TTX"""
+        xml = StrungIO()
+        
+        if hasattr(self._infile, 'seek'):
+            self._infile.seek(0)
+        
+        #grrrrrrrr
+        with _fallbackLock:
+            stdout = sys.stdout
+            sys.stdout = open(os.devnull, 'w')
+            try:
+                tt = TTFont(self._infile)
+                tt.saveXML(xml, tables=['name'], progress=_QuietProgress())
+            finally:
+                sys.stdout.close()
+                sys.stdout = stdout
+        
+        xml.seek(0)
+        
+        records = []
+        for elem in etree.parse(xml).getroot().find('name'):
+            rec = TTNameRecord(int(elem.get('nameID')), int(elem.get('platformID')),
+                               int(elem.get('platEncID')), int(elem.get('langID'), 16))
+            rec.string = (elem.text or u'').strip()
+            records.append(rec)
+        
+        xml.free()
+        return records
     
     # yet more compat fun
     @property
     def names(self):
-        for elem in self._name:
-            yield TTNameRecord(elem)
+        with self._lock:
+            names = list(self._records)
+        
+        for n in names:
+            yield n
+    
+    @_locked
+    def compile(self, suffixes=False):
+        """
+        returns the binary name table, storing a string that ends a longer one
+        inside it when suffixes is true (see codec.compile)
+        """
+        return codec.compile([(n.platformID, n.platEncID, n.langID, n.nameID, n.data)
+                                for n in self._records], self._langTags, suffixes)
+    
+    @_locked
+    def save(self, fileish, suffixes=False):
+        """
+        Write the font with the new name table to fileish.
+        
+        Only the name table, the table directory and head.checkSumAdjustment
+        are rewritten; every other table is copied as-is from the original file.
+        WOFF and WOFF2 fonts are saved as WOFF and WOFF2 again, see the woff
+        module for what gets compressed again.
+        """
+        self._checkWritable()
+        self._save(fileish, lambda: {self.font or 0: self.compile(suffixes)})
     
-    def save(self, fileish):
-        new_xml = StrungIO()
-        self._tree.write(new_xml)
-        new_xml.seek(0)
+    def _save(self, fileish, compile):
+        """
+        Write the original font or collection to fileish, with the name tables
+        from compile(), a mapping of font numbers to table data.
+        """
+        #writing over the file we're reading from needs a detour
+        if not hasattr(fileish, 'write') and not hasattr(self._infile, 'read') \
+                    and os.path.realpath(fileish) == os.path.realpath(self._infile):
+            outfile = tempfile.NamedTemporaryFile(dir=os.path.dirname(os.path.abspath(fileish)),
+                        prefix=os.path.basename(fileish), suffix='.ttname-tmp', delete=False)
+            try:
+                self._save(outfile, compile)
+                outfile.close()
+                with self._timer.phase('replace'):
+                    os.rename(outfile.name, fileish)
+            except:
+                outfile.close()
+                os.unlink(outfile.name)
+                raise
+            return
         
-        stdout = sys.stdout
-        sys.stdout = open(os.devnull, 'w')
-        self._font = TTFont(self._infile)
-        self._font.importXML(new_xml, progress=False)
-        self._font.save(fileish)
-        sys.stdout = stdout
+        with self._timer.phase('compile'):
+            names = compile()
         
-        new_xml.free()
+        infile = self._open()
+        outfile = fileish if hasattr(fileish, 'write') else open(fileish, 'wb')
+        
+        try:
+            with self._timer.phase('write') as p:
+                if sfnt.isCollection(infile):
+                    reader = sfnt.TTCReader(infile)
+                    tables = [{'name': names[i]} if i in names else {}
+                              for i in xrange(len(reader.fonts))]
+                    p.bytesWritten += sfnt.writeCollection(reader, outfile, tables)
+                else:
+                    reader = sfnt.openFont(infile)
+                    tables = {'name': names[0]} if 0 in names else {}
+                    p.bytesWritten += reader.rebuild(outfile, tables)
+                p.bytesRead += reader.bytesRead
+        finally:
+            if infile is not self._infile:
+                infile.close()
+            if outfile is not fileish:
+                outfile.close()
     
     # I hate camelcased function names, but that's what TTFont uses :-(
+    @_locked
     def getName(self, nameID, platformID, platEncID, langID, write=False):
-        for n in self.names:
-            if n.nameID == nameID and n.platformID == platformID and \
-                        n.platEncID == platEncID and n.langID == langID:
-                return n
-        
-        if write:
-            new = TTNameRecord(self._name, nameID, platformID, platEncID, langID)
-            return new
-        else:
-            return None
+        n = self._index.get((nameID, platformID, platEncID, langID))
+        
+        if n is None and write:
+            self._checkWritable()
+            n = TTNameRecord(nameID, platformID, platEncID, langID)
+            self._records.append(n)
+            self._addIndex(n)
+            self.modified = True
+        
+        return n
+    
+    @_locked
+    def delName(self, nameID, platformID, platEncID, langID):
+        """removes a name record, returning it or None if it didn't exist"""
+        self._checkWritable()
+        n = self._index.get((nameID, platformID, platEncID, langID))
+        
+        if n is not None:
+            self._records.remove(n)
+            self._delIndex(n)
+            self.modified = True
+        
+        return n
+        
+    @_locked
+    def setNames(self, newnames, platformID, platEncID, langID, all=False):
+        """
+        Update several names at once from a mapping of name IDs to strings.
+        
+        Names that don't exist yet are created in the given section, unless all
+        is set, in which case every existing record with that name ID is
+        updated instead.  Returns the records that were updated.
+        """
+        self._checkWritable()
+        result = []
+        
+        for nameID, value in newnames.iteritems():
+            if all:
+                records = list(self.getNameFromAll(nameID))
+            else:
+                records = [self.getName(nameID, platformID, platEncID, langID, True)]
+            
+            for n in records:
+                self._setString(n, value)
+            result.extend(records)
+        
+        return result
+    
+    @_locked
+    def copySection(self, fromSection, toSection):
+        """
+        Copy every name in one section to another, given as
+        (platformID, platEncID, langID) triples, re-encoding the strings as
+        needed.  Returns the records that were updated.
+        """
+        self._checkWritable()
+        fromSection = SectionData(*fromSection)
+        toSection = SectionData(*toSection)
+        result = []
+        
+        if fromSection == toSection:
+            return result
+        
+        for n in list(self._bySection.get(fromSection, ())):
+            new = self.getName(n.nameID, *toSection, write=True)
+            self._setString(new, n.string)
+            result.append(new)
+        
+        return result
+    
+    @_locked
+    def renameSection(self, fromSection, toSection):
+        """
+        Move every name in one section to another, replacing any names there
+        with the same IDs.  Returns the records in their new section.
+        """
+        result = self.copySection(fromSection, toSection)
+        
+        if SectionData(*fromSection) != SectionData(*toSection):
+            for n in list(self._bySection.get(SectionData(*fromSection), ())):
+                self.delName(n.nameID, n.platformID, n.platEncID, n.langID)
+        
+        return result
+    
+    @_locked
+    def firstSection(self):
+        """returns the section of the first record in the table, or None"""
+        return next(iter(self._bySection), None)
         
     def getSection(self, platformID, platEncID, langID):
-        for n in self.names:
-            if platformID == n.platformID and platEncID == n.platEncID and langID == n.langID:
-                yield n
+        with self._lock:
+            names = list(self._bySection.get(SectionData(platformID, platEncID, langID), ()))
+        
+        for n in names:
+            yield n
     
     def getNameFromAll(self, nameID):
-        for n in self.names:
-            if nameID == n.nameID:
-                yield n
+        with self._lock:
+            names = list(self._byName.get(nameID, ()))
+        
+        for n in names:
+            yield n
     
+    @_locked
     def getNamesBySection(self):
         """returns a mapping of names keyed by section information"""
-        result = {}
+        return collections.OrderedDict((sd, list(names))
+                                       for sd, names in self._bySection.iteritems())
+
+class TTNameCollection(object):
+    """
+    The name tables of every font in a font collection, or of a single font as
+    a collection of one, for editing them together.
+    
+    fonts holds a TTNameTable for each font.  Saving writes the changed name
+    tables in one pass, and leaves everything else, including the name tables
+    that weren't changed and any tables the fonts share, as it was.
+    """
+    def __init__(self, fileish, readonly=False, timer=None, bounded=False):
+        #every font reads the same stream, so it has to be spooled up front
+        if hasattr(fileish, 'read') and not _seekable(fileish):
+            fileish = _spool(fileish)
         
-        for n in self.names:
-            sd = SectionData(n.platformID, n.platEncID, n.langID)
-            
-            if sd not in result.iterkeys():
-                result[sd] = []
-                
-            result[sd].append(n)
+        infile = fileish if hasattr(fileish, 'read') else open(fileish, 'rb')
+        try:
+            if not sfnt.isCollection(infile):
+                self.fonts = [TTNameTable(fileish, readonly, timer, bounded=bounded)]
+                return
             
-        return result
-    
\ No newline at end of file
+            #the header and every font's directory are read just the once, and
+            #each font loads its name table through its own directory
+            mapping = _map(infile) if readonly else None
+            collection = sfnt.TTCReader(infile if mapping is None else mapping)
+            self.fonts = [TTNameTable(fileish, readonly, timer, font=i, bounded=bounded,
+                                      reader=reader)
+                          for i, reader in enumerate(collection.fonts)]
+        finally:
+            if infile is not fileish:
+                infile.close()
+    
+    @property
+    def modified(self):
+        return any(t.modified for t in self.fonts)
+    
+    def save(self, fileish, suffixes=False):
+        """write the collection with every font's changed name table"""
+        for t in self.fonts:
+            t._checkWritable()
+        
+        self.fonts[0]._save(fileish, lambda: dict((i, t.compile(suffixes))
+                                    for i, t in enumerate(self.fonts) if t.modified))
@@ -0,0 +1,130 @@
+"""
+Phase-level timing instrumentation for tables, the CLI and batch runs
+"""
+
+# This file is part of ttname.
+#
+# Copyright 2013 T.C. Hollingsworth <tchollingsworth@gmail.com>
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met: 
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer. 
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution. 
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import collections
+import contextlib
+import os
+import timeit
+
+#peak memory is only available where there's a resource module
+try:
+    import resource
+except ImportError: #pragma: no cover
+    resource = None
+
+PhaseStats = collections.namedtuple('PhaseStats', ['name', 'wall', 'cpu',
+                        'bytesRead', 'bytesWritten', 'maxrss'])
+
+def _cpu():
+    times = os.times()
+    return times[0] + times[1]
+
+def _maxrss():
+    """peak resident memory of the process so far, in KiB"""
+    if resource is None: #pragma: no cover
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+class _Phase(object):
+    "Where instrumented code tallies up its I/O during a phase"
+    __slots__ = ('bytesRead', 'bytesWritten')
+    
+    def __init__(self):
+        self.bytesRead = 0
+        self.bytesWritten = 0
+
+class PhaseTimer(object):
+    """
+    Records wall and CPU time, bytes read and written and peak memory for each
+    phase of a run.
+    
+    Hooks are called with the PhaseStats of every phase as it finishes.
+    Timers from many runs, even ones in other processes, can be combined with
+    merge() and summed up by phase name with totals().
+    """
+    def __init__(self, hooks=()):
+        self.phases = []
+        self.hooks = list(hooks)
+    
+    def addHook(self, hook):
+        self.hooks.append(hook)
+    
+    @contextlib.contextmanager
+    def phase(self, name):
+        """time the body of a with statement as one phase"""
+        p = _Phase()
+        wall = timeit.default_timer()
+        cpu = _cpu()
+        
+        try:
+            yield p
+        finally:
+            stats = PhaseStats(name, timeit.default_timer() - wall, _cpu() - cpu,
+                               p.bytesRead, p.bytesWritten, _maxrss())
+            self.phases.append(stats)
+            for hook in self.hooks:
+                hook(stats)
+    
+    def merge(self, phases):
+        """add PhaseStats recorded elsewhere, like in a batch worker"""
+        self.phases.extend(PhaseStats._make(p) for p in phases)
+    
+    def totals(self):
+        """returns the PhaseStats summed by phase name, in order of appearance"""
+        result = collections.OrderedDict()
+        
+        for p in self.phases:
+            if p.name not in result:
+                result[p.name] = p
+            else:
+                old = result[p.name]
+                result[p.name] = PhaseStats(p.name, old.wall + p.wall, old.cpu + p.cpu,
+                            old.bytesRead + p.bytesRead,
+                            old.bytesWritten + p.bytesWritten,
+                            max(old.maxrss, p.maxrss))
+        
+        return result.values()
+    
+    def report(self, stream):
+        """write a table of the totals for each phase"""
+        stream.write('{0:<16} {1:>10} {2:>10} {3:>12} {4:>12} {5:>10}\n'.format(
+                     'phase', 'wall ms', 'cpu ms', 'read', 'written', 'peak KiB'))
+        for p in self.totals():
+            stream.write('{0:<16} {1:>10.2f} {2:>10.2f} {3:>12} {4:>12} {5:>10}\n'.format(
+                         p.name, p.wall * 1000, p.cpu * 1000, p.bytesRead,
+                         p.bytesWritten, p.maxrss))
+
+class NullTimer(object):
+    "A PhaseTimer stand-in for when nobody is asking"
+    _phase = _Phase()
+    
+    @contextlib.contextmanager
+    def phase(self, name):
+        yield self._phase
+
+NULL_TIMER = NullTimer()
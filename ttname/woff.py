@@ -0,0 +1,441 @@
+"""
+Editing WOFF and WOFF2 web fonts without unpacking them to plain sfnt
+"""
+
+# This file is part of ttname.
+#
+# Copyright 2013 T.C. Hollingsworth <tchollingsworth@gmail.com>
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met: 
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer. 
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution. 
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import collections
+import struct
+import zlib
+
+#brotli is only needed for WOFF2, so it's optional
+try:
+    import brotli
+except ImportError: #pragma: no cover
+    brotli = None
+
+import checksum
+import sfnt
+
+_woffHeader = struct.Struct('>4s4sLHHLHHLLLLL')
+_woffEntry = struct.Struct('>4sLLLL')
+_woff2Header = struct.Struct('>4s4sLHHLLHHLLLLL')
+
+# the tags WOFF2 can refer to by number instead of spelling them out
+_woff2Tags = ['cmap', 'head', 'hhea', 'hmtx', 'maxp', 'name', 'OS/2', 'post',
+              'cvt ', 'fpgm', 'glyf', 'loca', 'prep', 'CFF ', 'VORG', 'EBDT',
+              'EBLC', 'gasp', 'hdmx', 'kern', 'LTSH', 'PCLT', 'VDMX', 'vhea',
+              'vmtx', 'BASE', 'GDEF', 'GPOS', 'GSUB', 'EBSC', 'JSTF', 'MATH',
+              'CBDT', 'CBLC', 'COLR', 'CPAL', 'SVG ', 'sbix', 'acnt', 'avar',
+              'bdat', 'bloc', 'bsln', 'cvar', 'fdsc', 'feat', 'fmtx', 'fvar',
+              'gvar', 'hsty', 'just', 'lcar', 'mort', 'morx', 'opbd', 'prop',
+              'trak', 'Zapf', 'Silf', 'Glat', 'Gloc', 'Feat', 'Sill']
+
+# length is how much compressed data there is in the file, so copyEntry
+# copies the compressed stream as-is
+WOFFEntry = collections.namedtuple('WOFFEntry',
+                    ['tag', 'offset', 'length', 'origLength', 'origChecksum'])
+
+WOFF2Entry = collections.namedtuple('WOFF2Entry',
+                    ['tag', 'flags', 'origLength', 'transformLength', 'offset', 'length'])
+
+def _compress(data):
+    #WOFF stores tables that don't get any smaller uncompressed
+    compressed = zlib.compress(data)
+    return compressed if len(compressed) < len(data) else data
+
+def _readBlock(reader, offset, length):
+    reader.file.seek(offset)
+    data = reader.file.read(length)
+    if len(data) < length:
+        raise sfnt.SFNTError('WOFF font is truncated')
+    reader.bytesRead += length
+    return data
+
+class WOFFReader(sfnt.SFNTReader):
+    """
+    Reads the table directory of a WOFF font, and the data of its tables,
+    decompressing them as needed.
+    """
+    def __init__(self, file):
+        self.file = file
+        self.bytesRead = 0
+        
+        file.seek(0)
+        data = file.read(_woffHeader.size)
+        if len(data) < _woffHeader.size:
+            raise sfnt.SFNTError('Not a WOFF font (not enough data)')
+        
+        (signature, self.sfntVersion, length, numTables, reserved, totalSfntSize,
+         self.majorVersion, self.minorVersion, self.metaOffset, self.metaLength,
+         self.metaOrigLength, self.privOffset, self.privLength) = _woffHeader.unpack(data)
+        if signature != 'wOFF':
+            raise sfnt.SFNTError('Not a WOFF font (bad signature)')
+        
+        data = file.read(numTables * _woffEntry.size)
+        if len(data) < numTables * _woffEntry.size:
+            raise sfnt.SFNTError('Not a WOFF font (not enough data)')
+        self.bytesRead += _woffHeader.size + len(data)
+        
+        self.tables = collections.OrderedDict()
+        for i in xrange(numTables):
+            tag, offset, compLength, origLength, origChecksum = \
+                    _woffEntry.unpack_from(data, i * _woffEntry.size)
+            self.tables[tag] = WOFFEntry(tag, offset, compLength, origLength, origChecksum)
+    
+    def __getitem__(self, tag):
+        """fetch the decompressed table data"""
+        entry = self.tables[tag]
+        data = _readBlock(self, entry.offset, entry.length)
+        if entry.length < entry.origLength:
+            try:
+                data = zlib.decompress(data)
+            except zlib.error as e:
+                raise sfnt.SFNTError("'{0}' table is corrupt: {1}".format(tag, e))
+        if len(data) != entry.origLength:
+            raise sfnt.SFNTError("'{0}' table is truncated".format(tag))
+        return data
+    
+    # tables are almost always compressed, so there's nothing to point into
+    view = __getitem__
+    
+    def verify(self, adjustment=True):
+        """check the checksums the WOFF has for the font it decompresses to"""
+        mismatches = []
+        
+        for tag, entry in self.tables.iteritems():
+            data = self[tag]
+            if tag == 'head':
+                head = data
+                data = sfnt._setAdjustment(head, 0)
+            actual = checksum.calcChecksum(data)
+            if actual != entry.origChecksum:
+                mismatches.append(checksum.Mismatch(tag, entry.origChecksum, actual))
+        
+        if adjustment and 'head' in self and len(head) >= sfnt._adjustmentOffset + 4:
+            stored = sfnt._ulong.unpack_from(head, sfnt._adjustmentOffset)[0]
+            actual = _adjustment(self.sfntVersion, self.tables)
+            if actual != stored:
+                mismatches.append(checksum.Mismatch('checkSumAdjustment', stored, actual))
+        
+        return mismatches
+    
+    def rebuild(self, outfile, tables):
+        return write(self, outfile, tables)
+
+def _adjustment(sfntVersion, directory):
+    """
+    The head.checkSumAdjustment of the font a WOFF decompresses to, given a
+    mapping of tags to WOFFEntries with the checksums of its tables.  The
+    tables are in the order of the directory, like decoders lay them out.
+    """
+    pos = sfnt._offsetTable.size + len(directory) * sfnt._dirEntry.size
+    header = [sfnt._offsetTable.pack(sfntVersion, len(directory),
+                                     *sfnt._searchParams(len(directory)))]
+    total = 0
+    for tag in sorted(directory):
+        entry = directory[tag]
+        header.append(sfnt._dirEntry.pack(tag, entry.origChecksum, pos, entry.origLength))
+        pos += entry.origLength + sfnt._pad(entry.origLength)
+        total += entry.origChecksum
+    
+    return (sfnt._checksumMagic - total - checksum.calcChecksum(''.join(header))) & 0xFFFFFFFF
+
+def write(reader, outfile, tables):
+    """
+    Write the WOFF font read by reader to outfile, replacing the data of the
+    tables in the tables mapping.
+    
+    Only the replaced tables are compressed again; every other table's
+    compressed data is copied byte-for-byte from the source, in the same order,
+    along with the metadata and private blocks.  head.checkSumAdjustment is
+    recomputed for the font as it decompresses, so the head table is always
+    compressed again too.  Replacement tables that turn out the same as the
+    source are copied, still compressed.  Returns the number of bytes written.
+    """
+    tables = dict(tables)
+    sfnt._dropUnchanged(reader, tables)
+    if 'head' in reader and 'head' not in tables:
+        tables['head'] = reader['head']
+    if 'head' in tables:
+        tables['head'] = sfnt._setAdjustment(tables['head'], 0)
+    
+    entries = sorted(reader.tables.itervalues(), key=lambda e: e.offset)
+    entries.extend(WOFFEntry(tag, 0, 0, 0, 0) for tag in sorted(tables)
+                                            if tag not in reader)
+    
+    directory = {}
+    for entry in entries:
+        if entry.tag in tables:
+            data = tables[entry.tag]
+            entry = entry._replace(origLength=len(data),
+                                   origChecksum=checksum.calcChecksum(data))
+        directory[entry.tag] = entry
+    
+    if 'head' in tables:
+        tables['head'] = sfnt._setAdjustment(tables['head'],
+                                             _adjustment(reader.sfntVersion, directory))
+    
+    compressed = dict((tag, _compress(data)) for tag, data in tables.iteritems())
+    
+    pos = _woffHeader.size + len(directory) * _woffEntry.size
+    for entry in entries:
+        length = len(compressed[entry.tag]) if entry.tag in compressed else entry.length
+        directory[entry.tag] = directory[entry.tag]._replace(offset=pos, length=length)
+        pos += length + sfnt._pad(length)
+    
+    metaOffset = privOffset = 0
+    if reader.metaLength:
+        metaOffset = pos
+        pos += reader.metaLength
+    if reader.privLength:
+        pos += sfnt._pad(pos)
+        privOffset = pos
+        pos += reader.privLength
+    
+    totalSfntSize = sfnt._offsetTable.size + len(directory) * sfnt._dirEntry.size
+    for entry in directory.itervalues():
+        totalSfntSize += entry.origLength + sfnt._pad(entry.origLength)
+    
+    header = [_woffHeader.pack('wOFF', reader.sfntVersion, pos, len(directory), 0,
+                               totalSfntSize, reader.majorVersion, reader.minorVersion,
+                               metaOffset, reader.metaLength, reader.metaOrigLength,
+                               privOffset, reader.privLength)]
+    for tag in sorted(directory):
+        entry = directory[tag]
+        header.append(_woffEntry.pack(tag, entry.offset, entry.length, entry.origLength,
+                                      entry.origChecksum))
+    
+    outfile.write(''.join(header))
+    for entry in entries:
+        if entry.tag in compressed:
+            outfile.write(compressed[entry.tag])
+        else:
+            reader.copyEntry(entry, outfile)
+        outfile.write('\0' * sfnt._pad(directory[entry.tag].length))
+    
+    if reader.metaLength:
+        reader.copyEntry(WOFFEntry('metadata', reader.metaOffset, reader.metaLength, 0, 0),
+                         outfile)
+    if reader.privLength:
+        if reader.metaLength:
+            outfile.write('\0' * sfnt._pad(metaOffset + reader.metaLength))
+        reader.copyEntry(WOFFEntry('private data', reader.privOffset, reader.privLength, 0, 0),
+                         outfile)
+    
+    return pos
+
+def _readBase128(data, pos):
+    """read a WOFF2 UIntBase128, returning it and where it ends"""
+    value = 0
+    for i in xrange(5):
+        if pos >= len(data):
+            raise sfnt.SFNTError('Not a WOFF2 font (not enough data)')
+        byte = ord(data[pos])
+        pos += 1
+        if i == 0 and byte == 0x80:
+            raise sfnt.SFNTError('Not a WOFF2 font (bad UIntBase128)')
+        value = (value << 7) | (byte & 0x7F)
+        if not byte & 0x80:
+            return value, pos
+    raise sfnt.SFNTError('Not a WOFF2 font (bad UIntBase128)')
+
+def _packBase128(value):
+    data = [chr(value & 0x7F)]
+    value >>= 7
+    while value:
+        data.append(chr(0x80 | (value & 0x7F)))
+        value >>= 7
+    return ''.join(reversed(data))
+
+def _isTransformed(tag, flags):
+    #glyf and loca are transformed unless they say otherwise, and vice versa
+    version = flags >> 6
+    if tag in ('glyf', 'loca'):
+        return version != 3
+    return version != 0
+
+class WOFF2Reader(sfnt.SFNTReader):
+    """
+    Reads the table directory of a WOFF2 font, and the data of its tables,
+    which means decompressing all of them at once, since WOFF2 compresses
+    them together.  Transformed tables like glyf are left transformed, and
+    can't be read.
+    """
+    def __init__(self, file):
+        if brotli is None:
+            raise sfnt.SFNTError('WOFF2 fonts need the brotli module')
+        
+        self.file = file
+        self.bytesRead = 0
+        self._data = None
+        
+        file.seek(0)
+        data = file.read(_woff2Header.size)
+        if len(data) < _woff2Header.size:
+            raise sfnt.SFNTError('Not a WOFF2 font (not enough data)')
+        
+        (signature, self.sfntVersion, length, numTables, reserved,
+         self.totalSfntSize, self.totalCompressedSize, self.majorVersion,
+         self.minorVersion, self.metaOffset, self.metaLength, self.metaOrigLength,
+         self.privOffset, self.privLength) = _woff2Header.unpack(data)
+        if signature != 'wOF2':
+            raise sfnt.SFNTError('Not a WOFF2 font (bad signature)')
+        if self.sfntVersion == 'ttcf':
+            raise sfnt.SFNTError("WOFF2 font collections aren't supported")
+        
+        #the directory is variable-length, but can't be longer than this
+        data = file.read(numTables * 15)
+        self.tables = collections.OrderedDict()
+        pos = offset = 0
+        for i in xrange(numTables):
+            if pos >= len(data):
+                raise sfnt.SFNTError('Not a WOFF2 font (not enough data)')
+            flags = ord(data[pos])
+            pos += 1
+            if flags & 0x3F == 0x3F:
+                tag = data[pos:pos + 4]
+                pos += 4
+            else:
+                tag = _woff2Tags[flags & 0x3F]
+            
+            origLength, pos = _readBase128(data, pos)
+            transformLength = None
+            if _isTransformed(tag, flags):
+                transformLength, pos = _readBase128(data, pos)
+            
+            length = origLength if transformLength is None else transformLength
+            self.tables[tag] = WOFF2Entry(tag, flags, origLength, transformLength,
+                                          offset, length)
+            offset += length
+        
+        self._streamOffset = _woff2Header.size + pos
+        self.bytesRead += self._streamOffset
+    
+    def _stream(self):
+        """the decompressed data of every table"""
+        if self._data is None:
+            data = _readBlock(self, self._streamOffset, self.totalCompressedSize)
+            try:
+                self._data = brotli.decompress(data)
+            except brotli.error as e:
+                raise sfnt.SFNTError('WOFF2 font data is corrupt: {0}'.format(e))
+        return self._data
+    
+    def __getitem__(self, tag):
+        """fetch the decompressed table data"""
+        entry = self.tables[tag]
+        if entry.transformLength is not None:
+            raise sfnt.SFNTError("'{0}' table is transformed".format(tag))
+        
+        data = self._stream()[entry.offset:entry.offset + entry.length]
+        if len(data) < entry.length:
+            raise sfnt.SFNTError("'{0}' table is truncated".format(tag))
+        return data
+    
+    view = __getitem__
+    
+    def verify(self, adjustment=True):
+        #WOFF2 doesn't keep checksums; decoders work them out for themselves
+        return []
+    
+    def rebuild(self, outfile, tables):
+        return write2(self, outfile, tables)
+
+def write2(reader, outfile, tables):
+    """
+    Write the WOFF2 font read by reader to outfile, replacing the data of the
+    tables in the tables mapping.
+    
+    The tables are compressed together, so the whole stream is compressed
+    again, but every other table goes back into it exactly as it was, still
+    transformed, and the metadata and private blocks are copied byte-for-byte.
+    head.checkSumAdjustment is left alone: WOFF2 decoders have to work out
+    the checksums themselves anyway.  Returns the number of bytes written.
+    """
+    stream = reader._stream()
+    entries = list(reader.tables.itervalues())
+    for tag in sorted(tables):
+        if tag not in reader:
+            flags = _woff2Tags.index(tag) if tag in _woff2Tags else 0x3F
+            entries.append(WOFF2Entry(tag, flags, 0, None, 0, 0))
+    
+    directory = []
+    data = []
+    totalSfntSize = reader.totalSfntSize
+    for entry in entries:
+        if entry.tag in tables:
+            table = tables[entry.tag]
+            if entry.transformLength is not None:
+                raise sfnt.SFNTError("'{0}' table is transformed".format(entry.tag))
+            if entry.tag not in reader:
+                totalSfntSize += sfnt._dirEntry.size
+            totalSfntSize += len(table) + sfnt._pad(len(table)) - \
+                             entry.origLength - sfnt._pad(entry.origLength)
+            entry = entry._replace(origLength=len(table), length=len(table))
+        else:
+            table = stream[entry.offset:entry.offset + entry.length]
+        data.append(table)
+        
+        directory.append(chr(entry.flags))
+        if entry.flags & 0x3F == 0x3F:
+            directory.append(entry.tag)
+        directory.append(_packBase128(entry.origLength))
+        if entry.transformLength is not None:
+            directory.append(_packBase128(entry.transformLength))
+    
+    compressed = brotli.compress(''.join(data), mode=brotli.MODE_FONT)
+    directory = ''.join(directory)
+    
+    pos = _woff2Header.size + len(directory) + len(compressed)
+    metaOffset = privOffset = 0
+    if reader.metaLength:
+        pos += sfnt._pad(pos)
+        metaOffset = pos
+        pos += reader.metaLength
+    if reader.privLength:
+        pos += sfnt._pad(pos)
+        privOffset = pos
+        pos += reader.privLength
+    
+    outfile.write(_woff2Header.pack('wOF2', reader.sfntVersion, pos, len(entries), 0,
+                                    totalSfntSize, len(compressed), reader.majorVersion,
+                                    reader.minorVersion, metaOffset, reader.metaLength,
+                                    reader.metaOrigLength, privOffset, reader.privLength))
+    outfile.write(directory)
+    outfile.write(compressed)
+    
+    end = _woff2Header.size + len(directory) + len(compressed)
+    if reader.metaLength:
+        outfile.write('\0' * sfnt._pad(end))
+        reader.copyEntry(WOFFEntry('metadata', reader.metaOffset, reader.metaLength, 0, 0),
+                         outfile)
+        end = metaOffset + reader.metaLength
+    if reader.privLength:
+        outfile.write('\0' * sfnt._pad(end))
+        reader.copyEntry(WOFFEntry('private data', reader.privOffset, reader.privLength, 0, 0),
+                         outfile)
+    
+    return pos